@@ -1,21 +1,29 @@
 """Admin Dashboard Views — Campus Bites"""
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.db.models import Q, Sum, Count, F, Avg, DecimalField, ExpressionWrapper, Case, When, Value, BooleanField, CharField
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
 from datetime import timedelta
 from django.core.cache import cache
-import csv
 import decimal
+import json
 
 from menu.models import MenuItem, Category, Review
+from orders import search as order_search
 from orders.models import Order, OrderItem
+from orders.transitions import InvalidTransition, TransitionConflict, transition
 from .models import UserProfile, SystemSettings, Feedback
+from . import export, live
+from .poll_cache import poll_cache
+from .stats import dashboard_stats
 
 
 def admin_required(view_func):
@@ -56,85 +64,24 @@ def admin_or_kitchen_required(view_func):
 # ───────────────────────────────────────
 @admin_required
 def admin_overview(request):
-    # Use local time for start-of-day calculations
-    now = timezone.localtime(timezone.now())
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    time_range = request.GET.get('range', 'all')
-
-    if time_range == '7days':
-        start_date = today_start - timedelta(days=7)
-    elif time_range == '30days':
-        start_date = today_start - timedelta(days=30)
-    elif time_range == 'today':
-        start_date = today_start
-    else:
-        start_date = None
-        time_range = 'all'
-
-    # Base querysets
-    orders_qs = Order.objects.exclude(status='payment_pending')
-    if start_date:
-        orders_qs = orders_qs.filter(created_at__gte=start_date)
-
-    paid_orders = orders_qs.filter(is_paid=True)
-    total_revenue = paid_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-    total_orders = orders_qs.count()
-    active_orders = Order.objects.filter(
-        status__in=['pending', 'confirmed', 'preparing', 'ready']
-    ).count()
-    total_users = User.objects.filter(is_active=True).count()
-
-    # Today deltas
-    todays_revenue = Order.objects.filter(
-        created_at__gte=today_start, is_paid=True
-    ).exclude(status='payment_pending').aggregate(total=Sum('total_amount'))['total'] or 0
-    todays_orders = Order.objects.filter(
-        created_at__gte=today_start
-    ).exclude(status='payment_pending').count()
-
-    # New users (last 7 days)
-    week_ago = today_start - timedelta(days=7)
-    new_users = User.objects.filter(date_joined__gte=week_ago).count()
+    stats = dashboard_stats(request.GET.get('range', 'all'))
 
     # Recent orders (5)
     recent_orders = Order.objects.exclude(
         status='payment_pending'
     ).select_related('user').prefetch_related('items')[:5]
 
-    # Top sellers
-    valid_statuses = ['pending', 'confirmed', 'preparing', 'ready', 'delivered', 'collected']
-    if start_date:
-        top_items_qs = OrderItem.objects.filter(
-            order__status__in=valid_statuses,
-            order__created_at__gte=start_date,
-        )
-    else:
-        top_items_qs = OrderItem.objects.filter(order__status__in=valid_statuses)
-
-    top_sellers = (
-        top_items_qs
-        .values('item_name')
-        .annotate(
-            qty=Sum('quantity'),
-            revenue=Sum(ExpressionWrapper(
-                F('price') * F('quantity'),
-                output_field=DecimalField()
-            ))
-        )
-        .order_by('-qty')[:5]
-    )
-
     context = {
-        'time_range': time_range,
-        'total_revenue': total_revenue,
-        'total_orders': total_orders,
-        'active_orders': active_orders,
-        'total_users': total_users,
-        'todays_revenue': todays_revenue,
-        'todays_orders': todays_orders,
-        'new_users': new_users,
+        'time_range': stats['time_range'],
+        'total_revenue': stats['total_revenue'],
+        'total_orders': stats['total_orders'],
+        'active_orders': stats['active_orders'],
+        'total_users': stats['total_users'],
+        'todays_revenue': stats['todays_revenue'],
+        'todays_orders': stats['todays_orders'],
+        'new_users': stats['new_users'],
         'recent_orders': recent_orders,
-        'top_sellers': top_sellers,
+        'top_sellers': stats['top_sellers'],
         'active_page': 'overview',
     }
     return render(request, 'admin/admin_overview.html', context)
@@ -150,21 +97,24 @@ def admin_orders(request):
         order_ids = request.POST.getlist('order_ids')
         action = request.POST.get('bulk_action')
         if order_ids and action:
-            updated = 0
+            updated = conflicts = skipped = 0
             for oid in order_ids:
                 try:
                     order = Order.objects.get(id=oid)
-                    if action == 'cancel':
-                        order.status = 'cancelled'
-                    else:
-                        order.status = action
-                    if action == 'collected':
-                        order.is_paid = True
-                    order.save()
+                    transition(order, 'cancelled' if action == 'cancel' else action,
+                               is_paid=True if action == 'collected' else None)
                     updated += 1
+                except TransitionConflict:
+                    conflicts += 1
+                except InvalidTransition:
+                    skipped += 1
                 except Order.DoesNotExist:
                     continue
             messages.success(request, f'{updated} orders updated to {action}')
+            if skipped:
+                messages.warning(request, f'{skipped} orders can\'t move to {action} from their current status')
+            if conflicts:
+                messages.warning(request, f'{conflicts} orders changed meanwhile and were left as they are')
         return redirect('custom_admin_orders')
 
     # Handle single status update
@@ -173,13 +123,17 @@ def admin_orders(request):
         new_status = request.POST.get('status')
         try:
             order = Order.objects.get(id=order_id)
-            order.status = new_status
-            if new_status == 'collected':
-                order.is_paid = True
-            order.save()
+            transition(order, new_status, is_paid=True if new_status == 'collected' else None,
+                       expected_version=request.POST.get('version') or None)
             messages.success(request, f'Order {order.token_number} → {new_status}')
         except Order.DoesNotExist:
             messages.error(request, 'Order not found')
+        except TransitionConflict:
+            messages.warning(request, 'That order was just updated by someone else — please check it again')
+        except InvalidTransition as exc:
+            messages.error(request, str(exc))
+        except ValueError:
+            messages.error(request, 'Invalid status')
         return redirect('custom_admin_orders')
 
     # Filter
@@ -189,11 +143,7 @@ def admin_orders(request):
     orders_qs = Order.objects.exclude(status='payment_pending').select_related('user').prefetch_related('items')
 
     if search:
-        orders_qs = orders_qs.filter(
-            Q(token_number__icontains=search) |
-            Q(user__username__icontains=search) |
-            Q(user__email__icontains=search)
-        )
+        orders_qs = order_search.filter_orders(orders_qs, search)
 
     if status_filter == 'pending':
         orders_qs = orders_qs.filter(status__in=['pending', 'confirmed'])
@@ -239,28 +189,26 @@ def admin_orders(request):
 
 @admin_required
 def admin_orders_export(request):
-    """Export orders as CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="orders_export.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Order ID', 'Customer', 'Email', 'Items', 'Total', 'Status', 'Payment', 'Date'])
-
-    orders = Order.objects.exclude(status='payment_pending').select_related('user').prefetch_related('items').order_by('-created_at')
-
-    for order in orders:
-        items_str = ', '.join([f"{oi.quantity}x {oi.item_name}" for oi in order.items.all()])
-        writer.writerow([
-            order.token_number,
-            order.user.username,
-            order.user.email,
-            items_str,
-            float(order.total_amount),
-            order.get_status_display(),
-            order.get_payment_method_display(),
-            order.created_at.strftime('%Y-%m-%d %H:%M'),
-        ])
+    """Export orders as CSV, streamed in chunks.
 
+    Query params: start/end (YYYY-MM-DD), status (comma-separated), payment,
+    columns (comma-separated keys from export.COLUMNS) and gzip=1.
+    """
+    try:
+        orders, columns = export.parse_options(request.GET)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+
+    chunks = export.csv_chunks(orders, columns)
+    filename = 'orders_export.csv'
+    content_type = 'text/csv'
+    if request.GET.get('gzip') in ('1', 'true'):
+        chunks = export.gzip_chunks(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
@@ -391,10 +339,14 @@ def admin_menu(request):
 @admin_required
 def admin_users(request):
     search = request.GET.get('search', '').strip()
+    sort = request.GET.get('sort', 'joined')
+    activity = request.GET.get('activity', 'all')
 
-    users_qs = User.objects.select_related('profile').annotate(
-        order_count=Count('orders', distinct=True),
-        total_spent=Sum('orders__total_amount', filter=Q(orders__is_paid=True)),
+    # Order totals come from the denormalized UserStats row (indexed), not a join over orders
+    users_qs = User.objects.select_related('profile', 'stats').annotate(
+        order_count=Coalesce('stats__order_count', 0),
+        total_spent=F('stats__total_spent'),
+        last_order_at=F('stats__last_order_at'),
 
         checked_str=Case(
             When(is_active=True, then=Value('checked')),
@@ -406,7 +358,7 @@ def admin_users(request):
             default=Value(''),
             output_field=CharField(),
         ),
-    ).order_by('-date_joined')
+    )
 
     if search:
         users_qs = users_qs.filter(
@@ -415,6 +367,22 @@ def admin_users(request):
             Q(profile__full_name__icontains=search)
         )
 
+    if activity == 'buyers':
+        users_qs = users_qs.filter(stats__order_count__gt=0)
+    elif activity == 'recent':
+        users_qs = users_qs.filter(stats__last_order_at__gte=timezone.now() - timedelta(days=30))
+    elif activity == 'dormant':
+        users_qs = users_qs.exclude(stats__last_order_at__gte=timezone.now() - timedelta(days=30))
+
+    sort_fields = {
+        'orders': F('stats__order_count').desc(nulls_last=True),
+        'spent': F('stats__total_spent').desc(nulls_last=True),
+        'recent': F('stats__last_order_at').desc(nulls_last=True),
+    }
+    if sort not in sort_fields:
+        sort = 'joined'
+    users_qs = users_qs.order_by(sort_fields.get(sort, '-date_joined'), '-date_joined')
+
     # Pagination
     paginator = Paginator(users_qs, 20)
     page = request.GET.get('page')
@@ -428,6 +396,8 @@ def admin_users(request):
     context = {
         'users': users,
         'search': search,
+        'sort': sort,
+        'activity': activity,
         'active_page': 'users',
     }
     return render(request, 'admin/admin_users.html', context)
@@ -554,6 +524,7 @@ def admin_settings(request):
 # Chart Data API
 # ───────────────────────────────────────
 @login_required
+@poll_cache()
 def admin_chart_data(request):
     """API endpoint for dashboard charts (Rate Limited)"""
     if not request.user.profile.is_admin:
@@ -578,74 +549,64 @@ def admin_chart_data(request):
     else:
         start_date = today_start
 
+    from orders import rollups
+    from . import trends
+
     # Valid statuses for chart data (includes all active orders)
     chart_statuses = ['pending', 'confirmed', 'preparing', 'ready', 'delivered', 'collected']
-    base = Order.objects.exclude(status='payment_pending')
-    if start_date:
-        base = base.filter(created_at__gte=start_date)
-    
-    # Orders to include in charts (both paid and unpaid, for quantity stats)
-    chart_orders = base.filter(status__in=chart_statuses)
+    start_day = start_date.date() if start_date else None
 
-    # Hourly / Daily trend (Revenue)
-    # Perform aggregation in Python to avoid MySQL timezone issues
-    # Only count Valid PAID orders for revenue trend
-    revenue_orders = base.filter(is_paid=True).values('created_at', 'total_amount')
-    
-    from collections import defaultdict
+    # Trend grouping: hour (default for today), day (default otherwise), week or heatmap
+    group = request.GET.get('group', 'hour' if time_range == 'today' else 'day')
+    if group not in ('hour', 'day', 'week', 'heatmap'):
+        group = 'hour' if time_range == 'today' else 'day'
 
-    if time_range == 'today':
-        hourly_map = defaultdict(float)
-        for order in revenue_orders:
-            local_dt = timezone.localtime(order['created_at'])
-            hourly_map[local_dt.hour] += float(order['total_amount'] or 0)
-        
-        trend = [{'label': f'{h}:00', 'value': hourly_map[h]} for h in range(7, 23)]
+    # Hourly / Daily / Weekly trend (Revenue)
+    # Only count Valid PAID orders for revenue trend
+    if group == 'day' and time_range != 'today':
+        # Final orders come from the daily rollups, in-flight ones are added live
+        statuses = [s for s in rollups.ALL_STATUSES if s != 'payment_pending']
+        daily_map = rollups.daily_series(start_day, statuses, paid_only=True)
+        trend = [
+            {'label': d.strftime('%b %d'), 'value': float(daily_map[d]['revenue'])}
+            for d in sorted(daily_map)
+        ]
     else:
-        daily_map = defaultdict(float)
-        for order in revenue_orders:
-            local_dt = timezone.localtime(order['created_at'])
-            daily_map[local_dt.date()] += float(order['total_amount'] or 0)
-        
-        # Sort by date
-        sorted_dates = sorted(daily_map.keys())
-        trend = [{'label': d.strftime('%b %d'), 'value': daily_map[d]} for d in sorted_dates]
+        # Bucket in NumPy rather than per-row localtime (also avoids MySQL timezone issues)
+        revenue_orders = Order.objects.exclude(status='payment_pending').filter(is_paid=True)
+        if start_date:
+            revenue_orders = revenue_orders.filter(created_at__gte=start_date)
+        seconds, amounts = trends.load(revenue_orders)
+        if group == 'hour':
+            hourly_totals = trends.hourly(seconds, amounts)
+            trend = [{'label': f'{h}:00', 'value': float(hourly_totals[h])} for h in range(7, 23)]
+        elif group == 'day':
+            trend = [{'label': d.strftime('%b %d'), 'value': v} for d, v in trends.daily(seconds, amounts)]
+        elif group == 'week':
+            trend = [{'label': d.strftime('%b %d'), 'value': v} for d, v in trends.weekly(seconds, amounts)]
+        else:
+            cells = trends.heatmap(seconds, amounts)
+            trend = [
+                {'label': name, 'values': [round(float(v), 2) for v in cells[d]]}
+                for d, name in enumerate(trends.DAY_NAMES)
+            ]
 
     # Sales by category (Revenue only from PAID orders)
-    cat_data = (
-        OrderItem.objects.filter(order__in=chart_orders, menu_item__isnull=False)
-        .values('menu_item__category__name')
-        .annotate(revenue=Sum(
-            ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField()),
-            filter=Q(order__is_paid=True)
-        ))
-        .order_by('-revenue')
-    )
     categories = [
-        {'name': c['menu_item__category__name'] or 'Other', 'value': float(c['revenue'] or 0)}
-        for c in cat_data
+        {'name': c['name'] or 'Other', 'value': float(c['paid_revenue'])}
+        for c in rollups.item_sales(start_day, chart_statuses, by='category')
     ]
+    categories.sort(key=lambda c: -c['value'])
 
     # Top sellers (Qty from all chart_orders, Revenue from PAID only)
-    top_sellers_qs = (
-        OrderItem.objects.filter(order__in=chart_orders)
-        .values('item_name')
-        .annotate(
-            qty=Sum('quantity'),
-            revenue=Sum(
-                ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField()),
-                filter=Q(order__is_paid=True)
-            )
-        )
-        .order_by('-qty')[:5]
-    )
     top_sellers = [
-        {'label': s['item_name'], 'value': s['qty'], 'revenue': float(s['revenue'] or 0)}
-        for s in top_sellers_qs
+        {'label': s['name'], 'value': s['qty'], 'revenue': float(s['paid_revenue'])}
+        for s in rollups.item_sales(start_day, chart_statuses, limit=5)
     ]
 
     return JsonResponse({
         'trend': trend,
+        'trend_group': group,
         'categories': categories,
         'top_sellers': top_sellers,
     })
@@ -655,46 +616,10 @@ def admin_chart_data(request):
 # Dashboard Stats API (for AJAX polling)
 # ───────────────────────────────────────
 @admin_required
+@poll_cache()
 def admin_dashboard_api(request):
-    """JSON API returning all dashboard stats for real-time AJAX updates."""
-    now = timezone.localtime(timezone.now())
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    time_range = request.GET.get('range', 'all')
-
-    if time_range == '7days':
-        start_date = today_start - timedelta(days=7)
-    elif time_range == '30days':
-        start_date = today_start - timedelta(days=30)
-    elif time_range == 'today':
-        start_date = today_start
-    else:
-        start_date = None
-        time_range = 'all'
-
-    # Base querysets
-    orders_qs = Order.objects.exclude(status='payment_pending')
-    if start_date:
-        orders_qs = orders_qs.filter(created_at__gte=start_date)
-
-    paid_orders = orders_qs.filter(is_paid=True)
-    total_revenue = float(paid_orders.aggregate(total=Sum('total_amount'))['total'] or 0)
-    total_orders = orders_qs.count()
-    active_orders = Order.objects.filter(
-        status__in=['pending', 'confirmed', 'preparing', 'ready']
-    ).count()
-    total_users = User.objects.filter(is_active=True).count()
-
-    # Today deltas
-    todays_revenue = float(Order.objects.filter(
-        created_at__gte=today_start, is_paid=True
-    ).exclude(status='payment_pending').aggregate(total=Sum('total_amount'))['total'] or 0)
-    todays_orders = Order.objects.filter(
-        created_at__gte=today_start
-    ).exclude(status='payment_pending').count()
-
-    # New users (last 7 days)
-    week_ago = today_start - timedelta(days=7)
-    new_users = User.objects.filter(date_joined__gte=week_ago).count()
+    """JSON snapshot of the dashboard stats; the page then follows the live events."""
+    stats = dashboard_stats(request.GET.get('range', 'all'))
 
     # Recent orders (5)
     recent_orders = Order.objects.exclude(
@@ -710,6 +635,7 @@ def admin_dashboard_api(request):
                 'item_name': oi.item_name[:15],
             })
         recent_orders_data.append({
+            'id': order.id,
             'token_number': order.token_number,
             'username': order.user.username,
             'user_id': order.user.id,
@@ -720,43 +646,24 @@ def admin_dashboard_api(request):
             'status_display': order.get_status_display(),
         })
 
-    # Top sellers
-    valid_statuses = ['pending', 'confirmed', 'preparing', 'ready', 'delivered', 'collected']
-    if start_date:
-        top_items_qs = OrderItem.objects.filter(
-            order__status__in=valid_statuses,
-            order__created_at__gte=start_date,
-        )
-    else:
-        top_items_qs = OrderItem.objects.filter(order__status__in=valid_statuses)
-
-    top_sellers = list(
-        top_items_qs
-        .values('item_name')
-        .annotate(
-            qty=Sum('quantity'),
-            revenue=Sum(
-                ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField()),
-                filter=Q(order__is_paid=True)
-            )
-        )
-        .order_by('-qty')[:5]
-    )
     top_sellers_data = [
         {'label': s['item_name'], 'value': s['qty'], 'revenue': float(s['revenue'] or 0)}
-        for s in top_sellers
+        for s in stats['top_sellers']
     ]
 
     return JsonResponse({
-        'total_revenue': total_revenue,
-        'total_orders': total_orders,
-        'active_orders': active_orders,
-        'total_users': total_users,
-        'todays_revenue': todays_revenue,
-        'todays_orders': todays_orders,
-        'new_users': new_users,
+        'total_revenue': float(stats['total_revenue']),
+        'total_orders': stats['total_orders'],
+        'active_orders': stats['active_orders'],
+        'total_users': stats['total_users'],
+        'todays_revenue': float(stats['todays_revenue']),
+        'todays_orders': stats['todays_orders'],
+        'new_users': stats['new_users'],
         'recent_orders': recent_orders_data,
         'top_sellers': top_sellers_data,
+        # Read after the queries: every event up to it is already reflected above (one
+        # committing during them may be missed, never applied twice; pages resync on bulk changes)
+        'seq': live.current_seq(),
     })
 
 
@@ -764,6 +671,7 @@ def admin_dashboard_api(request):
 # Orders API (for AJAX polling)
 # ───────────────────────────────────────
 @admin_or_kitchen_required
+@poll_cache(timeout=5, roles=('admin', 'kitchen'), bypass=('detail_id',))
 def admin_orders_api(request):
     """JSON API returning orders table data for real-time AJAX updates."""
     # Check for single order detail request
@@ -804,11 +712,7 @@ def admin_orders_api(request):
     orders_qs = Order.objects.exclude(status='payment_pending').select_related('user').prefetch_related('items')
 
     if search:
-        orders_qs = orders_qs.filter(
-            Q(token_number__icontains=search) |
-            Q(user__username__icontains=search) |
-            Q(user__email__icontains=search)
-        )
+        orders_qs = order_search.filter_orders(orders_qs, search)
 
     if status_filter == 'pending':
         orders_qs = orders_qs.filter(status__in=['pending', 'confirmed'])
@@ -868,4 +772,62 @@ def admin_orders_api(request):
         'counts': counts,
         'page': orders_page.number,
         'num_pages': paginator.num_pages,
+        'seq': live.current_seq(),  # read after the queries, as in admin_dashboard_api
     })
+
+
+# ───────────────────────────────────────
+# Live events (polling fallback for the dashboard WebSocket)
+# ───────────────────────────────────────
+@admin_or_kitchen_required
+def admin_live_events(request):
+    """Dashboard deltas after ?since=, answered straight away; the page polls this every few seconds."""
+    seq = live.current_seq()
+    if seq is None:  # live events are off: the page re-polls its snapshot instead
+        return JsonResponse({'seq': None, 'events': []})
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        since = 0
+    events = live.events_since(since)
+    if events is None:
+        events = [{'type': 'resync', 'reason': 'expired', 'seq': seq}]
+    is_admin = request.user.profile.is_admin
+    return JsonResponse({'seq': seq, 'events': [live.for_viewer(event, is_admin) for event in events]})
+
+
+@admin_required
+@require_POST
+def admin_mass_cancel_api(request):
+    """Cancel the open orders containing a menu item and/or placed in a time window, refunding wallets.
+
+    POST a JSON body {"menu_item_id", "since", "until" (ISO datetimes), "reason", "dry_run"};
+    a dry run returns what would be cancelled and refunded.
+    """
+    from payments import refunds
+
+    try:
+        body = json.loads(request.body)
+        menu_item_id = int(body['menu_item_id']) if body.get('menu_item_id') not in (None, '') else None
+        since, until = (_parse_when(body.get(key)) for key in ('since', 'until'))
+        orders = refunds.select_orders(menu_item_id, since, until)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': str(e) or 'Invalid request'}, status=400)
+
+    if body.get('dry_run'):
+        result = refunds.preview(orders)
+    else:
+        reason = str(body.get('reason') or 'item unavailable').strip()[:100]
+        result = refunds.cancel_and_refund(orders, reason)
+    result['refund_total'] = float(result['refund_total'])
+    return JsonResponse(result)
+
+
+def _parse_when(value):
+    """An ISO datetime from a request (local time if no offset), or None"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Invalid datetime: {value}')
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
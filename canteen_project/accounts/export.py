@@ -0,0 +1,137 @@
+"""Streaming CSV export of orders for the admin panel.
+
+Orders are read with a server-side cursor (``iterator(chunk_size=...)``) as
+plain value tuples; the items of each chunk are fetched with one extra
+query, written through ``csv.writer`` into a small buffer and yielded, so
+memory stays flat however many rows are exported. The stream can optionally
+be gzip-compressed on the fly.
+"""
+import csv
+import io
+import logging
+import zlib
+from datetime import datetime, time, timedelta
+from itertools import islice
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from orders.models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+PAYMENT_LABELS = dict(Order.PAYMENT_CHOICES)
+DELIVERY_LABELS = dict(Order.DELIVERY_TYPE_CHOICES)
+
+# column key -> (header, order field needed)
+COLUMNS = {
+    'token': ('Order ID', 'token_number'),
+    'customer': ('Customer', 'user__username'),
+    'email': ('Email', 'user__email'),
+    'items': ('Items', None),
+    'total': ('Total', 'total_amount'),
+    'status': ('Status', 'status'),
+    'payment': ('Payment', 'payment_method'),
+    'paid': ('Paid', 'is_paid'),
+    'delivery': ('Delivery', 'delivery_type'),
+    'location': ('Location', 'delivery_location'),
+    'date': ('Date', 'created_at'),
+}
+DEFAULT_COLUMNS = ['token', 'customer', 'email', 'items', 'total', 'status', 'payment', 'date']
+
+
+def parse_options(params):
+    """Validate export query parameters.
+
+    Returns:
+        tuple: (orders queryset, list of column keys)
+
+    Raises:
+        ValueError: for unknown columns, statuses, payment methods or bad dates
+    """
+    columns = [c.strip() for c in params.get('columns', '').split(',') if c.strip()] or DEFAULT_COLUMNS
+    unknown = [c for c in columns if c not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+
+    orders = Order.objects.exclude(status='payment_pending')
+    # Local-day bounds rather than __date lookups, which need MySQL's timezone tables
+    for name, lookup, days in (('start', 'created_at__gte', 0), ('end', 'created_at__lt', 1)):
+        if params.get(name):
+            day = parse_date(params[name])
+            if day is None:
+                raise ValueError(f"Invalid {name} date, use YYYY-MM-DD")
+            orders = orders.filter(**{lookup: timezone.make_aware(datetime.combine(day + timedelta(days=days), time.min))})
+
+    status = params.get('status', 'all')
+    if status and status != 'all':
+        statuses = status.split(',')
+        if any(s not in STATUS_LABELS for s in statuses):
+            raise ValueError(f"Unknown status: {status}")
+        orders = orders.filter(status__in=statuses)
+
+    payment = params.get('payment')
+    if payment:
+        if payment not in PAYMENT_LABELS:
+            raise ValueError(f"Unknown payment method: {payment}")
+        orders = orders.filter(payment_method=payment)
+    return orders.order_by('-created_at'), columns
+
+
+def _format(column, value):
+    if column == 'total':
+        return float(value)
+    if column == 'status':
+        return STATUS_LABELS.get(value, value)
+    if column == 'payment':
+        return PAYMENT_LABELS.get(value, value)
+    if column == 'delivery':
+        return DELIVERY_LABELS.get(value, value)
+    if column == 'paid':
+        return 'Yes' if value else 'No'
+    if column == 'date':
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+    return value
+
+
+def csv_chunks(orders, columns, chunk_size=CHUNK_SIZE):
+    """Yield the CSV as encoded chunks, one per chunk_size orders (header first)"""
+    fields = list(dict.fromkeys(['id'] + [COLUMNS[c][1] for c in columns if COLUMNS[c][1]]))
+    with_items = 'items' in columns
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([COLUMNS[c][0] for c in columns])
+
+    rows = orders.values_list(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        items = {}
+        if with_items:
+            lines = (OrderItem.objects.filter(order_id__in=[row[0] for row in batch])
+                     .order_by('id').values_list('order_id', 'quantity', 'item_name'))
+            for order_id, quantity, item_name in lines:
+                items.setdefault(order_id, []).append(f"{quantity}x {item_name}")
+        for row in batch:
+            values = dict(zip(fields, row))
+            writer.writerow([
+                ', '.join(items.get(row[0], [])) if c == 'items' else _format(c, values[COLUMNS[c][1]])
+                for c in columns
+            ])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header only
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,204 @@
+"""Live metric deltas for the admin dashboards.
+
+Every order that is placed or changes status produces one small event —
+revenue +X, orders +1, active orders ±1, per-tab count changes and, for a
+newly placed order, its table row. Events are numbered, kept in the cache
+for a few minutes and pushed to the ``admin_live`` channel group. The
+dashboards load one snapshot (which carries the sequence number it was taken
+at), then apply the events after it — over the WebSocket at ``ws/admin/`` or,
+where that is unavailable, by polling ``events_since`` (each poll answers
+straight away, so no worker is held open). A gap in the sequence, or a bulk
+change that bypassed the order signals, tells the page to reload its snapshot.
+
+The sequence counter and event log must live in a cache every worker shares
+(Redis, Memcached, the database cache): with the per-process LocMemCache
+default each gunicorn worker numbers its own events. ``ADMIN_LIVE_EVENTS``
+turns them on; it defaults to DEBUG (runserver is a single process). When it
+is off, snapshots carry no sequence number and the pages just re-poll them.
+
+Kitchen staff follow the orders page through the same stream, but see it
+through ``for_viewer``: the revenue deltas are for admins only.
+"""
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .stats import ACTIVE_STATUSES, resolve_range
+
+logger = logging.getLogger(__name__)
+
+GROUP = 'admin_live'
+SEQ_KEY = 'adminlive:seq'
+EVENT_TTL = 300          # seconds an event can be replayed to a reconnecting page
+RANGES = ('today', '7days', '30days', 'all')
+MAX_REPLAY = 1000        # further behind than this, a snapshot reload is cheaper
+MAX_BULK_EVENTS = 50     # a bulk change of more orders than this is sent as one resync
+ADMIN_ONLY_FIELDS = ('revenue',)
+
+# admin orders page tab -> statuses
+TABS = {
+    'pending': ('pending', 'confirmed'),
+    'preparing': ('preparing',),
+    'ready': ('ready',),
+    'completed': ('delivered', 'collected'),
+}
+
+
+def _event_key(seq):
+    return f'adminlive:event:{seq}'
+
+
+def enabled():
+    """Whether live events are kept (needs a cache shared by every worker, see above)"""
+    return getattr(settings, 'ADMIN_LIVE_EVENTS', True)
+
+
+def current_seq():
+    """Sequence number of the newest event (0 before the first one), None when live events are off"""
+    return cache.get(SEQ_KEY, 0) if enabled() else None
+
+
+def _next_seq():
+    cache.add(SEQ_KEY, 0, None)
+    return cache.incr(SEQ_KEY)
+
+
+def _placed(status):
+    return status is not None and status != 'payment_pending'
+
+
+def _tab(status):
+    return next((tab for tab, statuses in TABS.items() if status in statuses), None)
+
+
+def order_row(order):
+    """The order as a row of the recent-orders / orders tables"""
+    items = list(order.items.all())
+    return {
+        'id': order.id,
+        'token_number': order.token_number,
+        'username': order.user.username,
+        'email': order.user.email[:22],
+        'user_id': order.user_id,
+        'items': [{'quantity': oi.quantity, 'item_name': oi.item_name[:15]} for oi in items[:2]],
+        'items_count': len(items),
+        'total_amount': float(order.total_amount),
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'created_at': order.created_at.strftime('%b %d, %H:%M'),
+        'scheduled_for': order.scheduled_for.strftime('%b %d, %H:%M') if order.scheduled_for else None,
+    }
+
+
+def order_delta(order, old_status, old_paid):
+    """The dashboard changes caused by one order's (status, is_paid) transition.
+
+    Returns:
+        dict or None: the event, or None when no dashboard number moves
+    """
+    was_placed, placed = _placed(old_status), _placed(order.status)
+    if not was_placed and not placed:
+        return None
+    amount = float(order.total_amount)
+    revenue = (amount if placed and order.is_paid else 0) - (amount if was_placed and old_paid else 0)
+    active = int(order.status in ACTIVE_STATUSES) - int(old_status in ACTIVE_STATUSES)
+
+    tabs = {}
+    if placed != was_placed:
+        tabs['all'] = 1 if placed else -1
+    old_tab, new_tab = (_tab(old_status) if was_placed else None), (_tab(order.status) if placed else None)
+    if old_tab != new_tab:
+        if old_tab:
+            tabs[old_tab] = -1
+        if new_tab:
+            tabs[new_tab] = 1
+
+    ranges = [name for name in RANGES
+              if name == 'all' or order.created_at >= resolve_range(name)[1]]
+    return {
+        'type': 'order',
+        'id': order.id,
+        'token_number': order.token_number,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'ranges': ranges,
+        'revenue': round(revenue, 2),
+        'orders': tabs.get('all', 0),
+        'active': active,
+        'tabs': tabs,
+        'new': placed and not was_placed,
+    }
+
+
+def for_viewer(event, is_admin):
+    """The event as a viewer may see it: non-admins get it without the revenue delta"""
+    if is_admin:
+        return event
+    return {key: value for key, value in event.items() if key not in ADMIN_ONLY_FIELDS}
+
+
+def publish(event):
+    """Number an event, keep it for replay and push it to every connected dashboard"""
+    event['seq'] = _next_seq()
+    cache.set(_event_key(event['seq']), event, EVENT_TTL)
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:  # without one the pages poll events_since instead
+        async_to_sync(channel_layer.group_send)(GROUP, {'type': 'live_event', 'event': event})
+    return event['seq']
+
+
+def on_order_change(order, old_status, old_paid):
+    """Publish an order's dashboard delta once the transaction that changed it commits"""
+    if not enabled():
+        return
+    event = order_delta(order, old_status, old_paid)
+    if event is None:
+        return
+
+    def send():
+        if event['new']:  # built at commit time so the order's items are in place
+            event['row'] = order_row(order)
+        publish(event)
+    transaction.on_commit(send)
+
+
+def on_bulk_change(orders, old, reason=''):
+    """Publish the deltas of orders changed by a bulk update() — or one resync for a big batch.
+
+    Args:
+        old: {order id: (status, is_paid) before the update}
+    """
+    if not enabled():
+        return
+    if len(orders) > MAX_BULK_EVENTS:
+        resync(reason)
+        return
+    for order in orders:
+        on_order_change(order, *old[order.id])
+
+
+def resync(reason=''):
+    """Tell every dashboard to reload its snapshot, e.g. after a bulk update() of orders"""
+    if enabled():
+        transaction.on_commit(lambda: publish({'type': 'resync', 'reason': reason}))
+
+
+def events_since(seq):
+    """The events after `seq`, oldest first.
+
+    Returns:
+        list or None: None when some of them have already expired (the page must resync)
+    """
+    last = current_seq()
+    if last is None or seq >= last:
+        return []
+    if last - seq > MAX_REPLAY:
+        return None
+    found = cache.get_many([_event_key(n) for n in range(seq + 1, last + 1)])
+    events = [found.get(_event_key(n)) for n in range(seq + 1, last + 1)]
+    if any(e is None for e in events):
+        return None
+    return events
+
@@ -0,0 +1,19 @@
+"""
+Management command to recompute the denormalized per-user order stats
+(UserStats) from orders. Run nightly to catch drift, and after bulk imports,
+raw SQL fixes or deleting orders, none of which go through the order signals.
+"""
+from django.core.management.base import BaseCommand
+from accounts import user_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute per-user order count, spend, last order and favorite item from orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only reconcile this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        fixed = user_stats.reconcile(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"User stats reconciled: {fixed} rows created or corrected"))
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-19 04:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_validstaff'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, help_text='Paid orders only', max_digits=12)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('favorite_item', models.CharField(blank=True, max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User stats',
+                'indexes': [models.Index(fields=['order_count'], name='userstats_orders_idx'), models.Index(fields=['total_spent'], name='userstats_spent_idx'), models.Index(fields=['last_order_at'], name='userstats_last_order_idx')],
+            },
+        ),
+    ]
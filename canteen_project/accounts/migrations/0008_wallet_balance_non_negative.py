@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-19 04:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_userstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='userprofile',
+            constraint=models.CheckConstraint(condition=models.Q(('wallet_balance__gte', 0)), name='wallet_balance_non_negative'),
+        ),
+    ]
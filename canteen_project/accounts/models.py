@@ -18,6 +18,11 @@ class UserProfile(models.Model):
     phone = models.CharField(max_length=15, blank=True)
     college_id = models.CharField(max_length=30, blank=True)
     wallet_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(wallet_balance__gte=0), name='wallet_balance_non_negative'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.role}"
@@ -38,7 +43,9 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+    # The balance only changes through payments.wallet; never write back a stale copy of it
+    instance.profile.save(update_fields=[f.name for f in UserProfile._meta.concrete_fields
+                                         if f.name not in ('id', 'user', 'wallet_balance')])
 
 class ValidStudent(models.Model):
     """Whitelist of valid student registration numbers"""
@@ -108,3 +115,30 @@ class Feedback(models.Model):
     def can_transition_to(self, new_status):
         """Check if transitioning to the new status is allowed"""
         return new_status in self.VALID_TRANSITIONS.get(self.status, [])
+
+
+class UserStats(models.Model):
+    """Denormalized order totals per user for the admin user list and profile page.
+
+    Kept current from the order signals by ``accounts.user_stats`` (placed
+    orders only — not awaiting payment, not cancelled); ``manage.py
+    reconcile_user_stats`` recomputes it from orders. Kept off UserProfile so
+    the profile write-back on every user save can't clobber the counters.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Paid orders only")
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    favorite_item = models.CharField(max_length=100, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'User stats'
+        indexes = [
+            models.Index(fields=['order_count'], name='userstats_orders_idx'),
+            models.Index(fields=['total_spent'], name='userstats_spent_idx'),
+            models.Index(fields=['last_order_at'], name='userstats_last_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.order_count} orders, ₹{self.total_spent}"
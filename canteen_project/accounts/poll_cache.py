@@ -0,0 +1,89 @@
+"""Short-TTL cache for the JSON APIs that every open admin/kitchen tab polls.
+
+Responses are shared between staff users and keyed by view and query string
+(so each range/filter gets its own entry). When an entry goes stale, one
+request takes a lock and recomputes while everyone else keeps getting the
+stale copy; on a cold key the others wait briefly for that one computation
+instead of all running it. Ten open dashboards then cost one computation per
+interval rather than ten.
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10   # seconds a response is served as fresh
+STALE_SECONDS = 60     # extra seconds it may be served while being recomputed
+LOCK_SECONDS = 10      # upper bound on one recomputation
+WAIT_INTERVAL = 0.05
+
+
+def cache_key(view_name, request):
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.GET.items()))
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f'pollcache:{view_name}:{digest}'
+
+
+def _cached_response(entry, state):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Poll-Cache'] = state
+    return response
+
+
+def poll_cache(timeout=DEFAULT_TIMEOUT, roles=('admin',), stale=STALE_SECONDS, bypass=()):
+    """Cache a polled GET view for staff in the given roles.
+
+    Put it below the login decorator. Requests from other users, and non-GET
+    requests, go straight to the view so its own access check still applies,
+    as do requests carrying any of the `bypass` query parameters (e.g. a
+    detail lookup that must reflect an edit made a moment ago).
+    Only 200 responses are cached. Set POLL_CACHE_ENABLED = False to turn it
+    off, e.g. when benchmarking the views themselves.
+    """
+    def decorator(view_func):
+        name = f'{view_func.__module__}.{view_func.__name__}'
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            profile = getattr(request.user, 'profile', None)
+            if (not getattr(settings, 'POLL_CACHE_ENABLED', True) or request.method != 'GET'
+                    or profile is None or profile.role not in roles
+                    or any(param in request.GET for param in bypass)):
+                return view_func(request, *args, **kwargs)
+
+            key = cache_key(name, request)
+            entry = cache.get(key)
+            if entry and entry['fresh_until'] > time.time():
+                return _cached_response(entry, 'hit')
+
+            if not cache.add(f'{key}:lock', 1, LOCK_SECONDS):
+                if entry:  # another request is already recomputing
+                    return _cached_response(entry, 'stale')
+                deadline = time.time() + LOCK_SECONDS
+                while time.time() < deadline:
+                    time.sleep(WAIT_INTERVAL)
+                    entry = cache.get(key)
+                    if entry:
+                        return _cached_response(entry, 'hit')
+                logger.warning(f"Poll cache wait for {name} timed out, computing directly")
+                return view_func(request, *args, **kwargs)
+
+            try:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cache.set(key, {
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                        'fresh_until': time.time() + timeout,
+                    }, timeout + stale)
+            finally:
+                cache.delete(f'{key}:lock')
+            response['X-Poll-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,92 @@
+"""Admin dashboard statistics shared by the overview page and its polling API.
+
+All order headline numbers come from one conditional-aggregation query over
+orders and the user numbers from one more, instead of a query per metric;
+top sellers are read from the daily sales rollups.
+"""
+import logging
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from orders import rollups
+from orders.models import Order
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['pending', 'confirmed', 'preparing', 'ready']
+SALES_STATUSES = ['pending', 'confirmed', 'preparing', 'ready', 'delivered', 'collected']
+
+
+def resolve_range(time_range):
+    """Map a dashboard range name to its start datetime.
+
+    Returns:
+        tuple: (time_range, start_date or None for 'all', today_start)
+    """
+    now = timezone.localtime(timezone.now())
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if time_range == '7days':
+        start_date = today_start - timedelta(days=7)
+    elif time_range == '30days':
+        start_date = today_start - timedelta(days=30)
+    elif time_range == 'today':
+        start_date = today_start
+    else:
+        start_date = None
+        time_range = 'all'
+    return time_range, start_date, today_start
+
+
+def order_metrics(start_date, today_start):
+    """Revenue, order counts and today's deltas in a single pass over orders.
+
+    Returns:
+        dict: total_revenue, total_orders, active_orders, todays_revenue, todays_orders
+    """
+    placed = ~Q(status='payment_pending')
+    in_range = placed & Q(created_at__gte=start_date) if start_date else placed
+    today = placed & Q(created_at__gte=today_start)
+
+    totals = Order.objects.aggregate(
+        total_revenue=Sum('total_amount', filter=in_range & Q(is_paid=True)),
+        total_orders=Count('id', filter=in_range),
+        active_orders=Count('id', filter=Q(status__in=ACTIVE_STATUSES)),
+        todays_revenue=Sum('total_amount', filter=today & Q(is_paid=True)),
+        todays_orders=Count('id', filter=today),
+    )
+    totals['total_revenue'] = totals['total_revenue'] or 0
+    totals['todays_revenue'] = totals['todays_revenue'] or 0
+    return totals
+
+
+def user_metrics(today_start):
+    """Active users and sign-ups in the last 7 days in one query.
+
+    Returns:
+        dict: total_users, new_users
+    """
+    return User.objects.aggregate(
+        total_users=Count('id', filter=Q(is_active=True)),
+        new_users=Count('id', filter=Q(date_joined__gte=today_start - timedelta(days=7))),
+    )
+
+
+def top_sellers(start_date, limit=5):
+    """Best-selling items by quantity (revenue counts paid orders only), from the daily rollups"""
+    items = rollups.item_sales(start_date.date() if start_date else None, SALES_STATUSES, limit=limit)
+    return [{'item_name': i['name'], 'qty': i['qty'], 'revenue': i['paid_revenue']} for i in items]
+
+
+def dashboard_stats(time_range):
+    """Every headline number on the admin dashboard for a range.
+
+    Returns:
+        dict: time_range plus the order_metrics, user_metrics and top_sellers results
+    """
+    time_range, start_date, today_start = resolve_range(time_range)
+    stats = {'time_range': time_range}
+    stats.update(order_metrics(start_date, today_start))
+    stats.update(user_metrics(today_start))
+    stats['top_sellers'] = top_sellers(start_date)
+    return stats
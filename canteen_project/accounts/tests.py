@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from allauth.socialaccount.models import SocialApp
@@ -166,3 +166,397 @@ class SecurityTests(TestCase):
         # Verify password didn't change
         self.user.refresh_from_db()
         self.assertTrue(self.user.check_password('oldpassword123'))
+
+
+class DashboardStatsTest(TestCase):
+    """Tests for the single-pass admin dashboard statistics"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user(username='statsadmin', password='password')
+        self.admin_user.profile.role = 'admin'
+        self.admin_user.profile.save()
+        student = User.objects.create_user(username='statsstudent', password='password')
+        Order.objects.create(user=student, total_amount=Decimal('100.00'), status='collected', is_paid=True)
+        Order.objects.create(user=student, total_amount=Decimal('40.00'), status='preparing', is_paid=True)
+        Order.objects.create(user=student, total_amount=Decimal('25.00'), status='pending')
+        Order.objects.create(user=student, total_amount=Decimal('999.00'), status='payment_pending')
+
+    def test_dashboard_stats_values(self):
+        """Headline numbers match the per-metric definitions"""
+        from accounts.stats import dashboard_stats
+        stats = dashboard_stats('all')
+        self.assertEqual(stats['total_revenue'], Decimal('140.00'))
+        self.assertEqual(stats['total_orders'], 3)
+        self.assertEqual(stats['active_orders'], 2)
+        self.assertEqual(stats['todays_revenue'], Decimal('140.00'))
+        self.assertEqual(stats['todays_orders'], 3)
+        self.assertEqual(stats['total_users'], 2)
+        self.assertEqual(stats['new_users'], 2)
+
+    def test_dashboard_stats_query_count(self):
+        """Order and user metrics take one query each, top sellers one rollup and one live query"""
+        from accounts.stats import dashboard_stats
+        with self.assertNumQueries(4):
+            dashboard_stats('7days')
+
+    def test_dashboard_api_uses_shared_stats(self):
+        """The polling API returns the same numbers as the service"""
+        self.client.force_login(self.admin_user)
+        data = self.client.get(reverse('custom_admin_dashboard_api')).json()
+        self.assertEqual(data['total_revenue'], 140.0)
+        self.assertEqual(data['total_orders'], 3)
+        self.assertEqual(data['active_orders'], 2)
+
+
+class TrendBucketingTest(TestCase):
+    """Tests for the NumPy revenue bucketing behind the admin charts"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user(username='trendadmin', password='password')
+        self.admin_user.profile.role = 'admin'
+        self.admin_user.profile.save()
+        student = User.objects.create_user(username='trendstudent', password='password')
+        from datetime import datetime
+        from django.utils import timezone
+        tz = timezone.get_current_timezone()
+        # Mon 23:30 IST is still Monday 18:00 UTC; Tue 00:15 IST is Monday 18:45 UTC
+        self.placed = [
+            (datetime(2025, 3, 3, 23, 30, tzinfo=tz), Decimal('100.00')),
+            (datetime(2025, 3, 4, 0, 15, tzinfo=tz), Decimal('40.00')),
+            (datetime(2025, 3, 12, 12, 5, tzinfo=tz), Decimal('25.50')),
+        ]
+        for created_at, amount in self.placed:
+            order = Order.objects.create(user=student, total_amount=amount, status='collected', is_paid=True)
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+
+    def _load(self):
+        from accounts import trends
+        return trends.load(Order.objects.all())
+
+    def test_buckets_use_local_time(self):
+        """Hourly, daily, weekly and heatmap buckets follow local (IST) dates and hours"""
+        from datetime import date
+        from accounts import trends
+        seconds, amounts = self._load()
+        hourly = trends.hourly(seconds, amounts)
+        self.assertEqual((hourly[23], hourly[0], hourly[12]), (100.0, 40.0, 25.5))
+
+        daily = trends.daily(seconds, amounts)
+        self.assertEqual(daily[0], (date(2025, 3, 3), 100.0))
+        self.assertEqual(daily[1], (date(2025, 3, 4), 40.0))
+        self.assertEqual(daily[-1], (date(2025, 3, 12), 25.5))
+        self.assertEqual(len(daily), 10)  # empty days are kept
+
+        self.assertEqual(trends.weekly(seconds, amounts), [(date(2025, 3, 3), 140.0), (date(2025, 3, 10), 25.5)])
+
+        cells = trends.heatmap(seconds, amounts)
+        self.assertEqual(cells.shape, (7, 24))
+        self.assertEqual((cells[0][23], cells[1][0], cells[2][12]), (100.0, 40.0, 25.5))
+
+    def test_chart_api_groups(self):
+        """The chart API returns week and heatmap trends on request"""
+        self.client.force_login(self.admin_user)
+        url = reverse('custom_admin_chart_data')
+        data = self.client.get(url, {'range': 'all', 'group': 'week'}).json()
+        self.assertEqual(data['trend_group'], 'week')
+        self.assertEqual([row['value'] for row in data['trend']], [140.0, 25.5])
+
+        data = self.client.get(url, {'range': 'all', 'group': 'heatmap'}).json()
+        self.assertEqual([row['label'] for row in data['trend']][:2], ['Mon', 'Tue'])
+        self.assertEqual(data['trend'][0]['values'][23], 100.0)
+
+        data = self.client.get(url, {'range': 'all', 'group': 'bogus'}).json()
+        self.assertEqual(data['trend_group'], 'day')
+
+
+class PollCacheTest(TestCase):
+    """Tests for the short-TTL cache in front of the polled staff APIs"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user(username='polladmin', password='password')
+        self.admin_user.profile.role = 'admin'
+        self.admin_user.profile.save()
+        self.student = User.objects.create_user(username='pollstudent', password='password')
+        self.url = reverse('custom_admin_dashboard_api')
+
+    def test_hit_within_ttl(self):
+        """A second poll inside the TTL is served from cache without queries"""
+        self.client.force_login(self.admin_user)
+        first = self.client.get(self.url)
+        self.assertEqual(first['X-Poll-Cache'], 'miss')
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as captured:
+            second = self.client.get(self.url)
+        self.assertEqual(second['X-Poll-Cache'], 'hit')
+        self.assertFalse([q for q in captured if 'orders_order' in q['sql']])
+        self.assertEqual(first.content, second.content)
+
+    def test_keys_vary_by_range(self):
+        """Each range gets its own entry"""
+        self.client.force_login(self.admin_user)
+        self.client.get(self.url, {'range': 'today'})
+        response = self.client.get(self.url, {'range': '7days'})
+        self.assertEqual(response['X-Poll-Cache'], 'miss')
+
+    def test_stale_served_while_recomputing(self):
+        """Past the TTL, requests that lose the lock get the stale copy"""
+        import time
+        from unittest import mock
+        from accounts.poll_cache import DEFAULT_TIMEOUT
+        self.client.force_login(self.admin_user)
+        self.client.get(self.url)
+        later = time.time() + DEFAULT_TIMEOUT + 1
+        with mock.patch('accounts.poll_cache.cache.add', return_value=False), \
+                mock.patch('accounts.poll_cache.time.time', return_value=later):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Poll-Cache'], 'stale')
+
+    def test_other_roles_bypass_cache(self):
+        """Users outside the cached roles still get the view's own access check"""
+        self.client.force_login(self.admin_user)
+        self.client.get(reverse('custom_admin_chart_data'))
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('custom_admin_chart_data'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_order_detail_not_cached(self):
+        """A detail lookup reflects an edit made within the TTL"""
+        from decimal import Decimal
+        from orders.models import Order
+        order = Order.objects.create(user=self.student, total_amount=Decimal('50.00'), status='pending')
+        self.client.force_login(self.admin_user)
+        url = reverse('custom_admin_orders_api')
+        self.client.get(url, {'detail_id': order.id})
+        Order.objects.filter(pk=order.pk).update(status='preparing')
+        response = self.client.get(url, {'detail_id': order.id})
+        self.assertNotIn('X-Poll-Cache', response)
+        self.assertEqual(response.json()['status'], 'preparing')
+
+
+class OrdersExportTest(TestCase):
+    """Tests for the streaming orders CSV export"""
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(username='exportadmin', password='password')
+        self.admin_user.profile.role = 'admin'
+        self.admin_user.profile.save()
+        student = User.objects.create_user(username='exportstudent', password='password', email='s@example.com')
+        self.orders = []
+        for n, status in enumerate(['collected', 'preparing', 'cancelled', 'payment_pending']):
+            order = Order.objects.create(user=student, total_amount=Decimal(10 * (n + 1)), status=status,
+                                         payment_method='upi' if n % 2 else 'cash')
+            OrderItem.objects.create(order=order, item_name='Tea', price=Decimal('10.00'), quantity=n + 1)
+            self.orders.append(order)
+        self.client.force_login(self.admin_user)
+        self.url = reverse('custom_admin_orders_export')
+
+    def _rows(self, response):
+        import csv
+        import io
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_default_export(self):
+        """All placed orders with their items, newest first"""
+        rows = self._rows(self.client.get(self.url))
+        self.assertEqual(rows[0], ['Order ID', 'Customer', 'Email', 'Items', 'Total', 'Status', 'Payment', 'Date'])
+        self.assertEqual(len(rows), 4)  # payment_pending is never exported
+        self.assertEqual(rows[-1][:6], [self.orders[0].token_number, 'exportstudent', 's@example.com',
+                                        '1x Tea', '10.0', 'Collected'])
+
+    def test_filters_and_columns(self):
+        """Status, payment and column selection narrow the export"""
+        rows = self._rows(self.client.get(self.url, {'status': 'collected,preparing', 'payment': 'upi',
+                                                     'columns': 'token,paid,total'}))
+        self.assertEqual(rows, [['Order ID', 'Paid', 'Total'], [self.orders[1].token_number, 'No', '20.0']])
+        self.assertEqual(self.client.get(self.url, {'columns': 'token,secret'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': 'yesterday'}).status_code, 400)
+
+    def test_chunked_and_gzip(self):
+        """Small chunks keep one item query per chunk and gzip round-trips"""
+        import gzip
+        from django.http import QueryDict
+        from accounts import export
+        orders, columns = export.parse_options(QueryDict(''))
+        with self.assertNumQueries(3):  # orders cursor + one item query per chunk of two
+            chunks = list(export.csv_chunks(orders, columns, chunk_size=2))
+        self.assertEqual(len(chunks), 2)
+
+        response = self.client.get(self.url, {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        text = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(text.count('\n'), 4)
+
+
+class UserStatsTest(TestCase):
+    """Tests for the denormalized per-user order stats"""
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(username='usersadmin', password='password')
+        self.admin_user.profile.role = 'admin'
+        self.admin_user.profile.save()
+        self.student = User.objects.create_user(username='statsbuyer', password='password')
+
+    def _order(self, user, total, item='Tea', quantity=1):
+        order = Order.objects.create(user=user, total_amount=Decimal(total))
+        OrderItem.objects.create(order=order, item_name=item, price=Decimal(total), quantity=quantity)
+        return order
+
+    def _stats(self, user):
+        from accounts.models import UserStats
+        return UserStats.objects.get(user=user)
+
+    def test_stats_follow_order_events(self):
+        """Placing, paying and cancelling orders keeps the stats current"""
+        from accounts import user_stats
+        first = self._order(self.student, '30.00', 'Coffee', 3)
+        second = self._order(self.student, '50.00', 'Biryani', 1)
+        self.assertFalse(hasattr(User.objects.get(pk=self.student.pk), 'stats'))  # awaiting payment
+
+        for order in (first, second):
+            order.status = 'pending'
+            order.save()
+        stats = self._stats(self.student)
+        self.assertEqual((stats.order_count, stats.total_spent, stats.favorite_item), (2, 0, 'Coffee'))
+        self.assertEqual(stats.last_order_at, second.created_at)
+
+        first.is_paid = True
+        first.save()
+        second.status = 'cancelled'
+        second.save()
+        stats = self._stats(self.student)
+        self.assertEqual((stats.order_count, stats.total_spent), (1, Decimal('30.00')))
+        self.assertEqual(stats.last_order_at, first.created_at)
+        self.assertEqual(user_stats.reconcile(), 0)  # nothing drifted
+
+    def test_reconcile_fixes_bulk_updates(self):
+        """update() bypasses signals; reconcile brings the row back in line"""
+        from accounts import user_stats
+        order = self._order(self.student, '40.00')
+        Order.objects.filter(pk=order.pk).update(status='collected', is_paid=True)
+        self.assertEqual(user_stats.refresh_orders(Order.objects.filter(pk=order.pk)), {self.student.id})
+        stats = self._stats(self.student)
+        self.assertEqual((stats.order_count, stats.total_spent, stats.favorite_item), (1, Decimal('40.00'), 'Tea'))
+
+    def test_admin_users_sorts_on_stats(self):
+        """The user list sorts and filters on the stats columns"""
+        big = User.objects.create_user(username='bigspender', password='password')
+        for user, total in ((self.student, '20.00'), (big, '90.00')):
+            order = self._order(user, total)
+            order.status = 'collected'
+            order.is_paid = True
+            order.save()
+
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('custom_admin_users'), {'sort': 'spent', 'activity': 'buyers'})
+        users = list(response.context['users'])
+        self.assertEqual([u.username for u in users], ['bigspender', 'statsbuyer'])
+        self.assertEqual((users[0].order_count, users[0].total_spent), (1, Decimal('90.00')))
+
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual((response.context['order_count'], response.context['favorite_item']), (1, 'Tea'))
+
+
+class AdminLiveTest(TestCase):
+    """Tests for the live dashboard deltas and their event stream"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user(username='liveadmin', password='password')
+        self.admin_user.profile.role = 'admin'
+        self.admin_user.profile.save()
+        self.student = User.objects.create_user(username='livebuyer', password='password')
+
+    def _place(self, total='45.00'):
+        order = Order.objects.create(user=self.student, total_amount=Decimal(total))
+        OrderItem.objects.create(order=order, item_name='Dosa', price=Decimal(total), quantity=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'pending'
+            order.is_paid = True
+            order.save()
+        return order
+
+    def test_order_events_carry_deltas(self):
+        """Placing and progressing an order publishes numbered metric deltas"""
+        from accounts import live
+        order = self._place()
+        placed, = live.events_since(0)
+        self.assertEqual((placed['seq'], placed['revenue'], placed['orders'], placed['active']), (1, 45.0, 1, 1))
+        self.assertEqual(placed['tabs'], {'all': 1, 'pending': 1})
+        self.assertEqual(placed['ranges'], ['today', '7days', '30days', 'all'])
+        self.assertEqual(placed['row']['items'], [{'quantity': 1, 'item_name': 'Dosa'}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'collected'
+            order.save()
+        collected, = live.events_since(1)
+        self.assertEqual((collected['revenue'], collected['orders'], collected['active']), (0, 0, -1))
+        self.assertEqual(collected['tabs'], {'pending': -1, 'completed': 1})
+        self.assertNotIn('row', collected)
+
+        cache.delete('adminlive:event:1')
+        self.assertIsNone(live.events_since(0))  # expired: the page must reload its snapshot
+
+    def test_snapshot_and_events(self):
+        """The snapshot carries its sequence number; polling returns what came after it"""
+        self.client.force_login(self.admin_user)
+        snapshot = self.client.get(reverse('custom_admin_dashboard_api')).json()
+        self.assertEqual(snapshot['seq'], 0)
+        self._place('60.00')
+
+        data = self.client.get(reverse('custom_admin_live_events'), {'since': snapshot['seq']}).json()
+        self.assertEqual(data['seq'], 1)
+        self.assertEqual([e['revenue'] for e in data['events']], [60.0])
+        self.assertEqual(self.client.get(reverse('custom_admin_live_events'), {'since': 1}).json()['events'], [])
+
+        kitchen = User.objects.create_user(username='livekitchen', password='password')
+        kitchen.profile.role = 'kitchen'
+        kitchen.profile.save()
+        self.client.force_login(kitchen)
+        event, = self.client.get(reverse('custom_admin_live_events'), {'since': 0}).json()['events']
+        self.assertNotIn('revenue', event)  # kitchen staff follow the orders, not the takings
+        self.assertEqual(event['tabs'], {'all': 1, 'pending': 1})
+
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('custom_admin_live_events'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_snapshot_seq_read_after_queries(self):
+        """An event published while the snapshot is computed is not replayed on top of it"""
+        from unittest import mock
+        from accounts import admin_views
+        self.client.force_login(self.admin_user)
+        real_stats = admin_views.dashboard_stats
+
+        def stats_then_order(time_range):
+            stats = real_stats(time_range)
+            self._place('30.00')  # lands after the stats were read
+            return stats
+
+        with mock.patch.object(admin_views, 'dashboard_stats', stats_then_order):
+            snapshot = self.client.get(reverse('custom_admin_dashboard_api')).json()
+        self.assertEqual(snapshot['seq'], 1)
+
+    @override_settings(ADMIN_LIVE_EVENTS=False)
+    def test_disabled_without_shared_cache(self):
+        """With live events off nothing is published and pages are told to re-poll snapshots"""
+        from accounts import live
+        self._place()
+        self.assertIsNone(live.current_seq())
+        self.assertEqual(live.events_since(0), [])
+        self.client.force_login(self.admin_user)
+        self.assertIsNone(self.client.get(reverse('custom_admin_dashboard_api')).json()['seq'])
+        self.assertEqual(self.client.get(reverse('custom_admin_live_events')).json(), {'seq': None, 'events': []})
+
+    def test_publish_without_channel_layer(self):
+        """Events are still logged for polling when no channel layer is configured"""
+        from unittest import mock
+        from accounts import live
+        with mock.patch('accounts.live.get_channel_layer', return_value=None):
+            self._place()
+        self.assertEqual(len(live.events_since(0)), 1)
@@ -19,6 +19,11 @@ urlpatterns = [
     path('staff/dashboard/', RedirectView.as_view(pattern_name='custom_admin_overview'), name='admin_dashboard'),
     path('kitchen/', views.kitchen_dashboard, name='kitchen_dashboard'),
     path('kitchen/sales-summary/', views.kitchen_sales_summary, name='kitchen_sales_summary'),
+    path('kitchen/prep-board/', views.kitchen_prep_board, name='kitchen_prep_board'),
+    path('kitchen/queue/', views.kitchen_queue_api, name='kitchen_queue_api'),
+    path('kitchen/forecast/', views.kitchen_demand_forecast, name='kitchen_demand_forecast'),
+    path('kitchen/delivery-runs/', views.kitchen_delivery_runs, name='kitchen_delivery_runs'),
+    path('kitchen/pickup/', views.kitchen_pickup, name='kitchen_pickup'),
 
     # New Admin Panel
     path('admin-dashboard/', admin_views.admin_overview, name='custom_admin_overview'),
@@ -31,7 +36,9 @@ urlpatterns = [
     path('admin-dashboard/api/chart-data/', admin_views.admin_chart_data, name='custom_admin_chart_data'),
     path('admin-dashboard/api/stats/', admin_views.admin_dashboard_api, name='custom_admin_dashboard_api'),
     path('admin-dashboard/api/orders/', admin_views.admin_orders_api, name='custom_admin_orders_api'),
+    path('admin-dashboard/api/live/', admin_views.admin_live_events, name='custom_admin_live_events'),
     path('admin-dashboard/api/users/', admin_views.admin_users_api, name='custom_admin_users_api'),
+    path('admin-dashboard/api/mass-cancel/', admin_views.admin_mass_cancel_api, name='custom_admin_mass_cancel_api'),
     path('feedback/', views.feedback_view, name='user_feedback'),
 
     # OTP-Based Password Reset
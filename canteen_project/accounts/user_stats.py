@@ -0,0 +1,155 @@
+"""Per-user order statistics (UserStats) — maintained from order events.
+
+``on_order_change`` runs from the order post_save signal. Count and spend are
+adjusted with F() deltas; last order time and favorite item are re-derived
+from that one user's orders, and only when an order starts or stops counting.
+``apply_bulk_change`` folds in orders changed by a bulk ``update()``, and
+``reconcile`` recomputes everything from orders for drift.
+"""
+import logging
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from orders.models import Order, OrderItem
+from .models import UserStats
+
+logger = logging.getLogger(__name__)
+
+# Orders that don't count towards a user's stats
+UNCOUNTED_STATUSES = ('payment_pending', 'cancelled')
+
+
+def _counts(status):
+    return status is not None and status not in UNCOUNTED_STATUSES
+
+
+def _spend(status, is_paid, total):
+    return total if _counts(status) and is_paid else Decimal('0')
+
+
+def _favorite(user_id):
+    top = (
+        OrderItem.objects.filter(order__user_id=user_id)
+        .exclude(order__status__in=UNCOUNTED_STATUSES)
+        .values('item_name').annotate(qty=Sum('quantity')).order_by('-qty', 'item_name')[:1]
+    )
+    return top[0]['item_name'] if top else ''
+
+
+def _last_order_at(user_id):
+    return (Order.objects.filter(user_id=user_id).exclude(status__in=UNCOUNTED_STATUSES)
+            .aggregate(last=Max('created_at'))['last'])
+
+
+def _apply(user_id, **changes):
+    """Update one user's stats row, creating it on first use"""
+    if UserStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            UserStats.objects.create(user_id=user_id)
+    except IntegrityError:  # created concurrently
+        pass
+    UserStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def _deltas(order, old_status, old_paid):
+    """(count, spend) change of one order's (status, is_paid) transition"""
+    return (int(_counts(order.status)) - int(_counts(old_status)),
+            _spend(order.status, order.is_paid, order.total_amount)
+            - _spend(old_status, old_paid, order.total_amount))
+
+
+def _fold(user_id, count_delta, spend_delta):
+    if not count_delta and not spend_delta:
+        return
+    changes = {}
+    if count_delta:
+        changes['order_count'] = F('order_count') + count_delta
+        changes['last_order_at'] = _last_order_at(user_id)
+        changes['favorite_item'] = _favorite(user_id)
+    if spend_delta:
+        changes['total_spent'] = F('total_spent') + spend_delta
+    _apply(user_id, **changes)
+
+
+def on_order_change(order, old_status, old_paid):
+    """Fold one order's (status, is_paid) change into its user's stats"""
+    _fold(order.user_id, *_deltas(order, old_status, old_paid))
+
+
+def apply_bulk_change(orders, old):
+    """on_order_change for many orders at once, with one stats update per user.
+
+    Args:
+        orders: the orders with their new status and is_paid
+        old: {order id: (status, is_paid) before the update}
+    """
+    totals = {}
+    for order in orders:
+        count, spend = _deltas(order, *old[order.id])
+        user_count, user_spend = totals.get(order.user_id, (0, Decimal('0')))
+        totals[order.user_id] = (user_count + count, user_spend + spend)
+    for user_id, (count_delta, spend_delta) in totals.items():
+        _fold(user_id, count_delta, spend_delta)
+
+
+@transaction.atomic
+def reconcile(user_ids=None):
+    """Recompute stats from orders for the given users (default: everyone).
+
+    Returns:
+        int: stats rows that were missing or wrong and have been fixed
+    """
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    counted = ~Q(orders__status__in=UNCOUNTED_STATUSES)
+    expected = {
+        row['id']: row for row in users.values('id').annotate(
+            order_count=Count('orders', filter=counted),
+            total_spent=Sum('orders__total_amount', filter=counted & Q(orders__is_paid=True)),
+            last_order_at=Max('orders__created_at', filter=counted),
+        )
+    }
+
+    favorites = {}
+    items = OrderItem.objects.exclude(order__status__in=UNCOUNTED_STATUSES)
+    if user_ids is not None:
+        items = items.filter(order__user_id__in=user_ids)
+    for row in (items.values('order__user_id', 'item_name').annotate(qty=Sum('quantity'))
+                .order_by('order__user_id', '-qty', 'item_name')):
+        favorites.setdefault(row['order__user_id'], row['item_name'])
+
+    existing = {stats.user_id: stats for stats in UserStats.objects.filter(user_id__in=expected)}
+    fields = ('order_count', 'total_spent', 'last_order_at', 'favorite_item')
+    to_create, to_update = [], []
+    for user_id, row in expected.items():
+        values = {
+            'order_count': row['order_count'],
+            'total_spent': row['total_spent'] or Decimal('0'),
+            'last_order_at': row['last_order_at'],
+            'favorite_item': favorites.get(user_id, ''),
+        }
+        stats = existing.get(user_id)
+        if stats is None:
+            if values['order_count']:  # no row needed for users who never ordered
+                to_create.append(UserStats(user_id=user_id, **values))
+        elif any(getattr(stats, f) != v for f, v in values.items()):
+            for field, value in values.items():
+                setattr(stats, field, value)
+            to_update.append(stats)
+    UserStats.objects.bulk_create(to_create, batch_size=1000)
+    UserStats.objects.bulk_update(to_update, fields, batch_size=1000)
+    if to_update:
+        logger.warning(f"User stats reconcile corrected {len(to_update)} drifted rows")
+    return len(to_create) + len(to_update)
+
+
+def refresh_orders(orders):
+    """Reconcile the users owning a set of orders, e.g. after a bulk update() of their status"""
+    user_ids = set(orders.values_list('user_id', flat=True))
+    if user_ids:
+        reconcile(user_ids)
+    return user_ids
@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.conf import settings
 from django.http import JsonResponse
 from django.template.loader import render_to_string
@@ -13,12 +14,16 @@ from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from menu.models import MenuItem
+from orders import search as order_search
 from orders.models import Order, OrderItem
+from orders.transitions import InvalidTransition, TransitionConflict, transition
 from django.utils import timezone
 from allauth.account.models import EmailAddress
 from django.core.cache import cache
+from django.views.decorators.http import require_POST
 import time
 from .models import ValidStudent, ValidStaff, Feedback
+from .poll_cache import poll_cache
 import re
 import json
 import logging
@@ -454,12 +459,11 @@ def admin_dashboard(request):
         new_status = request.POST.get('status')
         try:
             order = Order.objects.get(id=order_id)
-            order.status = new_status
-            if new_status == 'collected':
-                order.is_paid = True
-            order.save()
+            transition(order, new_status, is_paid=True if new_status == 'collected' else None)
             messages.success(request, f'Order {order.token_number} marked as {new_status}')
-        except Order.DoesNotExist:
+        except TransitionConflict:
+            messages.warning(request, 'That order was just updated by someone else — please check it again')
+        except (Order.DoesNotExist, InvalidTransition):
             pass
         return redirect('admin_dashboard')
 
@@ -511,6 +515,11 @@ def kitchen_dashboard(request):
     if request.user.profile.role not in ['kitchen', 'admin']:
         messages.error(request, 'Access denied. Kitchen staff only.')
         return redirect('home')
+
+    # Station screens (?station=<slug>) only see and finish their own slice of each order
+    from orders.models import Station
+    station_slug = request.POST.get('station') or request.GET.get('station')
+    station = Station.objects.filter(slug=station_slug, is_active=True).first() if station_slug else None
     
     # Handle Bulk Actions
     if request.method == 'POST' and 'bulk_action' in request.POST:
@@ -518,14 +527,11 @@ def kitchen_dashboard(request):
         target_status = request.POST.get('target_status')
         
         if order_ids and target_status:
-            updated_count = 0
+            updated_count = conflicts = 0
             for order_id in order_ids:
                 try:
                     order = Order.objects.get(id=order_id)
-                    order.status = target_status
-                    if target_status == 'collected':
-                        order.is_paid = True
-                    order.save()
+                    transition(order, target_status, is_paid=True if target_status == 'collected' else None)
                     
                     # Send notification if ready
                     if target_status == 'ready':
@@ -536,13 +542,17 @@ def kitchen_dashboard(request):
                             pass # Fail silently for email in bulk to avoid blocking
                     
                     updated_count += 1
-                except Order.DoesNotExist:
+                except TransitionConflict:
+                    conflicts += 1
+                except (Order.DoesNotExist, InvalidTransition):
                     continue
             
             if updated_count > 0:
                 messages.success(request, f'Successfully updated {updated_count} orders to {target_status}')
             else:
                 messages.warning(request, 'No orders were updated')
+            if conflicts:
+                messages.warning(request, f'{conflicts} orders changed on another screen and were left as they are')
         return redirect('kitchen_dashboard')
 
     # Handle Menu Toggle (Kitchen can also manage availability)
@@ -573,11 +583,42 @@ def kitchen_dashboard(request):
         new_status = request.POST.get('status')
         try:
             order = Order.objects.get(id=order_id)
+
+            # A station finishing its slice only readies the order once every station is done
+            if station and new_status == 'ready':
+                from orders.stations import complete_station
+                _, order_ready = complete_station(order, station)
+                if order_ready:
+                    from orders.utils import send_order_ready_email
+                    send_order_ready_email(order)
+                msg = f'Order {order.token_number}: {station.name} done' + (' — order ready' if order_ready else '')
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse({'status': 'success', 'message': msg, 'order_ready': order_ready})
+                messages.success(request, msg)
+                return redirect(f"{reverse('kitchen_dashboard')}?station={station.slug}")
+
             old_status = order.status
-            order.status = new_status
-            if new_status == 'collected':
-                order.is_paid = True
-            order.save()
+            try:
+                # The board's drag lanes may skip a step or drag back to New, so only
+                # finished orders are protected here
+                transition(order, new_status, is_paid=True if new_status == 'collected' else None,
+                           expected_version=request.POST.get('version') or None, validate=False)
+            except TransitionConflict as exc:
+                current = exc.current
+                msg = f'Order {order.token_number} was updated on another screen'
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse({
+                        'status': 'conflict', 'message': msg,
+                        'current_status': current.status if current else None,
+                        'version': current.version if current else None,
+                    }, status=409)
+                messages.warning(request, msg)
+                return redirect('kitchen_dashboard')
+            except ValueError:  # unknown status or a malformed version
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse({'status': 'error', 'message': 'Invalid status'}, status=400)
+                messages.error(request, 'Invalid status')
+                return redirect('kitchen_dashboard')
             
             # Send notification email if order is ready
             if new_status == 'ready':
@@ -590,7 +631,8 @@ def kitchen_dashboard(request):
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 return JsonResponse({
                     'status': 'success',
-                    'message': f'Order {order.token_number} updated to {new_status}'
+                    'message': f'Order {order.token_number} updated to {new_status}',
+                    'version': order.version,
                 })
 
         except Order.DoesNotExist:
@@ -603,13 +645,10 @@ def kitchen_dashboard(request):
     status_filter = request.GET.get('status', 'active')
     search_query = request.GET.get('search', '').strip()
     
-    orders = Order.objects.all()
+    orders = Order.objects.select_related('user')
     
     if search_query:
-        orders = orders.filter(
-            Q(token_number__icontains=search_query) | 
-            Q(user__username__icontains=search_query)
-        ).order_by('-created_at')
+        orders = order_search.filter_orders(orders, search_query).order_by('-created_at')
     elif status_filter == 'all':
         orders = orders.filter(
             status__in=['pending', 'confirmed', 'preparing', 'ready']
@@ -622,6 +661,22 @@ def kitchen_dashboard(request):
         orders = orders.filter(status__in=['pending', 'confirmed']).order_by('created_at')
     else:
         orders = orders.filter(status=status_filter).order_by('-created_at')
+
+    if station:
+        from django.db.models import Prefetch
+        from orders.stations import station_item_filter
+        orders = orders.filter(
+            station_tickets__station=station, station_tickets__is_done=False
+        ).prefetch_related(Prefetch('items', queryset=OrderItem.objects.filter(station_item_filter(station)).distinct()))
+    else:
+        orders = orders.prefetch_related('items')
+
+    # Sequence the active queue with the kitchen scheduling policy (FIFO by default)
+    from orders.scheduler import POLICIES, get_policy, get_queue
+    queue_policy = get_policy(request.GET.get('policy'))
+    if not search_query and status_filter in ['all', 'active', 'pending']:
+        position = {order_id: i for i, order_id in enumerate(get_queue(queue_policy.name).sequence())}
+        orders = sorted(orders, key=lambda o: (position.get(o.id, len(position)), o.created_at))
     
     # Order counts by status
     # Pending now includes both unconfirmed and confirmed-waiting
@@ -652,6 +707,10 @@ def kitchen_dashboard(request):
         'menu_items': menu_items_qs.order_by('category', 'name'),
         'menu_count': menu_count,
         'menu_added_today': menu_added_today,
+        'station': station,
+        'stations': Station.objects.filter(is_active=True),
+        'queue_policy': queue_policy,
+        'queue_policies': POLICIES.values(),
         'active_page': 'kitchen',
     }
 
@@ -670,100 +729,69 @@ def kitchen_dashboard(request):
 
 
 @login_required
+@poll_cache(roles=('kitchen', 'admin'))
 def kitchen_sales_summary(request):
     """JSON API for kitchen sales analytics with date range filter"""
     if request.user.profile.role not in ['kitchen', 'admin']:
         return JsonResponse({'error': 'Access denied'}, status=403)
 
-    from django.db.models.functions import ExtractHour, TruncDate
-    from datetime import timedelta
+    from collections import Counter
+    from datetime import datetime, time, timedelta
+    from orders import rollups
 
-    today = timezone.now().date()
+    today = timezone.localdate()
     date_range = request.GET.get('range', 'all')
-    completed_statuses = ['delivered', 'collected']
+    completed_statuses = rollups.COMPLETED_STATUSES
 
     # Determine date filter
     if date_range == 'today':
-        base_orders = Order.objects.filter(created_at__date=today)
+        start = today
         range_label = "Today"
     elif date_range == 'week':
         start = today - timedelta(days=7)
-        base_orders = Order.objects.filter(created_at__date__gte=start)
         range_label = "Last 7 Days"
     elif date_range == 'month':
         start = today - timedelta(days=30)
-        base_orders = Order.objects.filter(created_at__date__gte=start)
         range_label = "Last 30 Days"
     else:
-        base_orders = Order.objects.all()
+        start = None
         range_label = "All Time"
 
-    completed_orders = base_orders.filter(status__in=completed_statuses)
-    non_cancelled = base_orders.exclude(status='cancelled')
-
-    # --- Summary Stats ---
-    total_orders = base_orders.count()
-    completed_count = completed_orders.count()
-    total_revenue = completed_orders.filter(is_paid=True).aggregate(
-        total=Sum('total_amount'))['total'] or 0
-    total_items_sold = OrderItem.objects.filter(
-        order__in=completed_orders
-    ).aggregate(total=Sum('quantity'))['total'] or 0
-    avg_order_value = completed_orders.filter(is_paid=True).aggregate(
-        avg=Avg('total_amount'))['avg'] or 0
-    cancelled_count = base_orders.filter(status='cancelled').count()
-    pending_revenue = non_cancelled.filter(is_paid=False).aggregate(
-        total=Sum('total_amount'))['total'] or 0
+    # --- Summary Stats (daily rollups + orders still in flight) ---
+    summary_rows = rollups.order_summary(start)
+    completed_rows = [r for r in summary_rows if r['status'] in completed_statuses]
+    completed_paid = [r for r in completed_rows if r['is_paid']]
+
+    total_orders = sum(r['orders'] for r in summary_rows)
+    completed_count = sum(r['orders'] for r in completed_rows)
+    total_revenue = sum(r['revenue'] for r in completed_paid)
+    total_items_sold = sum(r['items_sold'] for r in completed_rows)
+    paid_count = sum(r['orders'] for r in completed_paid)
+    avg_order_value = total_revenue / paid_count if paid_count else 0
+    cancelled_count = sum(r['orders'] for r in summary_rows if r['status'] == 'cancelled')
+    pending_revenue = sum(r['revenue'] for r in summary_rows if r['status'] != 'cancelled' and not r['is_paid'])
 
     # --- Top 5 Selling Items ---
-    top_items = (
-        OrderItem.objects.filter(order__in=completed_orders)
-        .values('item_name')
-        .annotate(
-            qty=Sum('quantity'),
-            revenue=Sum(ExpressionWrapper(
-                F('price') * F('quantity'),
-                output_field=DecimalField()
-            ))
-        )
-        .order_by('-qty')[:5]
-    )
     top_sellers = [
-        {'name': item['item_name'], 'qty': item['qty'],
-         'revenue': float(item['revenue'] or 0)}
-        for item in top_items
+        {'name': item['name'], 'qty': item['qty'], 'revenue': float(item['revenue'])}
+        for item in rollups.item_sales(start, completed_statuses, limit=5)
     ]
 
     # --- Category Breakdown ---
-    cat_data = (
-        OrderItem.objects.filter(order__in=completed_orders, menu_item__isnull=False)
-        .values('menu_item__category__name')
-        .annotate(
-            qty=Sum('quantity'),
-            revenue=Sum(ExpressionWrapper(
-                F('price') * F('quantity'),
-                output_field=DecimalField()
-            ))
-        )
-        .order_by('-revenue')
-    )
     categories = [
-        {'name': c['menu_item__category__name'] or 'Other',
-         'qty': c['qty'], 'revenue': float(c['revenue'] or 0)}
-        for c in cat_data
+        {'name': c['name'] or 'Other', 'qty': c['qty'], 'revenue': float(c['revenue'])}
+        for c in rollups.item_sales(start, completed_statuses, by='category')
     ]
 
     # --- Trend Data ---
     if date_range == 'today':
-        # Hourly trend for today
-        hourly = (
-            base_orders.exclude(status='cancelled')
-            .annotate(hour=ExtractHour('created_at'))
-            .values('hour')
-            .annotate(count=Count('id'))
-            .order_by('hour')
+        # Hourly trend for today, bucketed here: ExtractHour/__date need MySQL's timezone tables
+        today_start = timezone.make_aware(datetime.combine(today, time.min))
+        hourly_trend = Counter(
+            timezone.localtime(created_at).hour
+            for created_at in Order.objects.filter(created_at__gte=today_start)
+            .exclude(status='cancelled').values_list('created_at', flat=True)
         )
-        hourly_trend = {h['hour']: h['count'] for h in hourly}
         trend_data = [
             {'label': f"{h}:00", 'count': hourly_trend.get(h, 0)}
             for h in range(7, 23)
@@ -771,33 +799,22 @@ def kitchen_sales_summary(request):
         trend_type = 'hourly'
     else:
         # Daily trend for other ranges
-        daily = (
-            base_orders.exclude(status='cancelled')
-            .annotate(day=TruncDate('created_at'))
-            .values('day')
-            .annotate(count=Count('id'))
-            .order_by('day')
-        )
+        daily = rollups.daily_series(start, [s for s in rollups.ALL_STATUSES if s != 'cancelled'])
         trend_data = [
-            {'label': d['day'].strftime('%b %d'), 'count': d['count']}
-            for d in daily if d['day']
+            {'label': day.strftime('%b %d'), 'count': daily[day]['orders']}
+            for day in sorted(daily)
         ]
         trend_type = 'daily'
 
     # --- Payment Method Split ---
-    payment_data = (
-        completed_orders.filter(is_paid=True)
-        .values('payment_method')
-        .annotate(
-            count=Count('id'),
-            total=Sum('total_amount')
-        )
-        .order_by('-total')
-    )
+    by_method = {}
+    for r in completed_paid:
+        method = by_method.setdefault(r['payment_method'], {'count': 0, 'total': 0})
+        method['count'] += r['orders']
+        method['total'] += r['revenue']
     payments = [
-        {'method': p['payment_method'].upper(),
-         'count': p['count'], 'total': float(p['total'] or 0)}
-        for p in payment_data
+        {'method': name.upper(), 'count': p['count'], 'total': float(p['total'])}
+        for name, p in sorted(by_method.items(), key=lambda kv: -kv[1]['total'])
     ]
 
     return JsonResponse({
@@ -818,6 +835,130 @@ def kitchen_sales_summary(request):
         'payments': payments,
     })
 
+@login_required
+def kitchen_prep_board(request):
+    """JSON API: per-item quantities to batch-cook across the active queue"""
+    if request.user.profile.role not in ['kitchen', 'admin']:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    from orders.prep_board import get_board
+
+    include_slots = request.GET.get('slots') == 'true'
+    return JsonResponse(get_board(include_slots=include_slots))
+
+@login_required
+def kitchen_demand_forecast(request):
+    """JSON API: precomputed item demand for the coming hours (prep planning)"""
+    if request.user.profile.role not in ['kitchen', 'admin']:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    from orders.forecast import get_forecast
+
+    try:
+        hours = min(max(int(request.GET.get('hours', 6)), 1), 24)
+    except ValueError:
+        hours = 6
+    return JsonResponse(get_forecast(hours=hours))
+
+@login_required
+def kitchen_queue_api(request):
+    """JSON API: active orders in the sequence chosen by the kitchen scheduler"""
+    if request.user.profile.role not in ['kitchen', 'admin']:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    from orders.scheduler import get_policy, get_queue
+
+    policy = get_policy(request.GET.get('policy'))
+    sequence = get_queue(policy.name).sequence()
+    orders = Order.objects.in_bulk(sequence)
+    return JsonResponse({
+        'policy': policy.name,
+        'sequence': [
+            {'id': order.id, 'token': order.token_number, 'status': order.status,
+             'scheduled_for': order.scheduled_for.isoformat() if order.scheduled_for else None,
+             'delivery_type': order.delivery_type}
+            for order in (orders[order_id] for order_id in sequence if order_id in orders)
+        ],
+    })
+
+@login_required
+def kitchen_delivery_runs(request):
+    """JSON API for batched classroom/staffroom delivery runs.
+
+    GET lists runs that are not completed; POST takes an action:
+    plan | assign (run_id, optional runner_id) | dispatch (run_id) | complete (run_id)
+    """
+    if request.user.profile.role not in ['kitchen', 'admin']:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    from orders.models import DeliveryRun
+    from orders import delivery
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'plan':
+            runs = delivery.plan_runs()
+            return JsonResponse({'success': True, 'runs': [delivery.run_summary(r) for r in runs]})
+
+        try:
+            run = DeliveryRun.objects.get(id=request.POST.get('run_id'))
+        except (DeliveryRun.DoesNotExist, ValueError):
+            return JsonResponse({'success': False, 'message': 'Run not found'}, status=404)
+
+        if action == 'assign':
+            runner = request.user
+            runner_id = request.POST.get('runner_id')
+            if runner_id:
+                runner = User.objects.filter(
+                    id=runner_id, profile__role__in=['kitchen', 'admin'], is_active=True
+                ).first()
+                if not runner:
+                    return JsonResponse({'success': False, 'message': 'Runner not found'}, status=400)
+            if not delivery.assign_run(run, runner):
+                return JsonResponse({'success': False, 'message': 'Run already dispatched'}, status=409)
+            return JsonResponse({'success': True, 'run': delivery.run_summary(run)})
+
+        if action in ('dispatch', 'complete'):
+            handler = delivery.dispatch_run if action == 'dispatch' else delivery.complete_run
+            count = handler(run)
+            if not count and run.status not in ('out', 'completed'):
+                return JsonResponse({'success': False, 'message': f'Cannot {action} run in status {run.status}'}, status=409)
+            return JsonResponse({'success': True, 'updated': count, 'run': delivery.run_summary(run)})
+
+        return JsonResponse({'success': False, 'message': 'Invalid action'}, status=400)
+
+    runs = DeliveryRun.objects.exclude(status='completed').select_related('runner').prefetch_related('orders')
+    return JsonResponse({'runs': [delivery.run_summary(r) for r in runs]})
+
+@login_required
+@require_POST
+def kitchen_pickup(request):
+    """Counter pickup API: scanned QR payload(s) -> collected.
+
+    Single scan: POST code=<payload>; the HTTP status reflects the result.
+    Batch: POST a JSON body {"codes": [...]} (up to 50) and get one result per code.
+    """
+    if request.user.profile.role not in ['kitchen', 'admin']:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    from orders import pickup
+
+    if request.content_type == 'application/json':
+        try:
+            codes = json.loads(request.body).get('codes')
+        except (ValueError, AttributeError):
+            codes = None
+        if not isinstance(codes, list) or not codes or len(codes) > pickup.MAX_BATCH:
+            return JsonResponse({'error': f'Send "codes" as a list of 1-{pickup.MAX_BATCH} scans'}, status=400)
+        results = pickup.collect([str(code) for code in codes])
+        return JsonResponse({
+            'results': results,
+            'collected': sum(r['result'] == 'collected' for r in results),
+        })
+
+    result, = pickup.collect([request.POST.get('code', '')])
+    return JsonResponse(result, status=pickup.HTTP_STATUS[result['result']])
+
 @login_required
 def feedback_view(request):
     """View and submit user feedback"""
@@ -890,16 +1031,15 @@ def profile_view(request):
         messages.success(request, 'Profile updated successfully!')
         return redirect('profile')
     
-    # Order stats
-    order_count = Order.objects.filter(user=user).exclude(status='cancelled').count()
-    total_spent = Order.objects.filter(user=user, status='completed').aggregate(
-        total=Sum('total_amount')
-    )['total'] or 0
-    
+    # Order stats (denormalized, kept current from order events)
+    from .models import UserStats
+    stats = UserStats.objects.filter(user=user).first()
+
     context = {
         'profile': profile,
-        'order_count': order_count,
-        'total_spent': total_spent,
+        'order_count': stats.order_count if stats else 0,
+        'total_spent': stats.total_spent if stats else 0,
+        'favorite_item': stats.favorite_item if stats else '',
         'active_page': 'profile'
     }
     return render(request, 'accounts/profile.html', context)
@@ -274,6 +274,23 @@ STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
 
+# Apply Stripe webhook events in the webhook request. Turn off once the
+# process_stripe_events --loop worker runs (see render.yaml), which then applies them.
+STRIPE_EVENTS_INLINE = config('STRIPE_EVENTS_INLINE', default=True, cast=bool)
+
+# Online checkout gateway: stripe | fake (instant local payments for tests, demos and load tests)
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='stripe')
+# The fake gateway pays every order for free, so it is refused unless this is on
+FAKE_GATEWAY_ALLOWED = config('FAKE_GATEWAY_ALLOWED', default=DEBUG, cast=bool)
+
+# Live admin dashboard deltas. Their event log lives in the default cache, which must be
+# shared by every worker (Redis/Memcached/database cache) - the per-process LocMemCache
+# default only works under runserver. Off: the dashboards re-poll their snapshots.
+ADMIN_LIVE_EVENTS = config('ADMIN_LIVE_EVENTS', default=DEBUG, cast=bool)
+
+# Kitchen queue sequencing policy: fifo | edd (earliest due date) | spt (shortest prep first)
+KITCHEN_QUEUE_POLICY = config('KITCHEN_QUEUE_POLICY', default='fifo')
+
 SOCIALACCOUNT_PROVIDERS = {
     'google': {
         'SCOPE': [
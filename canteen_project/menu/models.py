@@ -40,13 +40,18 @@ class MenuItem(models.Model):
     
     @property
     def average_rating(self):
-        """Calculate average rating from reviews"""
-        avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
+        """Calculate average rating from reviews (uses a rating_avg annotation when present)"""
+        if hasattr(self, 'rating_avg'):
+            avg = self.rating_avg
+        else:
+            avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
         return round(avg, 1) if avg else 0
     
     @property
     def review_count(self):
-        """Get total number of reviews"""
+        """Get total number of reviews (uses a rating_count annotation when present)"""
+        if hasattr(self, 'rating_count'):
+            return self.rating_count
         return self.reviews.count()
 
 
@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Avg, Count, Q
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.http import JsonResponse
 import difflib
@@ -23,8 +23,10 @@ def menu_view(request):
     nonveg_only = request.GET.get('nonveg', '') == 'true'
     price_max = request.GET.get('price_max', '')
     
-    # Fetch and filter items
-    items = MenuItem.objects.all()
+    # Fetch and filter items (ratings annotated so cards don't query reviews one by one)
+    items = MenuItem.objects.select_related('category').annotate(
+        rating_avg=Avg('reviews__rating'), rating_count=Count('reviews')
+    )
     if selected_category:
         items = items.filter(category_id=selected_category)
     if veg_only:
@@ -247,7 +249,10 @@ def search_api(request):
 
     query_lower = query.lower()
     # Only return available items in search API
-    all_items = list(MenuItem.objects.filter(is_available=True).select_related('category'))
+    all_items = list(
+        MenuItem.objects.filter(is_available=True).select_related('category')
+        .annotate(rating_avg=Avg('reviews__rating'))
+    )
     items_by_id = {item.id: item for item in all_items}
     scored_items = []
     seen_ids = set()
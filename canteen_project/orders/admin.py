@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from django.db.models import F
 from django.utils import timezone
-from .models import Order, OrderItem
+from .models import Order, OrderItem, PrepBoardEntry, Station, OrderStationTicket, DeliveryRun, DemandForecast
+from accounts import live, user_stats
+from . import prep_board, rollups
+from .transitions import InvalidTransition, TransitionConflict, transition
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -28,7 +32,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': (('total_amount', 'payment_method'), 'is_paid')
         }),
         ('Delivery', {
-            'fields': ('delivery_type', 'delivery_location', 'delivery_fee'),
+            'fields': ('delivery_type', 'delivery_location', 'delivery_fee', 'delivery_run'),
             'classes': ('collapse',)
         }),
         ('Instructions', {
@@ -67,12 +71,20 @@ class OrderAdmin(admin.ModelAdmin):
     # --- Actions ---
     @admin.action(description='Confirm selected orders')
     def mark_confirmed(self, request, queryset):
-        updated = queryset.update(status='confirmed')
+        updated = queryset.update(status='confirmed', version=F('version') + 1)
+        prep_board.rebuild()  # update() skips the signals that maintain the board
+        rollups.refresh_orders(queryset)
+        user_stats.refresh_orders(queryset)
+        live.resync('admin action')
         self.message_user(request, f"{updated} orders marked as Confirmed.")
 
     @admin.action(description='Start Preparing')
     def mark_preparing(self, request, queryset):
-        updated = queryset.update(status='preparing')
+        updated = queryset.update(status='preparing', version=F('version') + 1)
+        prep_board.rebuild()  # update() skips the signals that maintain the board
+        rollups.refresh_orders(queryset)
+        user_stats.refresh_orders(queryset)
+        live.resync('admin action')
         self.message_user(request, f"{updated} orders marked as Preparing.")
 
     @admin.action(description='Mark as Ready')
@@ -80,19 +92,65 @@ class OrderAdmin(admin.ModelAdmin):
         # Trigger emails/notifications logic here if needed, but update() is raw SQL
         # For signals to fire, we should loop. But for bulk admin actions, speed is key.
         # If we want signals:
-        count = 0
+        count = conflicts = 0
         for order in queryset:
-            order.status = 'ready'
-            order.save() # triggers signals
-            count += 1
-        self.message_user(request, f"{count} orders marked as Ready.")
+            try:
+                transition(order, 'ready')  # triggers signals
+                count += 1
+            except (TransitionConflict, InvalidTransition):
+                conflicts += 1
+        self.message_user(request, f"{count} orders marked as Ready."
+                          + (f" {conflicts} were not preparing or changed meanwhile and were skipped." if conflicts else ""))
 
     @admin.action(description='Mark as Collected (Paid)')
     def mark_collected(self, request, queryset):
-        queryset.update(status='collected', is_paid=True)
+        queryset.update(status='collected', is_paid=True, version=F('version') + 1)
+        prep_board.rebuild()  # update() skips the signals that maintain the board
+        rollups.refresh_orders(queryset)
+        user_stats.refresh_orders(queryset)
+        live.resync('admin action')
         self.message_user(request, f"{queryset.count()} orders marked as Collected.")
 
     @admin.action(description='Cancel Orders')
     def mark_cancelled(self, request, queryset):
-        queryset.update(status='cancelled')
+        queryset.update(status='cancelled', version=F('version') + 1)
+        prep_board.rebuild()  # update() skips the signals that maintain the board
+        rollups.refresh_orders(queryset)
+        user_stats.refresh_orders(queryset)
+        live.resync('admin action')
         self.message_user(request, f"{queryset.count()} orders Cancelled.")
+
+
+@admin.register(PrepBoardEntry)
+class PrepBoardEntryAdmin(admin.ModelAdmin):
+    list_display = ('item_name', 'quantity', 'slot', 'updated_at')
+    list_filter = ('slot',)
+    search_fields = ('item_name',)
+
+
+@admin.register(Station)
+class StationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'is_default', 'is_active')
+    list_filter = ('is_active',)
+    prepopulated_fields = {'slug': ('name',)}
+    filter_horizontal = ('categories',)
+
+
+@admin.register(OrderStationTicket)
+class OrderStationTicketAdmin(admin.ModelAdmin):
+    list_display = ('order', 'station', 'is_done', 'done_at', 'created_at')
+    list_filter = ('station', 'is_done')
+    search_fields = ('order__token_number',)
+
+
+@admin.register(DeliveryRun)
+class DeliveryRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'block', 'runner', 'status', 'created_at', 'dispatched_at', 'completed_at')
+    list_filter = ('status', 'block')
+
+
+@admin.register(DemandForecast)
+class DemandForecastAdmin(admin.ModelAdmin):
+    list_display = ('item_name', 'hour_of_week', 'quantity', 'average', 'generated_at')
+    search_fields = ('item_name',)
+    ordering = ('hour_of_week', '-quantity')
@@ -0,0 +1,149 @@
+"""Endpoint benchmarks — wall time and SQL query budgets for the hot views.
+
+Each endpoint is called in-process through the Django test client as the
+right kind of user, a few times after a warm-up call, and compared against
+its budget. Query budgets are the main guard: they don't depend on the
+machine, and an N+1 (e.g. ``average_rating`` per card in a template) blows
+through them as soon as the data grows. Time budgets are generous and can be
+scaled per machine.
+
+The clients log in as dedicated ``bench_`` users, never as real customers:
+``place_order`` places real cash orders, so the benchmark is meant for a
+database filled by ``generate_load_data`` (see ``on_generated_data``).
+"""
+import json
+import logging
+import time
+from collections import namedtuple
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from menu.models import MenuItem
+from . import datagen
+from .loadtest import percentile
+
+logger = logging.getLogger(__name__)
+
+BENCH_PREFIX = 'bench_'
+
+Endpoint = namedtuple('Endpoint', ['name', 'role', 'method', 'url_name', 'params', 'max_queries', 'max_ms', 'needs_cart'])
+Endpoint.__new__.__defaults__ = ({}, 20, 500, False)
+
+ENDPOINTS = [
+    Endpoint('menu_view', 'student', 'get', 'menu', {}, max_queries=15, max_ms=800),
+    Endpoint('search_api', 'student', 'get', 'search_api', {'q': 'biryani'}, max_queries=10, max_ms=500),
+    Endpoint('menu_availability_api', 'student', 'get', 'menu_availability_api', max_queries=5, max_ms=200),
+    Endpoint('checkout', 'student', 'get', 'checkout', max_queries=12, max_ms=300, needs_cart=True),
+    Endpoint('place_order', 'student', 'post', 'place_order', {'payment_method': 'cash'},
+             max_queries=20, max_ms=500, needs_cart=True),
+    Endpoint('order_history', 'student', 'get', 'order_history', max_queries=12, max_ms=400),
+    Endpoint('kitchen_dashboard', 'kitchen', 'get', 'kitchen_dashboard', {'partial': 'true'},
+             max_queries=18, max_ms=800),
+    Endpoint('kitchen_sales_summary', 'kitchen', 'get', 'kitchen_sales_summary', {'range': 'all'},
+             max_queries=20, max_ms=500),
+    Endpoint('admin_chart_data', 'admin', 'get', 'custom_admin_chart_data', {'range': 'all'},
+             max_queries=14, max_ms=500),
+    Endpoint('admin_users', 'admin', 'get', 'custom_admin_users', {'sort': 'spent'}, max_queries=10, max_ms=300),
+    Endpoint('profile', 'student', 'get', 'profile', max_queries=10, max_ms=300),
+    Endpoint('admin_dashboard_api', 'admin', 'get', 'custom_admin_dashboard_api', max_queries=14, max_ms=2000),
+    Endpoint('chat_api', 'student', 'post_json', 'chat_api', {'message': 'Show me the menu'},
+             max_queries=12, max_ms=500),
+]
+
+
+def _bench_user(username, role):
+    user, created = User.objects.get_or_create(username=username)
+    if created:
+        user.set_unusable_password()
+        user.save()
+    from accounts.models import UserProfile
+    UserProfile.objects.filter(user=user).update(role=role)
+    return User.objects.get(pk=user.pk)  # drop the cached profile so force_login can't overwrite the role
+
+
+def on_generated_data():
+    """Whether the database holds generate_load_data output (and so is presumably a scratch copy)"""
+    return User.objects.filter(username__startswith=f'{datagen.PREFIX}_user_').exists()
+
+
+def prepare_clients():
+    """Log in one client per role, each as its own bench_ user.
+
+    The student's order_history has data once place_order (listed before it) has run.
+
+    Returns:
+        dict: {role: Client}
+    """
+    users = {
+        'student': _bench_user(f'{BENCH_PREFIX}student', 'student'),
+        'kitchen': _bench_user(f'{BENCH_PREFIX}kitchen', 'kitchen'),
+        'admin': _bench_user(f'{BENCH_PREFIX}admin', 'admin'),
+    }
+    clients = {}
+    for role, user in users.items():
+        client = Client()
+        client.force_login(user)
+        clients[role] = client
+    return clients
+
+
+def _request(client, endpoint):
+    url = reverse(endpoint.url_name)
+    if endpoint.method == 'post_json':
+        return client.post(url, json.dumps(endpoint.params), content_type='application/json')
+    return getattr(client, endpoint.method)(url, endpoint.params)
+
+
+def measure(client, endpoint, repeats=5, cart_item_id=None):
+    """Call one endpoint after a warm-up and return its timings and query counts"""
+    timings, queries, statuses = [], [], set()
+    for attempt in range(repeats + 1):
+        if endpoint.needs_cart and cart_item_id:
+            client.post(reverse('add_to_cart', args=[cart_item_id]))
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = _request(client, endpoint)
+            elapsed = (time.perf_counter() - started) * 1000
+        if attempt:  # first call warms caches, templates and connections
+            timings.append(elapsed)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+    return {
+        'name': endpoint.name,
+        'status': sorted(statuses),
+        'queries': max(queries),
+        'p50_ms': round(percentile(timings, 50), 1),
+        'max_ms': round(max(timings), 1),
+        'query_budget': endpoint.max_queries,
+        'time_budget_ms': endpoint.max_ms,
+    }
+
+
+def run(names=None, repeats=5, time_scale=1.0):
+    """Benchmark the selected endpoints (all by default) and check them against their budgets.
+
+    Returns:
+        list: one result dict per endpoint, with 'failures' listing blown budgets
+    """
+    clients = prepare_clients()
+    cart_item_id = MenuItem.objects.filter(is_available=True).values_list('id', flat=True).first()
+    results = []
+    for endpoint in ENDPOINTS:
+        if names and endpoint.name not in names:
+            continue
+        with override_settings(POLL_CACHE_ENABLED=False):  # time the view, not the poll cache
+            result = measure(clients[endpoint.role], endpoint, repeats, cart_item_id)
+        failures = []
+        if any(status >= 400 for status in result['status']):
+            failures.append(f"HTTP {result['status']}")
+        if result['queries'] > endpoint.max_queries:
+            failures.append(f"{result['queries']} queries > {endpoint.max_queries}")
+        if result['p50_ms'] > endpoint.max_ms * time_scale:
+            failures.append(f"{result['p50_ms']}ms > {endpoint.max_ms * time_scale:g}ms")
+        result['failures'] = failures
+        results.append(result)
+        if failures:
+            logger.warning(f"Benchmark {endpoint.name} over budget: {', '.join(failures)}")
+    return results
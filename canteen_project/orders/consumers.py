@@ -1,7 +1,10 @@
 import json
 import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from accounts import live
+from .stations import station_group_name
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +25,9 @@ class KitchenConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        # Join kitchen group
-        self.group_name = 'kitchen_group'
+        # Join the whole-kitchen group, or a single station's group for station screens
+        station = self.scope.get('url_route', {}).get('kwargs', {}).get('station')
+        self.group_name = station_group_name(station) if station else 'kitchen_group'
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
@@ -37,7 +41,7 @@ class KitchenConsumer(AsyncWebsocketConsumer):
         logger.info(f"WebSocket connected: {self.scope['user']} to {self.group_name}")
 
     async def disconnect(self, close_code):
-        # Leave kitchen group
+        # Leave kitchen / station group
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(
                 self.group_name,
@@ -70,3 +74,47 @@ class KitchenConsumer(AsyncWebsocketConsumer):
         # Send message to WebSocket
         await self.send(text_data=json.dumps(event))
 
+
+
+class AdminLiveConsumer(AsyncWebsocketConsumer):
+    """Pushes dashboard metric deltas to the admin overview and orders pages (revenue to admins only)"""
+
+    @database_sync_to_async
+    def is_authorized(self):
+        user = self.scope.get("user")
+        if not user or not user.is_authenticated:
+            return False
+        if not hasattr(user, 'profile') or user.profile.role not in ['kitchen', 'admin']:
+            return False
+        self.is_admin = user.profile.is_admin
+        return True
+
+    async def connect(self):
+        if not await self.is_authorized():
+            logger.warning("Admin live WebSocket rejected: unauthorized user")
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(live.GROUP, self.channel_name)
+        await self.accept()
+
+        # Replay what happened since the page's snapshot was taken
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            since = int(query.get('since', ['0'])[0])
+        except ValueError:
+            since = 0
+        events = await database_sync_to_async(live.events_since)(since)
+        if events is None:
+            events = [{'type': 'resync', 'reason': 'expired', 'seq': live.current_seq()}]
+        for event in events:
+            await self.send(text_data=json.dumps(live.for_viewer(event, self.is_admin)))
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(live.GROUP, self.channel_name)
+
+    async def receive(self, text_data):
+        pass
+
+    async def live_event(self, event):
+        await self.send(text_data=json.dumps(live.for_viewer(event['event'], self.is_admin)))
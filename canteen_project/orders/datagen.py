@@ -0,0 +1,308 @@
+"""Synthetic canteen history for benchmarks — users, catalog, reviews, orders and payments.
+
+Everything is inserted with chunked ``bulk_create`` (no per-row signals or
+token lookups), timestamps follow the canteen's rush hours, and every random
+choice comes from one seeded generator, so the same arguments always produce
+the same data.
+"""
+import logging
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from accounts.models import UserProfile
+from menu.models import Category, Favorite, MenuItem, Review
+from payments.models import Payment, WalletTransaction
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'gen'
+PASSWORD = 'loadtest123'
+
+# Share of a weekday's orders placed in each hour: morning tea, short break,
+# the lunch rush and the evening snack
+HOUR_WEIGHTS = {
+    8: 4, 9: 5, 10: 12, 11: 6, 12: 14, 13: 30, 14: 10, 15: 6, 16: 9, 17: 4,
+}
+WEEKEND_FACTOR = 0.25
+
+CATEGORIES = ['Breakfast', 'Meals', 'Biryani', 'Chinese', 'Snacks', 'Rolls', 'Beverages', 'Desserts']
+DISH_WORDS = {
+    'Breakfast': ['Masala Dosa', 'Plain Dosa', 'Idli', 'Vada', 'Upma', 'Poori', 'Appam', 'Puttu'],
+    'Meals': ['Veg Meals', 'Fish Meals', 'Curd Rice', 'Sambar Rice', 'Thali', 'Lemon Rice'],
+    'Biryani': ['Veg Biryani', 'Chicken Biryani', 'Egg Biryani', 'Mutton Biryani', 'Paneer Biryani'],
+    'Chinese': ['Fried Rice', 'Noodles', 'Gobi Manchurian', 'Chilli Chicken', 'Chilli Paneer'],
+    'Snacks': ['Samosa', 'Puffs', 'Cutlet', 'Pakoda', 'Vada Pav', 'Pav Bhaji', 'Sandwich'],
+    'Rolls': ['Paneer Roll', 'Chicken Roll', 'Egg Roll', 'Veg Roll', 'Shawarma'],
+    'Beverages': ['Masala Chai', 'Filter Coffee', 'Cold Coffee', 'Lime Soda', 'Mango Lassi', 'Milkshake'],
+    'Desserts': ['Gulab Jamun', 'Payasam', 'Ice Cream', 'Fruit Salad', 'Brownie'],
+}
+NON_VEG_WORDS = ('Chicken', 'Egg', 'Fish', 'Mutton', 'Shawarma')
+
+PAYMENT_WEIGHTS = {'cash': 35, 'upi': 30, 'wallet': 25, 'online': 10}
+PAYMENT_GATEWAY_METHOD = {'cash': 'cash', 'upi': 'upi', 'wallet': 'wallet', 'online': 'stripe'}
+DELIVERY_WEIGHTS = {'pickup': 80, 'classroom': 15, 'staffroom': 5}
+CANCEL_RATE = 0.04
+
+
+@contextmanager
+def historical_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values we set instead of now()"""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for row in iterable:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _weighted(rng, weights):
+    """Return a zero-argument sampler over a {value: weight} dict"""
+    values, cum = list(weights), []
+    total = 0
+    for value in values:
+        total += weights[value]
+        cum.append(total)
+    return lambda: rng.choices(values, cum_weights=cum)[0]
+
+
+def _bulk_create(model, rows, chunk_size):
+    """bulk_create that hands back saved primary keys even where the backend can't return them"""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(rows, batch_size=chunk_size)
+    model.objects.bulk_create(rows, batch_size=chunk_size)
+    return None
+
+
+def order_times(rng, count, days, end):
+    """Yield count aware datetimes over the last `days` days, shaped by rush hours and weekdays"""
+    start_day = end.date() - timedelta(days=days)
+    day_weights = [
+        WEEKEND_FACTOR if (start_day + timedelta(days=d)).weekday() >= 5 else 1.0 for d in range(days)
+    ]
+    pick_day = _weighted(rng, dict(enumerate(day_weights)))
+    pick_hour = _weighted(rng, HOUR_WEIGHTS)
+    tz = timezone.get_current_timezone()
+    for _ in range(count):
+        day = start_day + timedelta(days=pick_day())
+        moment = datetime.combine(day, time(pick_hour(), rng.randrange(60), rng.randrange(60)))
+        yield timezone.make_aware(moment, tz)
+
+
+def flush(prefix=PREFIX):
+    """Delete everything a previous run generated under this prefix"""
+    users = User.objects.filter(username__startswith=f'{prefix}_')
+    deleted = {
+        'order_items': OrderItem.objects.filter(order__user__in=users).delete()[0],
+        'users': users.delete()[0],
+        'categories': Category.objects.filter(name__startswith=f'{prefix.upper()} ').delete()[0],
+    }
+    from . import rollups
+    rollups.rebuild()
+    logger.info(f"Flushed generated data: {deleted}")
+    return deleted
+
+
+def generate(users=1000, categories=8, items=120, orders=10000, reviews=5000, favorites=3000,
+             days=90, seed=42, chunk_size=5000, prefix=PREFIX, end=None, log=None):
+    """Generate a full synthetic history.
+
+    Returns:
+        dict: number of rows created per model
+    """
+    rng = random.Random(seed)
+    end = end or timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    log = log or (lambda message: None)
+    counts = {}
+
+    # --- Users and profiles (bulk_create skips the profile signal) ---
+    password = make_password(PASSWORD)
+    joined = end - timedelta(days=days)
+    user_rows = [
+        User(username=f'{prefix}_user_{n:07d}', email=f'{prefix}_user_{n}@campus.test', password=password,
+             date_joined=joined)
+        for n in range(users)
+    ]
+    for chunk in _chunks(user_rows, chunk_size):
+        User.objects.bulk_create(chunk)
+    user_ids = list(User.objects.filter(username__startswith=f'{prefix}_user_').order_by('id').values_list('id', flat=True))
+    profiles = (
+        UserProfile(user_id=user_id, role='staff' if rng.random() < 0.1 else 'student',
+                    full_name=f'Generated User {n}', wallet_balance=Decimal(rng.randrange(0, 2000)))
+        for n, user_id in enumerate(user_ids)
+    )
+    for chunk in _chunks(profiles, chunk_size):
+        UserProfile.objects.bulk_create(chunk)
+    counts['users'] = len(user_ids)
+    log(f"Users: {len(user_ids)}")
+
+    # --- Catalog ---
+    category_names = [CATEGORIES[c % len(CATEGORIES)] for c in range(categories)]
+    Category.objects.bulk_create([
+        Category(name=f'{prefix.upper()} {name}' + (f' {c // len(CATEGORIES) + 1}' if c >= len(CATEGORIES) else ''))
+        for c, name in enumerate(category_names)
+    ])
+    category_ids = list(
+        Category.objects.filter(name__startswith=f'{prefix.upper()} ').order_by('id').values_list('id', flat=True)
+    )
+    menu_rows = []
+    for n in range(items):
+        c = n % len(category_ids)
+        words = DISH_WORDS[category_names[c]]
+        base = words[(n // len(category_ids)) % len(words)]
+        variant = n // (len(category_ids) * len(words))
+        name = base if not variant else f'{base} Special {variant}'
+        menu_rows.append(MenuItem(
+            category_id=category_ids[c], name=name, price=Decimal(rng.randrange(10, 200)),
+            preparation_time=rng.randrange(3, 25), is_available=rng.random() > 0.05,
+            is_todays_special=rng.random() < 0.05, is_vegetarian=not any(w in name for w in NON_VEG_WORDS),
+        ))
+    MenuItem.objects.bulk_create(menu_rows, batch_size=chunk_size)
+    menu = list(MenuItem.objects.filter(category_id__in=category_ids).order_by('id').values_list('id', 'name', 'price'))
+    counts['categories'], counts['menu_items'] = len(category_ids), len(menu)
+    log(f"Catalog: {len(category_ids)} categories, {len(menu)} items")
+
+    # Popularity is skewed: a few dishes take most of the orders
+    popularity = [1 / (rank + 1) ** 0.8 for rank in range(len(menu))]
+    rng.shuffle(popularity)
+    pick_item = _weighted(rng, dict(enumerate(popularity)))
+
+    # --- Reviews and favourites (one per user/item pair) ---
+    with historical_timestamps(Review, Favorite):
+        for model, total, extra in ((Review, reviews, True), (Favorite, favorites, False)):
+            pairs = set()
+            limit = min(total, len(user_ids) * len(menu))
+            while len(pairs) < limit:
+                pairs.add((rng.choice(user_ids), menu[pick_item()][0]))
+            rows = []
+            for user_id, item_id in sorted(pairs):
+                created = joined + timedelta(seconds=rng.randrange(days * 86400))
+                if extra:
+                    rows.append(Review(user_id=user_id, menu_item_id=item_id, created_at=created,
+                                       rating=rng.choices([1, 2, 3, 4, 5], weights=[3, 5, 15, 40, 37])[0]))
+                else:
+                    rows.append(Favorite(user_id=user_id, menu_item_id=item_id, created_at=created))
+            model.objects.bulk_create(rows, batch_size=chunk_size)
+            counts[model._meta.model_name + 's'] = len(rows)
+    log(f"Reviews: {counts['reviews']}, favorites: {counts['favorites']}")
+
+    # --- Orders, items, payments and wallet transactions ---
+    pick_payment = _weighted(rng, PAYMENT_WEIGHTS)
+    pick_delivery = _weighted(rng, DELIVERY_WEIGHTS)
+    times = sorted(order_times(rng, orders, days, end))
+    counts.update(orders=0, order_items=0, payments=0, wallet_transactions=0)
+
+    with historical_timestamps(Order, Payment, WalletTransaction):
+        for chunk_start in range(0, orders, chunk_size):
+            order_rows, lines = [], []
+            for seq in range(chunk_start, min(chunk_start + chunk_size, orders)):
+                created = times[seq]
+                delivery_type = pick_delivery()
+                delivery_fee = Decimal('10.00') if delivery_type != 'pickup' else Decimal('0')
+                order_lines = []
+                for _ in range(rng.choices([1, 2, 3, 4], weights=[50, 30, 15, 5])[0]):
+                    item_id, name, price = menu[pick_item()]
+                    order_lines.append((item_id, name, price, rng.choices([1, 2, 3], weights=[80, 15, 5])[0]))
+                method = pick_payment()
+                cancelled = rng.random() < CANCEL_RATE
+                if cancelled:
+                    status = 'cancelled'
+                else:
+                    status = 'collected' if delivery_type == 'pickup' else 'delivered'
+                finished = created + timedelta(minutes=rng.randrange(5, 40))
+                order_rows.append(Order(
+                    user_id=rng.choice(user_ids),
+                    token_number=f'{prefix.upper()}-{seq:010d}',
+                    status=status,
+                    payment_method=method,
+                    is_paid=not cancelled or method != 'cash',
+                    total_amount=sum(price * qty for _, _, price, qty in order_lines) + delivery_fee,
+                    delivery_type=delivery_type,
+                    delivery_location=(f'{rng.choice("ABCD")}-{rng.randrange(1, 4)}{rng.randrange(1, 20):02d}'
+                                       if delivery_type == 'classroom' else
+                                       f'SR-{rng.randrange(1, 6)}' if delivery_type == 'staffroom' else ''),
+                    delivery_fee=delivery_fee,
+                    created_at=created,
+                    updated_at=finished,
+                ))
+                lines.append(order_lines)
+
+            with transaction.atomic():
+                saved = _bulk_create(Order, order_rows, chunk_size)
+                if saved is None:
+                    ids = dict(Order.objects.filter(
+                        token_number__in=[o.token_number for o in order_rows]
+                    ).values_list('token_number', 'id'))
+                    for order in order_rows:
+                        order.id = ids[order.token_number]
+
+                item_rows, payment_rows, wallet_rows = [], [], []
+                for order, order_lines in zip(order_rows, lines):
+                    item_rows.extend(
+                        OrderItem(order_id=order.id, menu_item_id=item_id, item_name=name, price=price, quantity=qty)
+                        for item_id, name, price, qty in order_lines
+                    )
+                    if not order.is_paid:
+                        continue
+                    ref = f'{prefix.upper()}{order.id:010d}'
+                    payment_rows.append(Payment(
+                        order_id=order.id, amount=order.total_amount,
+                        method=PAYMENT_GATEWAY_METHOD[order.payment_method],
+                        status='refunded' if order.status == 'cancelled' else 'completed',
+                        is_refunded=order.status == 'cancelled', transaction_id=ref,
+                        created_at=order.created_at, updated_at=order.updated_at,
+                    ))
+                    if order.payment_method == 'wallet':
+                        wallet_rows.append(WalletTransaction(
+                            user_id=order.user_id, amount=order.total_amount, transaction_type='debit',
+                            description=f'Payment for order #{order.token_number}', reference_id=ref,
+                            created_at=order.created_at,
+                        ))
+                        if rng.random() < 0.3:
+                            wallet_rows.append(WalletTransaction(
+                                user_id=order.user_id, amount=Decimal(rng.choice([100, 200, 500, 1000])),
+                                transaction_type='credit', description='Wallet top-up',
+                                reference_id=f'{ref}T', created_at=order.created_at - timedelta(hours=1),
+                            ))
+                OrderItem.objects.bulk_create(item_rows, batch_size=chunk_size)
+                Payment.objects.bulk_create(payment_rows, batch_size=chunk_size)
+                WalletTransaction.objects.bulk_create(wallet_rows, batch_size=chunk_size)
+
+            counts['orders'] += len(order_rows)
+            counts['order_items'] += len(item_rows)
+            counts['payments'] += len(payment_rows)
+            counts['wallet_transactions'] += len(wallet_rows)
+            log(f"Orders: {counts['orders']}/{orders}")
+
+    # bulk_create skips Order.save(), the order signals and payments.wallet, which maintain
+    # the search columns, sales rollups, user stats and wallet statements
+    from accounts import user_stats
+    from payments import statements
+    from . import rollups, search
+    search.backfill(Order.objects.filter(token_number__startswith=f'{prefix.upper()}-'))
+    rollups.rebuild()
+    user_stats.reconcile()
+    statements.backfill()
+    log("Search columns, sales rollups, user stats and wallet statements rebuilt")
+    return counts
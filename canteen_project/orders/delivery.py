@@ -0,0 +1,181 @@
+"""Delivery batching — group ready classroom/staffroom orders into runner trips.
+
+Ready delivery orders are grouped by building block and ready-time window into
+DeliveryRuns of at most MAX_RUN_ORDERS. Dispatching and completing a run moves
+all of its orders with a single UPDATE — their per-order deltas are then folded
+into the derived state with ``transitions.apply_bulk_change`` — followed by one
+kitchen WebSocket message for the whole batch.
+"""
+import logging
+import re
+from collections import defaultdict
+from datetime import timedelta
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import DeliveryRun, Order
+from .transitions import apply_bulk_change
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_TYPES = ('classroom', 'staffroom')
+
+# Runner capacity and how far apart two orders' ready times may be in one run
+MAX_RUN_ORDERS = 10
+RUN_WINDOW_MINUTES = 10
+
+BLOCK_PREFIX_RE = re.compile(r'\s*([A-Za-z]+)')
+ROOM_NUMBER_RE = re.compile(r'(\d+)')
+
+
+def delivery_block(delivery_type, location):
+    """Derive the block a room belongs to: 'B-204' → 'B', '204' → 'Floor 2', staffrooms together"""
+    if delivery_type == 'staffroom':
+        return 'Staffroom'
+    location = location or ''
+    prefix = BLOCK_PREFIX_RE.match(location)
+    if prefix and not prefix.group(1).lower().startswith('room'):
+        return prefix.group(1).upper()
+    number = ROOM_NUMBER_RE.search(location)
+    if number:
+        return f'Floor {int(number.group(1)) // 100}'
+    return location.strip().title() or 'Unknown'
+
+
+def _notify(run, status):
+    """One kitchen broadcast for the whole batch instead of one per order"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        'kitchen_group',
+        {
+            'type': 'order_update',
+            'message': f'Delivery run #{run.id} {status}',
+            'data': {
+                'run_id': run.id,
+                'status': status,
+                'order_ids': list(run.orders.values_list('id', flat=True)),
+            },
+        }
+    )
+
+
+@transaction.atomic
+def plan_runs(window_minutes=RUN_WINDOW_MINUTES, max_orders=MAX_RUN_ORDERS):
+    """Batch every ready, unbatched delivery order into new open runs.
+
+    Returns:
+        list: the DeliveryRuns created
+    """
+    pending = (
+        Order.objects.select_for_update()
+        .filter(status='ready', delivery_type__in=DELIVERY_TYPES, delivery_run__isnull=True)
+        .order_by('updated_at')
+        .values_list('id', 'delivery_type', 'delivery_location', 'updated_at')
+    )
+
+    by_block = defaultdict(list)
+    for order_id, delivery_type, location, ready_at in pending:
+        by_block[delivery_block(delivery_type, location)].append((order_id, ready_at))
+
+    window = timedelta(minutes=window_minutes)
+    batches = []
+    for block, orders in by_block.items():
+        batch = []
+        for order_id, ready_at in orders:
+            if batch and (len(batch) >= max_orders or ready_at - batch[0][1] > window):
+                batches.append((block, batch))
+                batch = []
+            batch.append((order_id, ready_at))
+        if batch:
+            batches.append((block, batch))
+
+    runs = []
+    for block, batch in batches:
+        run = DeliveryRun.objects.create(block=block)
+        Order.objects.filter(id__in=[order_id for order_id, _ in batch]).update(delivery_run=run)
+        runs.append(run)
+    if runs:
+        logger.info(f"Planned {len(runs)} delivery runs for {sum(len(b) for _, b in batches)} orders")
+    return runs
+
+
+def _move_orders(run, from_status, reason, **changes):
+    """Move the run's orders in from_status with one UPDATE, then apply their per-order deltas"""
+    orders = list(Order.objects.select_for_update().select_related('user')
+                  .filter(delivery_run=run, status=from_status))
+    if not orders:
+        return 0
+    now = timezone.now()
+    Order.objects.filter(id__in=[order.id for order in orders]).update(
+        **changes, version=F('version') + 1, updated_at=now,
+    )
+    old = {}
+    for order in orders:
+        old[order.id] = (order.status, order.is_paid)
+        for field, value in changes.items():
+            setattr(order, field, value)
+        order.version, order.updated_at = order.version + 1, now
+    apply_bulk_change(orders, old, reason)
+    return len(orders)
+
+
+def assign_run(run, runner):
+    """Hand an open run to a runner"""
+    updated = DeliveryRun.objects.filter(id=run.id, status__in=['open', 'assigned']).update(
+        runner=runner, status='assigned'
+    )
+    if updated:
+        run.refresh_from_db()
+    return bool(updated)
+
+
+@transaction.atomic
+def dispatch_run(run):
+    """Move every ready order in the run to out_for_delivery in one UPDATE.
+
+    Returns:
+        int: number of orders dispatched
+    """
+    if not DeliveryRun.objects.filter(id=run.id, status__in=['open', 'assigned']).update(
+        status='out', dispatched_at=timezone.now()
+    ):
+        return 0
+    count = _move_orders(run, 'ready', 'delivery run', status='out_for_delivery')
+    run.refresh_from_db()
+    transaction.on_commit(lambda: _notify(run, 'out_for_delivery'))
+    return count
+
+
+@transaction.atomic
+def complete_run(run):
+    """Mark every order in the run delivered (cash is collected at the door, so also paid).
+
+    Returns:
+        int: number of orders delivered
+    """
+    if not DeliveryRun.objects.filter(id=run.id, status='out').update(
+        status='completed', completed_at=timezone.now()
+    ):
+        return 0
+    count = _move_orders(run, 'out_for_delivery', 'delivery run', status='delivered', is_paid=True)
+    run.refresh_from_db()
+    transaction.on_commit(lambda: _notify(run, 'delivered'))
+    return count
+
+
+def run_summary(run):
+    """JSON-ready description of a run and its orders"""
+    return {
+        'id': run.id,
+        'block': run.block,
+        'status': run.status,
+        'runner': run.runner.username if run.runner else None,
+        'orders': [
+            {'id': o.id, 'token': o.token_number, 'location': o.delivery_location, 'status': o.status}
+            for o in run.orders.all()
+        ],
+    }
@@ -0,0 +1,197 @@
+"""Item demand forecasting for kitchen prep planning.
+
+Order lines are rolled up into ``ItemHourlyDemand`` (item x local clock hour)
+by ``refresh_history``. ``fit`` loads the last few weeks of those rows into a
+NumPy array shaped (item, week, hour-of-week) and computes, per item and hour
+of the week, both the plain seasonal average and an exponentially smoothed
+level that weights recent weeks more. The result is stored in
+``DemandForecast`` and cached, so reading a forecast is a cache lookup.
+
+Refreshed nightly by ``manage.py refresh_demand_forecast``.
+"""
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .models import DemandForecast, ItemHourlyDemand, OrderItem
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+HISTORY_WEEKS = 8
+ALPHA = 0.3           # smoothing factor: weight of the most recent week
+MIN_QUANTITY = 0.05   # forecasts below this are not stored
+CACHE_KEY = 'orders:demand_forecast'
+
+# Orders that never reached the kitchen don't count as demand
+EXCLUDED_STATUSES = ('payment_pending', 'cancelled')
+
+
+def hour_of_week(value):
+    """0 for Monday 00:00-00:59 local time, 167 for Sunday 23:00"""
+    local = timezone.localtime(value)
+    return local.weekday() * 24 + local.hour
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+@transaction.atomic
+def refresh_history(days=2):
+    """Re-aggregate order lines from the last `days` local days (None = all) into hourly rows.
+
+    Returns:
+        int: hourly rows written
+    """
+    rows = ItemHourlyDemand.objects.all()
+    items = OrderItem.objects.exclude(order__status__in=EXCLUDED_STATUSES)
+    if days is not None:
+        start = _local_midnight(timezone.localdate() - timedelta(days=days - 1))
+        rows = rows.filter(hour__gte=start)
+        items = items.filter(order__created_at__gte=start)
+    rows.delete()
+
+    # Bucketed here rather than with TruncHour, which needs MySQL's timezone tables
+    totals = defaultdict(int)
+    lines = items.values_list('order__created_at', 'menu_item_id', 'item_name', 'quantity')
+    for created_at, menu_item_id, item_name, quantity in lines.iterator(chunk_size=2000):
+        hour = timezone.localtime(created_at).replace(minute=0, second=0, microsecond=0)
+        totals[(hour, menu_item_id, item_name)] += quantity
+    hourly = [
+        ItemHourlyDemand(hour=hour, menu_item_id=menu_item_id, item_name=item_name, quantity=quantity)
+        for (hour, menu_item_id, item_name), quantity in totals.items()
+    ]
+    ItemHourlyDemand.objects.bulk_create(hourly, batch_size=1000)
+    return len(hourly)
+
+
+def fit(weeks=HISTORY_WEEKS, alpha=ALPHA, end=None):
+    """Forecast every item's demand per hour of the week from the `weeks` before `end`.
+
+    Returns:
+        tuple: (list of (menu_item_id, item_name), smoothed array, average array),
+        both arrays shaped (items, 168)
+    """
+    end = end or _local_midnight(timezone.localdate())
+    start = end - timedelta(weeks=weeks)
+    rows = list(
+        ItemHourlyDemand.objects.filter(hour__gte=start, hour__lt=end)
+        .values_list('item_name', 'menu_item_id', 'hour', 'quantity')
+    )
+    if not rows:
+        return [], np.zeros((0, HOURS_PER_WEEK)), np.zeros((0, HOURS_PER_WEEK))
+
+    codes = {}
+    menu_items = {}
+    for name, menu_item_id, _, _ in rows:
+        codes.setdefault(name, len(codes))
+        menu_items[name] = menu_item_id or menu_items.get(name)
+    item = np.fromiter((codes[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+    offset = np.fromiter((row[2].timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    quantity = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+
+    hours = np.rint((offset - start.timestamp()) / 3600).astype(np.int64)
+    week = hours // HOURS_PER_WEEK
+    how = (hour_of_week(start) + hours) % HOURS_PER_WEEK
+
+    demand = np.zeros((len(codes), weeks, HOURS_PER_WEEK))
+    np.add.at(demand, (item, week, how), quantity)
+
+    # Simple exponential smoothing over weeks, seeded with the oldest week:
+    # level = a*x_t + (1-a)*level  <=>  weights a(1-a)^k, oldest week (1-a)^(n-1)
+    weights = alpha * (1 - alpha) ** np.arange(weeks - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (weeks - 1)
+    smoothed = np.tensordot(demand, weights, axes=([1], [0]))
+    average = demand.mean(axis=1)
+
+    keys = [(menu_items[name], name) for name in codes]
+    return keys, smoothed, average
+
+
+def _cache_payload(generated_at, rows):
+    hours = {}
+    for menu_item_id, name, how, quantity, average in rows:
+        hours.setdefault(how, []).append((menu_item_id, name, quantity, average))
+    return {'generated_at': generated_at.isoformat() if generated_at else None, 'hours': hours}
+
+
+@transaction.atomic
+def store(keys, smoothed, average):
+    """Replace the stored forecasts and refresh the cache.
+
+    Returns:
+        int: forecast rows stored
+    """
+    generated_at = timezone.now()
+    item_idx, how_idx = np.nonzero((smoothed >= MIN_QUANTITY) | (average >= MIN_QUANTITY))
+    rows = [
+        (keys[i][0], keys[i][1], int(h), round(float(smoothed[i, h]), 3), round(float(average[i, h]), 3))
+        for i, h in zip(item_idx, how_idx)
+    ]
+    DemandForecast.objects.all().delete()
+    DemandForecast.objects.bulk_create([
+        DemandForecast(menu_item_id=menu_item_id, item_name=name, hour_of_week=how,
+                       quantity=quantity, average=avg, generated_at=generated_at)
+        for menu_item_id, name, how, quantity, avg in rows
+    ], batch_size=1000)
+    transaction.on_commit(lambda: cache.set(CACHE_KEY, _cache_payload(generated_at, rows), None))
+    return len(rows)
+
+
+def refresh(days=2, weeks=HISTORY_WEEKS, alpha=ALPHA):
+    """Nightly job: update the hourly history, refit and store the forecasts.
+
+    Returns:
+        dict: hourly_rows, items, forecasts
+    """
+    hourly_rows = refresh_history(days)
+    keys, smoothed, average = fit(weeks, alpha)
+    forecasts = store(keys, smoothed, average)
+    logger.info(f"Demand forecast refreshed: {len(keys)} items, {forecasts} item-hours")
+    return {'hourly_rows': hourly_rows, 'items': len(keys), 'forecasts': forecasts}
+
+
+def _load():
+    payload = cache.get(CACHE_KEY)
+    if payload is None:  # cold cache (e.g. after a restart): rebuild it from the table once
+        rows = list(DemandForecast.objects.values_list(
+            'menu_item_id', 'item_name', 'hour_of_week', 'quantity', 'average', 'generated_at'))
+        payload = _cache_payload(rows[0][5] if rows else None, [row[:5] for row in rows])
+        cache.set(CACHE_KEY, payload, None)
+    return payload
+
+
+def get_forecast(hours=6, now=None):
+    """Expected demand for the next `hours` clock hours, starting with the current one.
+
+    Returns:
+        dict: generated_at, per-hour item lists, and totals with a whole-number prep count
+    """
+    payload = _load()
+    now = timezone.localtime(now or timezone.now())
+    first = now.replace(minute=0, second=0, microsecond=0)
+    totals = {}
+    per_hour = []
+    for n in range(hours):
+        hour = first + timedelta(hours=n)
+        items = []
+        for menu_item_id, name, quantity, _ in payload['hours'].get(hour_of_week(hour), []):
+            items.append({'menu_item_id': menu_item_id, 'name': name, 'qty': round(quantity, 1)})
+            total = totals.setdefault(name, {'menu_item_id': menu_item_id, 'name': name, 'expected': 0.0})
+            total['expected'] += quantity
+        items.sort(key=lambda i: (-i['qty'], i['name']))
+        per_hour.append({'hour': hour.isoformat(), 'items': items})
+
+    items = []
+    for total in totals.values():
+        total['expected'] = round(total['expected'], 1)
+        total['qty'] = math.ceil(total['expected'] - 0.2)  # prep count, tolerating a little rounding
+        if total['qty'] > 0:
+            items.append(total)
+    items.sort(key=lambda i: (-i['qty'], i['name']))
+    return {'generated_at': payload['generated_at'], 'hours': per_hour, 'items': items}
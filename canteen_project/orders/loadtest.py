@@ -0,0 +1,251 @@
+"""Lunch-rush load test — concurrent students and kitchen screens against the order pipeline.
+
+Each simulated student runs the full path (menu → search → add to cart →
+checkout → place order → pay by wallet, or online through the fake payment
+gateway) in its own thread with its own
+database connection; kitchen pollers hit the KDS endpoints on an interval
+until the students are done. Requests go through the full Django handler
+in-process, so every call is timed and its SQL queries are counted.
+"""
+import logging
+import math
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from urllib.parse import parse_qsl, urlsplit
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from menu.models import Category, MenuItem
+
+logger = logging.getLogger(__name__)
+
+USER_PREFIX = 'loadtest_'
+CATEGORY_NAME = 'Load Test'
+STARTING_BALANCE = Decimal('100000.00')
+
+# Realistic names so search hits a mix of prefix, word and fuzzy matches
+DISHES = [
+    'Masala Dosa', 'Plain Dosa', 'Idli Vada', 'Veg Biryani', 'Chicken Biryani',
+    'Egg Fried Rice', 'Veg Noodles', 'Paneer Roll', 'Chicken Roll', 'Samosa',
+    'Vada Pav', 'Pav Bhaji', 'Chole Bhature', 'Veg Sandwich', 'Cold Coffee',
+    'Masala Chai', 'Lime Soda', 'Mango Lassi', 'Gobi Manchurian', 'Parotta',
+]
+SEARCH_TERMS = ['dosa', 'biryani', 'roll', 'chai', 'paneer', 'rice', 'biriyani', 'sandwhich']
+
+LOCATION_RE = re.compile(r'/payment/(\d+)/')
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class EndpointStats:
+    """Latencies, query counts and failures recorded for one endpoint"""
+
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+
+    def summary(self, elapsed):
+        count = len(self.latencies)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'p50_ms': round(percentile(self.latencies, 50) * 1000, 1),
+            'p95_ms': round(percentile(self.latencies, 95) * 1000, 1),
+            'p99_ms': round(percentile(self.latencies, 99) * 1000, 1),
+            'rps': round(count / elapsed, 1) if elapsed else 0.0,
+            'avg_queries': round(sum(self.queries) / count, 1) if count else 0.0,
+            'max_queries': max(self.queries, default=0),
+        }
+
+
+class Recorder:
+    """Thread-safe collector used by every simulated client"""
+
+    def __init__(self):
+        self.stats = defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+
+    def call(self, name, method, *args, ok=None, **kwargs):
+        """Issue one request, timing it and counting the queries it ran.
+
+        ok is an optional check on the response for views that report
+        failure by redirecting (e.g. place_order back to checkout).
+        """
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count):
+                response = method(*args, **kwargs)
+            failed = response.status_code >= 400 or (ok is not None and not ok(response))
+        except Exception as e:
+            logger.warning(f"Load test {name} failed: {e}")
+            response, failed = None, True
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            stats = self.stats[name]
+            stats.latencies.append(elapsed)
+            stats.queries.append(queries[0])
+            if failed:
+                stats.errors += 1
+        return response
+
+    def report(self, elapsed):
+        return {name: stats.summary(elapsed) for name, stats in sorted(self.stats.items())}
+
+
+def seed(students=50, items=len(DISHES)):
+    """Create (or top up) the load-test catalog, students and kitchen user.
+
+    Wallets are topped up to STARTING_BALANCE through ``payments.wallet``, so
+    the ledger and monthly statements stay in step with the balances.
+
+    Returns:
+        tuple: (student users, kitchen user, menu item ids)
+    """
+    category, _ = Category.objects.get_or_create(name=CATEGORY_NAME)
+    existing = set(MenuItem.objects.filter(category=category).values_list('name', flat=True))
+    names = [DISHES[i % len(DISHES)] + ('' if i < len(DISHES) else f' {i // len(DISHES) + 1}') for i in range(items)]
+    MenuItem.objects.bulk_create([
+        MenuItem(category=category, name=name, price=Decimal(20 + (i * 7) % 120),
+                 preparation_time=5 + i % 15, is_vegetarian='Chicken' not in name)
+        for i, name in enumerate(names) if name not in existing
+    ])
+    item_ids = list(MenuItem.objects.filter(category=category, is_available=True).values_list('id', flat=True))
+
+    usernames = [f'{USER_PREFIX}student_{n}' for n in range(students)]
+    for username in usernames + [f'{USER_PREFIX}kitchen']:
+        user, created = User.objects.get_or_create(username=username)
+        if created:
+            user.set_unusable_password()
+            user.save()
+
+    from accounts.models import UserProfile
+    from payments import wallet
+    UserProfile.objects.filter(user__username__in=usernames).update(role='student')
+    UserProfile.objects.filter(user__username=f'{USER_PREFIX}kitchen').update(role='kitchen')
+
+    # Re-fetch so force_login's user.save() doesn't write back a stale cached profile
+    users = list(User.objects.filter(username__in=usernames).select_related('profile').order_by('id'))
+    for user in users:
+        if user.profile.wallet_balance < STARTING_BALANCE:
+            wallet.credit(user, STARTING_BALANCE - user.profile.wallet_balance, 'Load test top-up')
+    kitchen = User.objects.get(username=f'{USER_PREFIX}kitchen')
+    return users, kitchen, item_ids
+
+
+def run_student(recorder, user, item_ids, rng, think_time=0.0, online_share=0.0):
+    """One student's lunch order, start to finish"""
+    client = Client()
+    client.force_login(user)
+    recorder.call('menu_view', client.get, reverse('menu'))
+    time.sleep(think_time * rng.random())
+    recorder.call('search_api', client.get, reverse('search_api'), {'q': rng.choice(SEARCH_TERMS)})
+
+    for item_id in rng.sample(item_ids, k=min(len(item_ids), rng.randint(1, 3))):
+        recorder.call('add_to_cart', client.post, reverse('add_to_cart', args=[item_id]),
+                      {'quantity': rng.randint(1, 2)})
+    recorder.call('checkout', client.get, reverse('checkout'))
+    time.sleep(think_time * rng.random())
+
+    method = 'online' if rng.random() < online_share else 'wallet'
+    response = recorder.call('place_order', client.post, reverse('place_order'), {'payment_method': method},
+                             ok=lambda r: LOCATION_RE.search(r.get('Location', '')))
+    match = LOCATION_RE.search(response.get('Location', '')) if response is not None else None
+    if not match:
+        return
+    order_id = int(match.group(1))
+    if method == 'wallet':
+        recorder.call('process_wallet_payment', client.post, reverse('process_wallet_payment', args=[order_id]),
+                      ok=lambda r: r.get('Location', '') == reverse('order_history'))
+        return
+
+    # The fake gateway sends the browser straight back to the success URL
+    response = recorder.call('process_online_payment', client.post,
+                             reverse('process_online_payment', args=[order_id]),
+                             ok=lambda r: r.status_code == 303)
+    if response is not None and response.status_code == 303:
+        success_url = urlsplit(response['Location'])
+        recorder.call('stripe_success', client.get, success_url.path, dict(parse_qsl(success_url.query)),
+                      ok=lambda r: r.get('Location', '') == reverse('order_history'))
+
+
+def run_kitchen_poller(recorder, user, stop, interval=1.0):
+    """A KDS screen polling the kitchen endpoints until the rush is over"""
+    client = Client()
+    client.force_login(user)
+    try:
+        while not stop.is_set():
+            recorder.call('kitchen_dashboard', client.get, reverse('kitchen_dashboard'), {'partial': 'true'},
+                          ok=lambda r: r.status_code == 200)
+            recorder.call('kitchen_prep_board', client.get, reverse('kitchen_prep_board'))
+            recorder.call('kitchen_queue', client.get, reverse('kitchen_queue_api'))
+            stop.wait(interval)
+    finally:
+        connection.close()
+
+
+def run(students=50, concurrency=10, pollers=2, poll_interval=1.0, think_time=0.0, seed_value=42,
+        online_share=0.0):
+    """Drive the lunch rush and return per-endpoint results.
+
+    `online_share` of the students pay online; run with PAYMENT_GATEWAY=fake.
+
+    Returns:
+        dict: {'elapsed': seconds, 'orders': placed, 'endpoints': {name: summary}}
+    """
+    users, kitchen, item_ids = seed(students)
+    connections.close_all()  # each worker thread opens its own connection
+
+    recorder = Recorder()
+    stop = threading.Event()
+    rng = random.Random(seed_value)
+    plans = [(user, random.Random(rng.random())) for user in users]
+    plans_lock = threading.Lock()
+
+    def student_worker():
+        try:
+            while True:
+                with plans_lock:
+                    if not plans:
+                        return
+                    user, user_rng = plans.pop()
+                run_student(recorder, user, item_ids, user_rng, think_time, online_share)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    kitchen_threads = [
+        threading.Thread(target=run_kitchen_poller, args=(recorder, kitchen, stop, poll_interval), daemon=True)
+        for _ in range(pollers)
+    ]
+    student_threads = [threading.Thread(target=student_worker, daemon=True) for _ in range(concurrency)]
+    for thread in kitchen_threads + student_threads:
+        thread.start()
+    for thread in student_threads:
+        thread.join()
+    stop.set()
+    for thread in kitchen_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    placed = len(recorder.stats['place_order'].latencies) - recorder.stats['place_order'].errors
+    return {'elapsed': round(elapsed, 2), 'orders': placed, 'endpoints': recorder.report(elapsed)}
@@ -0,0 +1,48 @@
+"""
+Management command to benchmark the hot views against the current database
+(e.g. after generate_load_data) and fail when an endpoint exceeds its SQL
+query or latency budget, so N+1 regressions are caught before deploy.
+
+It places real cash orders (as the bench_student user), so it only runs on
+generated data unless --allow-db is given.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from orders import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time key endpoints, count their SQL queries and enforce per-endpoint budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('endpoints', nargs='*', help='Only run these endpoints (default: all)')
+        parser.add_argument('--repeats', type=int, default=5, help='Measured calls per endpoint')
+        parser.add_argument('--time-scale', type=float, default=1.0,
+                            help='Multiply every time budget (e.g. 2 on a slow CI runner)')
+        parser.add_argument('--allow-db', action='store_true',
+                            help='Run on a database without generate_load_data output (places real orders)')
+
+    def handle(self, *args, **options):
+        known = {endpoint.name for endpoint in benchmarks.ENDPOINTS}
+        unknown = set(options['endpoints']) - known
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+        if not options['allow_db'] and not benchmarks.on_generated_data():
+            raise CommandError("No generate_load_data output found: this may be a live database, and the "
+                               "benchmark places real orders. Run generate_load_data first, or pass --allow-db.")
+
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            results = benchmarks.run(options['endpoints'], options['repeats'], options['time_scale'])
+
+        self.stdout.write(f"{'Endpoint':<24}{'SQL':>5}{'Budget':>8}{'p50':>10}{'max':>10}{'Budget':>10}  Result")
+        for row in results:
+            status = self.style.ERROR('FAIL ' + '; '.join(row['failures'])) if row['failures'] else self.style.SUCCESS('ok')
+            self.stdout.write(
+                f"{row['name']:<24}{row['queries']:>5}{row['query_budget']:>8}{row['p50_ms']:>8.1f}ms"
+                f"{row['max_ms']:>8.1f}ms{row['time_budget_ms'] * options['time_scale']:>8.0f}ms  {status}"
+            )
+
+        failed = [row['name'] for row in results if row['failures']]
+        if failed:
+            raise CommandError(f"{len(failed)} endpoint(s) over budget: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f"All {len(results)} endpoints within budget"))
@@ -0,0 +1,58 @@
+"""
+Management command to fill a database with a large, realistic canteen history
+for benchmarking: users, catalog, reviews, favourites, orders, payments and
+wallet transactions, shaped by rush hours and fully reproducible from --seed.
+
+Use a scratch database — generated users log in with password "loadtest123".
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from orders import datagen
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate users, menu, reviews, orders and payments for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--items', type=int, default=120, help='Menu items')
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--favorites', type=int, default=3000)
+        parser.add_argument('--days', type=int, default=90, help='Days of order history ending today')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed, same data)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--prefix', default=datagen.PREFIX, help='Username / token prefix for generated rows')
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated rows first')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['flush']:
+            self.stdout.write(f"Flushing previous '{prefix}' data...")
+            datagen.flush(prefix)
+        elif User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Generated '{prefix}' data already exists; rerun with --flush or another --prefix")
+
+        started = time.perf_counter()
+        counts = datagen.generate(
+            users=options['users'],
+            categories=options['categories'],
+            items=options['items'],
+            orders=options['orders'],
+            reviews=options['reviews'],
+            favorites=options['favorites'],
+            days=options['days'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            prefix=prefix,
+            log=self.stdout.write,
+        )
+        elapsed = time.perf_counter() - started
+
+        for name, count in counts.items():
+            self.stdout.write(f"  {name:<20}{count:>10}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['orders']} orders in {elapsed:.1f}s ({counts['orders'] / max(elapsed, 0.001):.0f} orders/s)"
+        ))
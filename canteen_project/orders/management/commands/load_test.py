@@ -0,0 +1,65 @@
+"""
+Management command to simulate a lunch rush: N concurrent students ordering
+and paying by wallet while kitchen screens poll, then report latency
+percentiles, throughput and SQL queries per endpoint.
+
+Runs against the configured database (use a scratch SQLite/PostgreSQL DB —
+it creates loadtest_* users, a "Load Test" category and real orders), so it
+refuses to start unless DEBUG is on or --allow-db is given.
+"""
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from orders import loadtest
+
+
+class Command(BaseCommand):
+    help = "Drive concurrent simulated students and kitchen pollers through the order pipeline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50, help='Number of students placing an order')
+        parser.add_argument('--concurrency', type=int, default=10, help='Students ordering at the same time')
+        parser.add_argument('--pollers', type=int, default=2, help='Kitchen screens polling the KDS')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between kitchen polls')
+        parser.add_argument('--think-time', type=float, default=0.0, help='Max seconds a student pauses between steps')
+        parser.add_argument('--online-share', type=float, default=0.0,
+                            help='Fraction of students paying online (through the fake payment gateway)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for student behaviour')
+        parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+        parser.add_argument('--allow-db', action='store_true',
+                            help='Run even though DEBUG is off (the database must be a scratch copy)')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['allow_db']:
+            raise CommandError("DEBUG is off: this may be a production database. The load test creates users, "
+                               "wallet credits and orders; rerun with --allow-db on a scratch database.")
+        # Don't send hundreds of order confirmation emails, or real payments to Stripe
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                               PAYMENT_GATEWAY='fake', FAKE_GATEWAY_ALLOWED=True):
+            result = loadtest.run(
+                students=options['students'],
+                concurrency=options['concurrency'],
+                pollers=options['pollers'],
+                poll_interval=options['poll_interval'],
+                think_time=options['think_time'],
+                seed_value=options['seed'],
+                online_share=options['online_share'],
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'Endpoint':<24}{'Reqs':>6}{'Errs':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>8}{'SQL avg':>9}{'SQL max':>9}"
+        )
+        for name, row in result['endpoints'].items():
+            self.stdout.write(
+                f"{name:<24}{row['requests']:>6}{row['errors']:>6}{row['p50_ms']:>7.1f}ms{row['p95_ms']:>7.1f}ms"
+                f"{row['p99_ms']:>7.1f}ms{row['rps']:>8.1f}{row['avg_queries']:>9.1f}{row['max_queries']:>9}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['orders']} orders placed in {result['elapsed']}s "
+            f"({result['orders'] / result['elapsed']:.1f} orders/s)" if result['elapsed'] else "No requests made"
+        ))
@@ -0,0 +1,14 @@
+"""
+Management command to rebuild the kitchen prep board from the active orders.
+Run after bulk status changes that bypass model signals (e.g. queryset.update()).
+"""
+from django.core.management.base import BaseCommand
+from orders import prep_board
+
+
+class Command(BaseCommand):
+    help = "Recompute the kitchen prep board from pending/confirmed/preparing orders"
+
+    def handle(self, *args, **options):
+        rows = prep_board.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Prep board rebuilt: {rows} rows"))
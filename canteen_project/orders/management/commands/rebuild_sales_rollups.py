@@ -0,0 +1,26 @@
+"""
+Management command to recompute the daily sales rollups (DailyOrderStats and
+DailyItemSales) from orders — after bulk imports, raw SQL fixes or deleting
+orders, none of which go through the signals that keep them current.
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily order / item sales rollup tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Only rebuild the last N days (default: everything)')
+
+    def handle(self, *args, **options):
+        dates = None
+        if options['days']:
+            today = timezone.localdate()
+            dates = [today - timedelta(days=n) for n in range(options['days'])]
+        order_rows, item_rows = rollups.rebuild(dates)
+        self.stdout.write(self.style.SUCCESS(
+            f"Sales rollups rebuilt: {order_rows} daily order rows, {item_rows} daily item rows"
+        ))
@@ -0,0 +1,31 @@
+"""
+Management command to refresh the item demand forecasts used for kitchen prep
+planning. Meant to run nightly (e.g. from cron after closing): it re-aggregates
+the last few days of order lines into hourly demand, refits the per-item,
+per-hour-of-week forecasts and refreshes the cached copy the KDS reads.
+"""
+from django.core.management.base import BaseCommand
+from orders import forecast
+
+
+class Command(BaseCommand):
+    help = "Refresh hourly item demand history and the precomputed demand forecasts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2,
+                            help='Re-aggregate order history for the last N days (default: 2)')
+        parser.add_argument('--full', action='store_true', help='Re-aggregate the whole order history')
+        parser.add_argument('--weeks', type=int, default=forecast.HISTORY_WEEKS,
+                            help=f'Weeks of history to fit on (default: {forecast.HISTORY_WEEKS})')
+        parser.add_argument('--alpha', type=float, default=forecast.ALPHA,
+                            help=f'Smoothing factor, weight of the latest week (default: {forecast.ALPHA})')
+
+    def handle(self, *args, **options):
+        result = forecast.refresh(
+            days=None if options['full'] else options['days'],
+            weeks=options['weeks'], alpha=options['alpha'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Demand forecast refreshed: {result['hourly_rows']} hourly rows, "
+            f"{result['items']} items, {result['forecasts']} item-hours"
+        ))
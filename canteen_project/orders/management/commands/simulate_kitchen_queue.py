@@ -0,0 +1,33 @@
+"""
+Management command to replay historical orders through each kitchen queue policy
+and compare mean waiting time, e.g. before switching KITCHEN_QUEUE_POLICY.
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.models import Order
+from orders.scheduler import POLICIES, load_entries, simulate
+
+
+class Command(BaseCommand):
+    help = "Replay past orders through FIFO / EDD / SPT scheduling and compare waits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='How many days of orders to replay')
+        parser.add_argument('--cooks', type=int, default=1, help='Number of parallel cooks')
+        parser.add_argument('--policy', choices=sorted(POLICIES), help='Only simulate one policy')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        orders = Order.objects.filter(created_at__gte=since).exclude(status__in=['payment_pending', 'cancelled'])
+        entries = load_entries(orders)
+        self.stdout.write(f"Replaying {len(entries)} orders with {options['cooks']} cook(s)")
+
+        names = [options['policy']] if options['policy'] else sorted(POLICIES)
+        self.stdout.write(f"{'Policy':<8}{'Orders':>8}{'Mean wait':>12}{'Max wait':>12}{'Mean late':>12}")
+        for name in names:
+            result = simulate(entries, POLICIES[name], cooks=options['cooks'])
+            self.stdout.write(
+                f"{name:<8}{result['orders']:>8}{result['mean_wait']:>11.1f}m"
+                f"{result['max_wait']:>11.1f}m{result['mean_lateness']:>11.1f}m"
+            )
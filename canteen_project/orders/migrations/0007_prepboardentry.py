@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-19 03:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0005_review_admin_response'),
+        ('orders', '0006_alter_order_payment_method'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrepBoardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_name', models.CharField(max_length=100)),
+                ('slot', models.DateTimeField(blank=True, help_text='Preorder slot start (empty = cook now)', null=True)),
+                ('quantity', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('menu_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='menu.menuitem')),
+            ],
+            options={
+                'verbose_name_plural': 'Prep board entries',
+                'indexes': [models.Index(fields=['slot', 'item_name'], name='prepboard_slot_item_idx')],
+            },
+        ),
+    ]
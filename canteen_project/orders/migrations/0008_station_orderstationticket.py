@@ -0,0 +1,44 @@
+# Generated by Django 6.0.2 on 2026-10-19 04:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0005_review_admin_response'),
+        ('orders', '0007_prepboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Station',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(help_text='Used in the station screen URL and WebSocket group', unique=True)),
+                ('is_default', models.BooleanField(default=False, help_text='Receives items whose category has no station')),
+                ('is_active', models.BooleanField(default=True)),
+                ('categories', models.ManyToManyField(blank=True, related_name='stations', to='menu.category')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderStationTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_done', models.BooleanField(default=False)),
+                ('done_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='station_tickets', to='orders.order')),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='orders.station')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['station', 'is_done'], name='ticket_station_done_idx')],
+                'unique_together': {('order', 'station')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-19 04:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_station_orderstationticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('block', models.CharField(help_text='Building block / floor the run covers', max_length=50)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('assigned', 'Assigned'), ('out', 'Out for Delivery'), ('completed', 'Completed')], default='open', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('runner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='delivery_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='orders.deliveryrun'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryrun',
+            index=models.Index(fields=['status'], name='deliveryrun_status_idx'),
+        ),
+    ]
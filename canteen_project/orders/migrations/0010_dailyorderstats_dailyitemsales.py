@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-19 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0005_review_admin_response'),
+        ('orders', '0009_deliveryrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('is_paid', models.BooleanField()),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('items_sold', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily order stats',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'payment_method', 'status', 'is_paid')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('item_name', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=20)),
+                ('is_paid', models.BooleanField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='menu.category')),
+                ('menu_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='menu.menuitem')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily item sales',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'item_name'], name='itemsales_date_item_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.2 on 2026-10-19 04:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0005_review_admin_response'),
+        ('orders', '0010_dailyorderstats_dailyitemsales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_name', models.CharField(max_length=100)),
+                ('hour_of_week', models.PositiveSmallIntegerField()),
+                ('quantity', models.FloatField(help_text='Exponentially smoothed weekly demand')),
+                ('average', models.FloatField(help_text='Plain seasonal average over the history window')),
+                ('generated_at', models.DateTimeField()),
+                ('menu_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='menu.menuitem')),
+            ],
+            options={
+                'unique_together': {('item_name', 'hour_of_week')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemHourlyDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the local hour')),
+                ('item_name', models.CharField(max_length=100)),
+                ('quantity', models.IntegerField(default=0)),
+                ('menu_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='menu.menuitem')),
+            ],
+            options={
+                'verbose_name_plural': 'Item hourly demand',
+                'indexes': [models.Index(fields=['hour'], name='hourlydemand_hour_idx')],
+            },
+        ),
+    ]
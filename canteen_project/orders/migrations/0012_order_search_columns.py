@@ -0,0 +1,64 @@
+# Generated by Django 6.0.2 on 2026-10-19 04:48
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Lower, Replace
+
+TRIGRAM_COLUMNS = ['search_token', 'search_username', 'search_email']
+
+
+def fill_search_columns(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    User = apps.get_model('auth', 'User')
+    user = User.objects.filter(pk=OuterRef('user_id'))
+    Order.objects.update(
+        search_token=Lower(Replace('token_number', Value('TKN-'), Value(''))),
+        search_username=Lower(Subquery(user.values('username')[:1])),
+        search_email=Lower(Subquery(user.values('email')[:1])),
+    )
+
+
+def add_trigram_indexes(apps, schema_editor):
+    """Match-anywhere search on PostgreSQL; other databases keep to prefix lookups"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS order_{column}_trgm ON orders_order USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS order_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_itemhourlydemand_demandforecast'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='search_email',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='search_token',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='search_username',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=150),
+        ),
+        migrations.RunPython(fill_search_columns, migrations.RunPython.noop),
+        migrations.RunPython(add_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    PrepBoardEntry = apps.get_model('orders', 'PrepBoardEntry')
+    kept = {}
+    for entry in PrepBoardEntry.objects.order_by('id'):
+        key = (entry.menu_item_id, entry.item_name, entry.slot)
+        if key in kept:
+            kept[key].quantity += entry.quantity
+            kept[key].save(update_fields=['quantity'])
+            entry.delete()
+        else:
+            kept[key] = entry
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_order_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='prepboardentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('slot__isnull', False)), fields=('menu_item', 'item_name', 'slot'), name='prepboard_item_slot_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='prepboardentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('slot__isnull', True)), fields=('menu_item', 'item_name'), name='prepboard_item_now_uniq'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+def fill_row_keys(apps, schema_editor):
+    # Mirrors PrepBoardEntry.key_for; rows that share a key are merged into the oldest
+    PrepBoardEntry = apps.get_model('orders', 'PrepBoardEntry')
+    kept = {}
+    for entry in PrepBoardEntry.objects.order_by('id'):
+        slot_key = int(entry.slot.timestamp()) if entry.slot else '-'
+        key = f"{entry.menu_item_id or '-'}|{slot_key}|{entry.item_name}"
+        if key in kept:
+            kept[key].quantity += entry.quantity
+            kept[key].save(update_fields=['quantity'])
+            entry.delete()
+        else:
+            entry.row_key = key
+            entry.save(update_fields=['row_key'])
+            kept[key] = entry
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_prepboardentry_unique'),
+    ]
+
+    operations = [
+        # Partial unique indexes aren't enforced on MySQL, and NULL menu items never clash in them
+        migrations.RemoveConstraint(
+            model_name='prepboardentry',
+            name='prepboard_item_slot_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='prepboardentry',
+            name='prepboard_item_now_uniq',
+        ),
+        migrations.AddField(
+            model_name='prepboardentry',
+            name='row_key',
+            field=models.CharField(default='', editable=False, max_length=191),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_row_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+def fill_row_keys(apps, schema_editor):
+    # Mirrors DailyItemSales.key_for; rows that share a key are merged into the oldest
+    DailyItemSales = apps.get_model('orders', 'DailyItemSales')
+    kept = {}
+    for row in DailyItemSales.objects.order_by('id'):
+        key = (f"{row.date.isoformat()}|{row.status}|{int(row.is_paid)}|"
+               f"{row.menu_item_id or '-'}|{row.category_id or '-'}|{row.item_name}")
+        if key in kept:
+            kept[key].quantity += row.quantity
+            kept[key].revenue += row.revenue
+            kept[key].save(update_fields=['quantity', 'revenue'])
+            row.delete()
+        else:
+            row.row_key = key
+            row.save(update_fields=['row_key'])
+            kept[key] = row
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0016_prepboardentry_row_key_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyitemsales',
+            name='row_key',
+            field=models.CharField(default='', editable=False, max_length=191),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_row_keys, migrations.RunPython.noop),
+    ]
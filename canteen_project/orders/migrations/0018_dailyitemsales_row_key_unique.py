@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_dailyitemsales_row_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyitemsales',
+            name='row_key',
+            field=models.CharField(editable=False, max_length=191, unique=True),
+        ),
+    ]
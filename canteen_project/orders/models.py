@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
-from menu.models import MenuItem
+from menu.models import MenuItem, Category
 import random
 import string
 import qrcode
@@ -73,6 +73,15 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     scheduled_for = models.DateTimeField(null=True, blank=True, help_text="Requested delivery/pickup time for preorders")
+    delivery_run = models.ForeignKey('DeliveryRun', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+
+    # Bumped on every write; status changes compare-and-swap on it (see orders/transitions.py)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    # Lower-cased lookup columns for staff search (see orders/search.py)
+    search_token = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
+    search_username = models.CharField(max_length=150, blank=True, db_index=True, editable=False)
+    search_email = models.CharField(max_length=254, blank=True, db_index=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -85,6 +94,30 @@ class Order(models.Model):
     
     def __str__(self):
         return f"{self.token_number} - {self.user.username}"
+
+    def save(self, *args, **kwargs):
+        from .search import normalize_token, user_values
+        self.search_token = normalize_token(self.token_number)
+        if self._state.adding or not self.search_username:
+            for field, value in user_values(self.user).items():
+                setattr(self, field, value)
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # Invalidate versions other screens hold, even for writes outside orders.transitions
+        self.version = models.F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+
+    def _save_table(self, *args, **kwargs):
+        updated = super()._save_table(*args, **kwargs)
+        # The bumped version comes back with the UPDATE (RETURNING) on Django 6+ where the backend
+        # supports it; otherwise read it here, so post_save receivers never see the F() expression
+        if isinstance(self.__dict__.get('version'), models.expressions.Combinable):
+            self.version = type(self)._base_manager.using(self._state.db).values_list(
+                'version', flat=True).get(pk=self.pk)
+        return updated
     
     def can_transition_to(self, new_status):
         """Check if transition to new_status is valid"""
@@ -131,3 +164,193 @@ class OrderItem(models.Model):
     def get_subtotal(self):
         return self.price * self.quantity
 
+
+
+class PrepBoardEntry(models.Model):
+    """Running quantity of a menu item across the active kitchen queue.
+
+    Rows are adjusted incrementally by ``orders.prep_board`` whenever an order
+    enters or leaves the prep statuses, so the board never re-scans orders.
+    ``slot`` is empty for cook-now orders and holds the slot start for preorders.
+    ``row_key`` spells out (menu item, slot, item name) without NULLs, so a
+    plain unique index keeps one row per key on every database.
+    """
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.SET_NULL, null=True, blank=True)
+    item_name = models.CharField(max_length=100)
+    slot = models.DateTimeField(null=True, blank=True, help_text="Preorder slot start (empty = cook now)")
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    row_key = models.CharField(max_length=191, unique=True, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'Prep board entries'
+        indexes = [
+            models.Index(fields=['slot', 'item_name'], name='prepboard_slot_item_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x {self.item_name}"
+
+    @staticmethod
+    def key_for(menu_item_id, item_name, slot):
+        slot_key = int(slot.timestamp()) if slot else '-'
+        return f"{menu_item_id or '-'}|{slot_key}|{item_name}"
+
+    def save(self, *args, **kwargs):
+        self.row_key = self.key_for(self.menu_item_id, self.item_name, self.slot)
+        super().save(*args, **kwargs)
+
+
+class Station(models.Model):
+    """Kitchen prep station (e.g. Beverages, Hot Kitchen) serving a set of categories"""
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=50, unique=True, help_text="Used in the station screen URL and WebSocket group")
+    categories = models.ManyToManyField(Category, blank=True, related_name='stations')
+    is_default = models.BooleanField(default=False, help_text="Receives items whose category has no station")
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class OrderStationTicket(models.Model):
+    """One station's slice of an order; the order is ready once every ticket is done"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='station_tickets')
+    station = models.ForeignKey(Station, on_delete=models.CASCADE, related_name='tickets')
+    is_done = models.BooleanField(default=False)
+    done_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['order', 'station']
+        indexes = [
+            models.Index(fields=['station', 'is_done'], name='ticket_station_done_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order.token_number} @ {self.station.name}"
+
+
+class DeliveryRun(models.Model):
+    """A batch of ready classroom/staffroom orders carried by one runner in one trip"""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('assigned', 'Assigned'),
+        ('out', 'Out for Delivery'),
+        ('completed', 'Completed'),
+    ]
+
+    block = models.CharField(max_length=50, help_text="Building block / floor the run covers")
+    runner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='delivery_runs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status'], name='deliveryrun_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Run #{self.id} – {self.block} [{self.status}]"
+
+
+class DailyOrderStats(models.Model):
+    """Order count and revenue per local day, payment method and final outcome.
+
+    Only orders that reached a final status (delivered, collected, cancelled)
+    are rolled up — maintained by ``orders.rollups`` as each order finishes.
+    Orders still in flight are read live, so range queries stay exact.
+    """
+    date = models.DateField()
+    payment_method = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    is_paid = models.BooleanField()
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items_sold = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Daily order stats'
+        unique_together = ['date', 'payment_method', 'status', 'is_paid']
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.date} {self.payment_method}/{self.status}: {self.orders} orders"
+
+
+class DailyItemSales(models.Model):
+    """Quantity and revenue per local day and menu item for delivered/collected orders.
+
+    ``row_key`` spells out the grouping columns without NULLs (menu item and
+    category may be empty), so a plain unique index keeps one row per key.
+    """
+    date = models.DateField()
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.SET_NULL, null=True, blank=True)
+    item_name = models.CharField(max_length=100)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20)
+    is_paid = models.BooleanField()
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    row_key = models.CharField(max_length=191, unique=True, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'Daily item sales'
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'item_name'], name='itemsales_date_item_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.item_name}: {self.quantity}"
+
+    @staticmethod
+    def key_for(date, menu_item_id, item_name, category_id, status, is_paid):
+        return f"{date.isoformat()}|{status}|{int(is_paid)}|{menu_item_id or '-'}|{category_id or '-'}|{item_name}"
+
+    def save(self, *args, **kwargs):
+        self.row_key = self.key_for(self.date, self.menu_item_id, self.item_name, self.category_id,
+                                    self.status, self.is_paid)
+        super().save(*args, **kwargs)
+
+
+class ItemHourlyDemand(models.Model):
+    """Quantity ordered per menu item and local clock hour — the history behind demand forecasts.
+
+    Maintained by ``orders.forecast.refresh_history`` (nightly), not by signals.
+    """
+    hour = models.DateTimeField(help_text="Start of the local hour")
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.SET_NULL, null=True, blank=True)
+    item_name = models.CharField(max_length=100)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Item hourly demand'
+        indexes = [
+            models.Index(fields=['hour'], name='hourlydemand_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.item_name}: {self.quantity}"
+
+
+class DemandForecast(models.Model):
+    """Expected quantity of a menu item in one hour of the week (0 = Monday 00:00 local)"""
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.SET_NULL, null=True, blank=True)
+    item_name = models.CharField(max_length=100)
+    hour_of_week = models.PositiveSmallIntegerField()
+    quantity = models.FloatField(help_text="Exponentially smoothed weekly demand")
+    average = models.FloatField(help_text="Plain seasonal average over the history window")
+    generated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('item_name', 'hour_of_week')
+
+    def __str__(self):
+        return f"{self.item_name} @ {self.hour_of_week}: {self.quantity:.1f}"
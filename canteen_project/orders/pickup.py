@@ -0,0 +1,110 @@
+"""Counter pickup: scan an order's QR code and hand it over in one step.
+
+The QR code on the order page encodes ``ORDER:<token>|USER:<username>|TOTAL:<amount>``
+(see ``Order.qr_code_data``). A scan is resolved through the unique token
+index, checked against the state machine (only ``ready`` orders can be
+collected) and moved with a compare-and-swap transition, so the usual order
+signals keep the prep board, rollups and dashboards up to date. A batch of
+scans is handled with one lookup for all of its orders.
+"""
+import logging
+from django.contrib.auth.models import User
+from django.db import transaction
+from .models import Order, OrderItem
+from .transitions import TransitionConflict, transition
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 50
+
+# result code -> HTTP status for single scans
+HTTP_STATUS = {
+    'collected': 200,
+    'already_collected': 200,
+    'invalid': 400,
+    'not_found': 404,
+    'wrong_user': 409,
+    'not_ready': 409,
+    'conflict': 409,
+}
+
+
+def parse_scan(payload):
+    """Read the token (and username, if present) from a scanned QR payload or a typed token.
+
+    Returns:
+        tuple: (token_number, username or None)
+
+    Raises:
+        ValueError: if the payload holds no order token
+    """
+    fields = {}
+    for part in (payload or '').strip().split('|'):
+        key, sep, value = part.partition(':')
+        if sep:
+            fields[key.strip().upper()] = value.strip()
+    token = fields.get('ORDER') if fields else (payload or '').strip().lstrip('#')
+    if not token:
+        raise ValueError('Not an order QR code')
+    return token.upper(), fields.get('USER')
+
+
+def _result(token, code, message, order=None, username=None):
+    result = {'token': token, 'ok': code in ('collected', 'already_collected'), 'result': code, 'message': message}
+    if order is not None:
+        result.update(order_id=order.id, status=order.status, customer=username)
+    return result
+
+
+@transaction.atomic
+def collect(payloads):
+    """Mark the scanned orders collected (and paid, as the counter takes any cash due).
+
+    Returns:
+        list: one result dict per payload, in order — token, ok, result code,
+        message and, for known orders, order_id, status, customer and (once
+        collected) the items to hand over
+    """
+    scans = []
+    for payload in payloads:
+        try:
+            scans.append((payload, *parse_scan(payload)))
+        except ValueError as exc:
+            scans.append((payload, None, str(exc)))
+
+    tokens = {token for _, token, _ in scans if token}
+    orders = {o.token_number: o for o in Order.objects.filter(token_number__in=tokens)}
+    usernames = dict(User.objects.filter(id__in={o.user_id for o in orders.values()})
+                     .values_list('id', 'username'))
+
+    results = []
+    for payload, token, detail in scans:
+        if token is None:
+            results.append(_result(payload, 'invalid', detail))
+            continue
+        order = orders.get(token)
+        if order is None:
+            results.append(_result(token, 'not_found', 'Order not found'))
+            continue
+        username = usernames.get(order.user_id)
+        if detail and detail != username:
+            results.append(_result(token, 'wrong_user', 'QR code does not match this order', order, username))
+        elif order.status == 'collected':
+            results.append(_result(token, 'already_collected', 'Already collected', order, username))
+        elif not order.can_transition_to('collected'):
+            results.append(_result(token, 'not_ready', f'Order is {order.get_status_display()}', order, username))
+        else:
+            try:
+                transition(order, 'collected', is_paid=True)
+                results.append(_result(token, 'collected', 'Collected', order, username))
+            except TransitionConflict as exc:
+                current = exc.current or order
+                results.append(_result(token, 'conflict', 'Order changed meanwhile, scan again', current, username))
+
+    collected = {r['order_id']: r for r in results if r['result'] == 'collected'}
+    for order_id, quantity, name in (OrderItem.objects.filter(order_id__in=collected)
+                                     .order_by('id').values_list('order_id', 'quantity', 'item_name')):
+        collected[order_id].setdefault('items', []).append(f'{quantity}x {name}')
+    if collected:
+        logger.info(f"Pickup counter collected {len(collected)} order(s)")
+    return results
@@ -0,0 +1,161 @@
+"""Kitchen prep board — aggregated item quantities across the active queue.
+
+The board is a small table of (item, slot) -> quantity rows that is adjusted
+incrementally from the order signals: an order entering a prep status adds its
+items, an order leaving subtracts them. Reading the board never touches orders.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Order, OrderItem, PrepBoardEntry
+
+logger = logging.getLogger(__name__)
+
+# Statuses whose items still have to be cooked
+PREP_STATUSES = ('pending', 'confirmed', 'preparing')
+
+# Preorders are grouped into slots of this many minutes
+SLOT_MINUTES = 30
+
+
+def slot_for(scheduled_for):
+    """Round a preorder time down to its slot start (None for cook-now orders)."""
+    if not scheduled_for:
+        return None
+    local = timezone.localtime(scheduled_for)
+    return local.replace(minute=local.minute - local.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+
+def _bump(menu_item_id, item_name, slot, delta):
+    """Add delta to one board row, creating or dropping the row as needed."""
+    if not delta:
+        return
+    # Matched on the columns (a deleted menu item nulls menu_item but not row_key);
+    # row_key's unique index is what stops two racing creates
+    rows = PrepBoardEntry.objects.filter(menu_item_id=menu_item_id, item_name=item_name, slot=slot)
+    updated = rows.update(quantity=F('quantity') + delta)
+    if not updated and delta > 0:
+        try:
+            with transaction.atomic():
+                PrepBoardEntry.objects.create(
+                    menu_item_id=menu_item_id, item_name=item_name, slot=slot, quantity=delta,
+                )
+        except IntegrityError:  # created concurrently
+            rows.update(quantity=F('quantity') + delta)
+    elif delta < 0:
+        rows.filter(quantity__lte=0).delete()
+
+
+def apply_order_change(order, old_status):
+    """Move an order's items on/off the board when its status crosses the prep boundary."""
+    was_active = old_status in PREP_STATUSES
+    is_active = order.status in PREP_STATUSES
+    if was_active == is_active:
+        return
+
+    sign = 1 if is_active else -1
+    slot = slot_for(order.scheduled_for)
+    for menu_item_id, item_name, quantity in order.items.values_list('menu_item_id', 'item_name', 'quantity'):
+        _bump(menu_item_id, item_name, slot, sign * quantity)
+
+
+def apply_item_change(item, sign, order_status=None, scheduled_for=None):
+    """Add (sign=1) or remove (sign=-1) a single order line while its order is active."""
+    if order_status is None:
+        order_status, scheduled_for = item.order.status, item.order.scheduled_for
+    if order_status in PREP_STATUSES:
+        _bump(item.menu_item_id, item.item_name, slot_for(scheduled_for), sign * item.quantity)
+
+
+def apply_bulk_change(orders, old_statuses):
+    """apply_order_change for many orders at once (e.g. after a bulk update()):
+    one query for their lines, then one delta per board row.
+
+    Args:
+        orders: the orders with their new status
+        old_statuses: {order id: status before the update}
+    """
+    signs = {}
+    for order in orders:
+        was_active, is_active = old_statuses[order.id] in PREP_STATUSES, order.status in PREP_STATUSES
+        if was_active != is_active:
+            signs[order.id] = (1 if is_active else -1, slot_for(order.scheduled_for))
+    if not signs:
+        return
+    deltas = defaultdict(int)
+    for order_id, menu_item_id, item_name, quantity in OrderItem.objects.filter(order_id__in=signs).values_list(
+            'order_id', 'menu_item_id', 'item_name', 'quantity'):
+        sign, slot = signs[order_id]
+        deltas[(menu_item_id, item_name, slot)] += sign * quantity
+    for (menu_item_id, item_name, slot), delta in deltas.items():
+        _bump(menu_item_id, item_name, slot, delta)
+
+
+def rebuild():
+    """Recompute the whole board from the active orders (recovery / bulk updates).
+
+    Returns:
+        int: number of board rows written
+    """
+    totals = defaultdict(int)
+    lines = (
+        OrderItem.objects.filter(order__status__in=PREP_STATUSES)
+        .values_list('menu_item_id', 'item_name', 'order__scheduled_for')
+        .annotate(qty=Sum('quantity'))
+    )
+    for menu_item_id, item_name, scheduled_for, qty in lines:
+        totals[(menu_item_id, item_name, slot_for(scheduled_for))] += qty
+
+    PrepBoardEntry.objects.all().delete()
+    PrepBoardEntry.objects.bulk_create([
+        PrepBoardEntry(menu_item_id=menu_item_id, item_name=item_name, slot=slot, quantity=qty,
+                       row_key=PrepBoardEntry.key_for(menu_item_id, item_name, slot))
+        for (menu_item_id, item_name, slot), qty in totals.items() if qty > 0
+    ])
+    logger.info(f"Prep board rebuilt: {len(totals)} rows")
+    return len(totals)
+
+
+def get_board(include_slots=False):
+    """Return the board as JSON-ready data.
+
+    Preorder slots that start within the next slot window are folded into the
+    cook-now list; later slots are listed separately when include_slots is set.
+    """
+    cutoff = timezone.now() + timedelta(minutes=SLOT_MINUTES)
+    rows = (
+        PrepBoardEntry.objects.filter(quantity__gt=0)
+        .values('menu_item_id', 'item_name', 'slot')
+        .annotate(qty=Sum('quantity'))
+    )
+
+    now_totals = defaultdict(int)
+    slot_totals = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        key = (row['menu_item_id'], row['item_name'])
+        if row['slot'] is None or row['slot'] < cutoff:
+            now_totals[key] += row['qty']
+        elif include_slots:
+            slot_totals[row['slot']][key] += row['qty']
+
+    def as_list(totals):
+        items = [
+            {'menu_item_id': menu_item_id, 'name': name, 'qty': qty}
+            for (menu_item_id, name), qty in totals.items()
+        ]
+        items.sort(key=lambda i: (-i['qty'], i['name']))
+        return items
+
+    board = {
+        'items': as_list(now_totals),
+        'total_qty': sum(now_totals.values()),
+    }
+    if include_slots:
+        board['slots'] = [
+            {'slot': timezone.localtime(slot).isoformat(), 'items': as_list(slot_totals[slot])}
+            for slot in sorted(slot_totals)
+        ]
+    return board
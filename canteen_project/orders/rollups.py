@@ -0,0 +1,367 @@
+"""Daily sales rollups — pre-aggregated history for the analytics endpoints.
+
+When an order reaches a final status (delivered, collected, cancelled) its
+totals are added to ``DailyOrderStats`` and its lines to ``DailyItemSales``,
+keyed by the local day it was placed. Orders still in flight are never rolled
+up; the read helpers below add them live (a small, status-indexed set), so any
+date range is answered from a few hundred rollup rows plus that delta.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Min, Q, Sum
+from django.utils import timezone
+from .models import DailyItemSales, DailyOrderStats, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which an order never changes again
+FINAL_STATUSES = ('delivered', 'collected', 'cancelled')
+COMPLETED_STATUSES = ('delivered', 'collected')
+ALL_STATUSES = tuple(status for status, _ in Order.STATUS_CHOICES)
+
+LINE_TOTAL = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField())
+
+
+def local_date(value):
+    return timezone.localtime(value).date()
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def _bump(model, keys, **deltas):
+    """Add deltas to the rollup row for keys, creating it on first use.
+
+    Both rollup tables have a unique key, so of two racing creates one fails
+    and adds its deltas to the other's row.
+    """
+    rows = model.objects.filter(**keys)
+    if rows.update(**{field: F(field) + delta for field, delta in deltas.items()}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:  # another worker created the row first
+        rows.update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def apply_order(order, sign, status, is_paid):
+    """Add (sign=1) or remove (sign=-1) one final order from the rollups"""
+    day = local_date(order.created_at)
+    lines = list(order.items.values_list('menu_item_id', 'item_name', 'menu_item__category_id', 'price', 'quantity'))
+
+    _bump(
+        DailyOrderStats,
+        {'date': day, 'payment_method': order.payment_method, 'status': status, 'is_paid': is_paid},
+        orders=sign, revenue=sign * order.total_amount, items_sold=sign * sum(line[4] for line in lines),
+    )
+    if status not in COMPLETED_STATUSES:
+        return
+
+    per_item = defaultdict(lambda: [0, Decimal('0')])
+    for menu_item_id, item_name, category_id, price, quantity in lines:
+        totals = per_item[(menu_item_id, item_name, category_id)]
+        totals[0] += quantity
+        totals[1] += price * quantity
+    for (menu_item_id, item_name, category_id), (quantity, revenue) in per_item.items():
+        _bump(
+            DailyItemSales,
+            {'date': day, 'menu_item_id': menu_item_id, 'item_name': item_name, 'category_id': category_id,
+             'status': status, 'is_paid': is_paid},
+            quantity=sign * quantity, revenue=sign * revenue,
+        )
+
+
+def apply_item_change(item, sign, order):
+    """Add or remove one line of an order that is already rolled up"""
+    if order.status not in FINAL_STATUSES:
+        return
+    day = local_date(order.created_at)
+    _bump(
+        DailyOrderStats,
+        {'date': day, 'payment_method': order.payment_method, 'status': order.status, 'is_paid': order.is_paid},
+        items_sold=sign * item.quantity,
+    )
+    if order.status in COMPLETED_STATUSES:
+        category_id = item.menu_item.category_id if item.menu_item_id else None
+        _bump(
+            DailyItemSales,
+            {'date': day, 'menu_item_id': item.menu_item_id, 'item_name': item.item_name,
+             'category_id': category_id, 'status': order.status, 'is_paid': order.is_paid},
+            quantity=sign * item.quantity, revenue=sign * item.price * item.quantity,
+        )
+
+
+def on_order_change(order, old_status, old_paid):
+    """Keep the rollups in step when an order's final status or payment flag changes"""
+    was_final = old_status in FINAL_STATUSES
+    is_final = order.status in FINAL_STATUSES
+    if was_final and (old_status, old_paid) == (order.status, order.is_paid):
+        return
+    if was_final:
+        apply_order(order, -1, old_status, old_paid)
+    if is_final:
+        apply_order(order, 1, order.status, order.is_paid)
+
+
+def apply_bulk_change(orders, old):
+    """on_order_change for many orders at once (e.g. after a bulk update()):
+    one query for their lines, then one delta per rollup row.
+
+    Args:
+        orders: the orders with their new status and is_paid
+        old: {order id: (status, is_paid) before the update}
+    """
+    moves = defaultdict(list)    # order id -> [(sign, status, is_paid)]
+    for order in orders:
+        old_status, old_paid = old[order.id]
+        if old_status in FINAL_STATUSES and (old_status, old_paid) == (order.status, order.is_paid):
+            continue
+        if old_status in FINAL_STATUSES:
+            moves[order.id].append((-1, old_status, old_paid))
+        if order.status in FINAL_STATUSES:
+            moves[order.id].append((1, order.status, order.is_paid))
+    if not moves:
+        return
+    by_id = {order.id: order for order in orders}
+
+    lines = defaultdict(list)
+    for order_id, *line in OrderItem.objects.filter(order_id__in=moves).values_list(
+            'order_id', 'menu_item_id', 'item_name', 'menu_item__category_id', 'price', 'quantity'):
+        lines[order_id].append(line)
+
+    order_deltas = defaultdict(lambda: [0, Decimal('0'), 0])
+    item_deltas = defaultdict(lambda: [0, Decimal('0')])
+    for order_id, order_moves in moves.items():
+        order = by_id[order_id]
+        day = local_date(order.created_at)
+        for sign, status, is_paid in order_moves:
+            totals = order_deltas[(day, order.payment_method, status, is_paid)]
+            totals[0] += sign
+            totals[1] += sign * order.total_amount
+            totals[2] += sign * sum(line[4] for line in lines[order_id])
+            if status not in COMPLETED_STATUSES:
+                continue
+            for menu_item_id, item_name, category_id, price, quantity in lines[order_id]:
+                totals = item_deltas[(day, menu_item_id, item_name, category_id, status, is_paid)]
+                totals[0] += sign * quantity
+                totals[1] += sign * price * quantity
+
+    for (day, payment_method, status, is_paid), (count, revenue, items_sold) in order_deltas.items():
+        if count or revenue or items_sold:
+            _bump(DailyOrderStats,
+                  {'date': day, 'payment_method': payment_method, 'status': status, 'is_paid': is_paid},
+                  orders=count, revenue=revenue, items_sold=items_sold)
+    for (day, menu_item_id, item_name, category_id, status, is_paid), (quantity, revenue) in item_deltas.items():
+        if quantity or revenue:
+            _bump(DailyItemSales,
+                  {'date': day, 'menu_item_id': menu_item_id, 'item_name': item_name, 'category_id': category_id,
+                   'status': status, 'is_paid': is_paid},
+                  quantity=quantity, revenue=revenue)
+
+
+def _rebuild_day(day, orders, items):
+    """Rollup rows for one local day, bucketed on its precomputed bounds.
+
+    Filtering on bounds rather than TruncDate/__date keeps the database's time
+    zone functions out of it (MySQL needs its timezone tables for those).
+    """
+    start, end = _day_start(day), _day_start(day + timedelta(days=1))
+    orders = orders.filter(created_at__gte=start, created_at__lt=end)
+    keys = ('payment_method', 'status', 'is_paid')
+    stats = {}
+    for row in orders.values(*keys).annotate(orders=Count('id'), revenue=Sum('total_amount')):
+        stats[tuple(row[k] for k in keys)] = DailyOrderStats(
+            date=day, payment_method=row['payment_method'], status=row['status'], is_paid=row['is_paid'],
+            orders=row['orders'], revenue=row['revenue'] or 0,
+        )
+    sold = (
+        OrderItem.objects.filter(order__in=orders)
+        .values_list('order__payment_method', 'order__status', 'order__is_paid')
+        .annotate(qty=Sum('quantity'))
+    )
+    for payment_method, status, is_paid, qty in sold:
+        stats[(payment_method, status, is_paid)].items_sold = qty or 0
+
+    sales = [
+        DailyItemSales(
+            date=day, menu_item_id=row['menu_item_id'], item_name=row['item_name'],
+            category_id=row['menu_item__category_id'], status=row['order__status'],
+            is_paid=row['order__is_paid'], quantity=row['qty'], revenue=row['revenue'] or 0,
+            row_key=DailyItemSales.key_for(day, row['menu_item_id'], row['item_name'],
+                                           row['menu_item__category_id'], row['order__status'],
+                                           row['order__is_paid']),
+        )
+        for row in items.filter(order__created_at__gte=start, order__created_at__lt=end)
+        .values('menu_item_id', 'item_name', 'menu_item__category_id', 'order__status', 'order__is_paid')
+        .annotate(qty=Sum('quantity'), revenue=Sum(LINE_TOTAL))
+    ]
+    return list(stats.values()), sales
+
+
+@transaction.atomic
+def rebuild(dates=None):
+    """Recompute the rollups from orders — everything, or only the given local dates.
+
+    Used by ``manage.py rebuild_sales_rollups`` and the admin bulk actions, whose
+    ``update()`` calls skip the signals that keep the rollups current.
+
+    Returns:
+        tuple: (order stat rows, item sale rows) written
+    """
+    orders = Order.objects.filter(status__in=FINAL_STATUSES)
+    items = OrderItem.objects.filter(order__status__in=COMPLETED_STATUSES)
+    order_rows, item_rows = DailyOrderStats.objects.all(), DailyItemSales.objects.all()
+    partial = dates is not None
+    if partial:
+        dates = sorted(set(dates))
+        order_rows, item_rows = order_rows.filter(date__in=dates), item_rows.filter(date__in=dates)
+    else:
+        span = orders.aggregate(first=Min('created_at'), last=Max('created_at'))
+        first, last = (local_date(span['first']), local_date(span['last'])) if span['first'] else (None, None)
+        dates = [first + timedelta(days=n) for n in range((last - first).days + 1)] if first else []
+    order_rows.delete()
+    item_rows.delete()
+
+    stats, sales = [], []
+    for day in dates:
+        day_stats, day_sales = _rebuild_day(day, orders, items)
+        stats.extend(day_stats)
+        sales.extend(day_sales)
+    DailyOrderStats.objects.bulk_create(stats, batch_size=1000)
+    DailyItemSales.objects.bulk_create(sales, batch_size=1000)
+    logger.info(f"Sales rollups rebuilt: {len(stats)} order rows, {len(sales)} item rows"
+                + (f" for {len(dates)} day(s)" if partial else ''))
+    return len(stats), len(sales)
+
+
+def refresh_orders(orders):
+    """Rebuild the days touched by a set of orders, e.g. after a bulk update() of their status"""
+    dates = {local_date(created_at) for created_at in orders.values_list('created_at', flat=True)}
+    if dates:
+        rebuild(dates)
+    return dates
+
+
+# ----- Read helpers: rollups for final orders + live rows for in-flight ones -----
+
+def _split(statuses):
+    final = [s for s in statuses if s in FINAL_STATUSES]
+    live = [s for s in statuses if s not in FINAL_STATUSES]
+    return final, live
+
+
+def _live_orders(start_date, statuses):
+    orders = Order.objects.filter(status__in=statuses)
+    if start_date:
+        orders = orders.filter(created_at__gte=_day_start(start_date))
+    return orders
+
+
+def order_summary(start_date=None):
+    """Order count, revenue and items sold per (status, payment_method, is_paid) since start_date.
+
+    Returns:
+        list: dicts with status, payment_method, is_paid, orders, revenue, items_sold
+    """
+    rows = DailyOrderStats.objects.all()
+    if start_date:
+        rows = rows.filter(date__gte=start_date)
+    keys = ('status', 'payment_method', 'is_paid')
+    summary = {
+        row[:3]: dict(zip(keys + ('orders', 'revenue', 'items_sold'), row))
+        for row in rows.values_list(*keys).annotate(
+            total_orders=Sum('orders'), total_revenue=Sum('revenue'), total_items=Sum('items_sold')
+        )
+    }
+
+    live = _live_orders(start_date, _split(ALL_STATUSES)[1])
+    for row in live.values(*keys).annotate(orders=Count('id'), revenue=Sum('total_amount')):
+        summary[tuple(row[k] for k in keys)] = dict(row, items_sold=0)
+    for *key, qty in (OrderItem.objects.filter(order__in=live)
+                      .values_list('order__status', 'order__payment_method', 'order__is_paid')
+                      .annotate(qty=Sum('quantity'))):
+        summary[tuple(key)]['items_sold'] = qty or 0
+
+    for row in summary.values():
+        row['revenue'] = row['revenue'] or Decimal('0')
+    return list(summary.values())
+
+
+def daily_series(start_date, statuses, paid_only=False):
+    """Orders and revenue per local date for orders in the given statuses.
+
+    Returns:
+        dict: {date: {'orders': int, 'revenue': Decimal}}
+    """
+    final, live = _split(statuses)
+    series = defaultdict(lambda: {'orders': 0, 'revenue': Decimal('0')})
+
+    rows = DailyOrderStats.objects.filter(status__in=final)
+    if start_date:
+        rows = rows.filter(date__gte=start_date)
+    if paid_only:
+        rows = rows.filter(is_paid=True)
+    for day, orders, revenue in rows.values_list('date').annotate(total_orders=Sum('orders'), total_revenue=Sum('revenue')):
+        series[day]['orders'] += orders
+        series[day]['revenue'] += revenue or 0
+
+    if live:
+        live_orders = _live_orders(start_date, live)
+        if paid_only:
+            live_orders = live_orders.filter(is_paid=True)
+        for created_at, total in live_orders.values_list('created_at', 'total_amount'):
+            day = series[local_date(created_at)]
+            day['orders'] += 1
+            day['revenue'] += total or 0
+    return dict(series)
+
+
+def item_sales(start_date, statuses, by='item', limit=None):
+    """Quantity, revenue and paid revenue per item (or category) for orders in the given statuses.
+
+    Cancelled orders are never counted. Results are sorted by quantity for
+    items and by revenue for categories.
+
+    Returns:
+        list: dicts with name, qty, revenue, paid_revenue
+    """
+    final, live = _split([s for s in statuses if s != 'cancelled'])
+    totals = defaultdict(lambda: {'qty': 0, 'revenue': Decimal('0'), 'paid_revenue': Decimal('0')})
+
+    def add(rows):
+        for name, qty, revenue, paid_revenue in rows:
+            row = totals[name]
+            row['qty'] += qty or 0
+            row['revenue'] += revenue or 0
+            row['paid_revenue'] += paid_revenue or 0
+
+    rolled = DailyItemSales.objects.filter(status__in=final)
+    if start_date:
+        rolled = rolled.filter(date__gte=start_date)
+    key = 'item_name' if by == 'item' else 'category__name'
+    if by != 'item':
+        rolled = rolled.filter(category__isnull=False)
+    add(rolled.values_list(key).annotate(
+        qty=Sum('quantity'), total=Sum('revenue'), paid=Sum('revenue', filter=Q(is_paid=True))
+    ))
+
+    if live:
+        lines = OrderItem.objects.filter(order__in=_live_orders(start_date, live))
+        key = 'item_name' if by == 'item' else 'menu_item__category__name'
+        if by != 'item':
+            lines = lines.filter(menu_item__isnull=False)
+        add(lines.values_list(key).annotate(
+            qty=Sum('quantity'), revenue=Sum(LINE_TOTAL), paid=Sum(LINE_TOTAL, filter=Q(order__is_paid=True))
+        ))
+
+    result = [dict(row, name=name) for name, row in totals.items()]
+    if by == 'item':
+        result.sort(key=lambda r: (-r['qty'], r['name']))
+    else:
+        result.sort(key=lambda r: (-r['revenue'], r['name'] or ''))
+    return result[:limit] if limit else result
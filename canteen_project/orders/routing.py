@@ -3,4 +3,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/kitchen/$', consumers.KitchenConsumer.as_asgi()),
+    re_path(r'ws/kitchen/(?P<station>[-\w]+)/$', consumers.KitchenConsumer.as_asgi()),
+    re_path(r'ws/admin/$', consumers.AdminLiveConsumer.as_asgi()),
 ]
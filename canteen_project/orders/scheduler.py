@@ -0,0 +1,219 @@
+"""Kitchen queue scheduler — decides the order in which the KDS cooks orders.
+
+Each policy turns a queued order into a sort key. ``KitchenQueue`` keeps the
+queued orders in an in-memory heap per process, updated from the order signals
+on every status transition, and periodically resynced from the database so
+workers that missed a transition converge. ``simulate`` replays an order log
+against a policy to compare waiting times offline.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+# Orders the kitchen still has to start or finish cooking
+QUEUE_STATUSES = ('pending', 'confirmed', 'preparing')
+
+# Delivery orders must leave the kitchen this much earlier than pickups
+DELIVERY_BUFFER_MINUTES = 5
+
+# Default prep time for orders whose items no longer exist
+DEFAULT_PREP_MINUTES = 10
+
+# How often a process reloads its heap from the database
+RESYNC_SECONDS = 60
+
+QueueEntry = namedtuple('QueueEntry', ['order_id', 'created_at', 'due_at', 'prep_minutes', 'is_delivery'])
+
+
+class FifoPolicy:
+    """First in, first out — the original KDS ordering"""
+    name = 'fifo'
+    label = 'First In, First Out'
+
+    def key(self, entry):
+        return (entry.created_at, entry.order_id)
+
+
+class EarliestDueDatePolicy:
+    """Earliest due date — preorders by scheduled time, delivery orders first on ties"""
+    name = 'edd'
+    label = 'Earliest Due Date'
+
+    def key(self, entry):
+        return (entry.due_at, not entry.is_delivery, entry.created_at, entry.order_id)
+
+
+class ShortestPrepFirstPolicy:
+    """Shortest preparation time first — minimises mean wait in a rush"""
+    name = 'spt'
+    label = 'Shortest Prep First'
+
+    def key(self, entry):
+        return (entry.prep_minutes, entry.created_at, entry.order_id)
+
+
+POLICIES = {policy.name: policy for policy in (FifoPolicy(), EarliestDueDatePolicy(), ShortestPrepFirstPolicy())}
+
+
+def get_policy(name=None):
+    """Look up a policy by name, falling back to settings.KITCHEN_QUEUE_POLICY then FIFO"""
+    name = name or getattr(settings, 'KITCHEN_QUEUE_POLICY', 'fifo')
+    return POLICIES.get(name, POLICIES['fifo'])
+
+
+def make_entry(order_id, created_at, scheduled_for, prep_minutes, delivery_type):
+    """Build a QueueEntry, deriving the due time from the preorder slot or prep time"""
+    prep_minutes = prep_minutes or DEFAULT_PREP_MINUTES
+    is_delivery = delivery_type in ('classroom', 'staffroom')
+    due_at = scheduled_for or (created_at + timedelta(minutes=prep_minutes))
+    if is_delivery:
+        due_at -= timedelta(minutes=DELIVERY_BUFFER_MINUTES)
+    return QueueEntry(order_id, created_at, due_at, prep_minutes, is_delivery)
+
+
+def load_entries(orders=None):
+    """Fetch queue entries for an order queryset in one query, prep time = slowest item"""
+    if orders is None:
+        orders = Order.objects.filter(status__in=QUEUE_STATUSES)
+    rows = orders.annotate(prep=Max('items__menu_item__preparation_time')).values_list(
+        'id', 'created_at', 'scheduled_for', 'prep', 'delivery_type'
+    )
+    return [make_entry(*row) for row in rows]
+
+
+class KitchenQueue:
+    """Heap of queued orders for one policy, with lazy deletion on removal"""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self._heap = []
+        self._live = {}
+        self._lock = threading.Lock()
+        self._loaded_at = None
+
+    def _push(self, entry):
+        self._live[entry.order_id] = entry
+        heapq.heappush(self._heap, (self.policy.key(entry), entry.order_id, entry))
+
+    def reload(self):
+        """Rebuild the heap from the database"""
+        entries = load_entries()
+        with self._lock:
+            self._heap = [(self.policy.key(e), e.order_id, e) for e in entries]
+            heapq.heapify(self._heap)
+            self._live = {e.order_id: e for e in entries}
+            self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > RESYNC_SECONDS:
+            self.reload()
+
+    def add(self, entry):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._push(entry)
+
+    def remove(self, order_id):
+        with self._lock:
+            self._live.pop(order_id, None)
+
+    def _compact(self):
+        """Drop stale heap entries once they outnumber the live ones"""
+        if len(self._heap) > 2 * len(self._live) + 32:
+            self._heap = [item for item in self._heap if self._live.get(item[1]) is item[2]]
+            heapq.heapify(self._heap)
+
+    def peek(self):
+        """Return the order id to cook next, or None"""
+        self._ensure_fresh()
+        with self._lock:
+            while self._heap and self._live.get(self._heap[0][1]) is not self._heap[0][2]:
+                heapq.heappop(self._heap)
+            return self._heap[0][1] if self._heap else None
+
+    def sequence(self):
+        """Return queued order ids in cooking order"""
+        self._ensure_fresh()
+        with self._lock:
+            self._compact()
+            return [order_id for _, order_id, entry in sorted(self._heap) if self._live.get(order_id) is entry]
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(policy_name=None):
+    """Return this process's queue for a policy, creating it on first use"""
+    policy = get_policy(policy_name)
+    with _queues_lock:
+        if policy.name not in _queues:
+            _queues[policy.name] = KitchenQueue(policy)
+        return _queues[policy.name]
+
+
+def on_order_change(order_id, status, old_status):
+    """Keep every loaded queue in step with an order's committed status transition"""
+    if not _queues:
+        return
+    if status in QUEUE_STATUSES and old_status not in QUEUE_STATUSES:
+        entries = load_entries(Order.objects.filter(id=order_id))
+        for queue in list(_queues.values()):
+            for entry in entries:
+                queue.add(entry)
+    elif status not in QUEUE_STATUSES:
+        for queue in list(_queues.values()):
+            queue.remove(order_id)
+
+
+def simulate(entries, policy, cooks=1):
+    """Replay an order log through a non-preemptive kitchen with N cooks.
+
+    Preorders are released prep_minutes before their due time; everything else
+    is released on arrival. Returns mean/max wait (release → start) and mean
+    lateness (finish → due, late orders only) in minutes.
+    """
+    def release(entry):
+        if entry.due_at > entry.created_at + timedelta(minutes=entry.prep_minutes):
+            return entry.due_at - timedelta(minutes=entry.prep_minutes)
+        return entry.created_at
+
+    arrivals = sorted(entries, key=lambda e: (release(e), e.order_id))
+    if not arrivals:
+        return {'policy': policy.name, 'orders': 0, 'mean_wait': 0.0, 'max_wait': 0.0, 'mean_lateness': 0.0}
+
+    cook_free = [release(arrivals[0])] * cooks
+    heapq.heapify(cook_free)
+    ready = []
+    waits, lateness = [], []
+    i = 0
+    while i < len(arrivals) or ready:
+        free_at = heapq.heappop(cook_free)
+        if not ready and release(arrivals[i]) > free_at:
+            free_at = release(arrivals[i])
+        while i < len(arrivals) and release(arrivals[i]) <= free_at:
+            entry = arrivals[i]
+            heapq.heappush(ready, (policy.key(entry), entry.order_id, entry))
+            i += 1
+        _, _, entry = heapq.heappop(ready)
+        finish = free_at + timedelta(minutes=entry.prep_minutes)
+        waits.append((free_at - release(entry)).total_seconds() / 60)
+        lateness.append(max((finish - entry.due_at).total_seconds() / 60, 0))
+        heapq.heappush(cook_free, finish)
+
+    late = [l for l in lateness if l > 0]
+    return {
+        'policy': policy.name,
+        'orders': len(waits),
+        'mean_wait': round(sum(waits) / len(waits), 2),
+        'max_wait': round(max(waits), 2),
+        'mean_lateness': round(sum(late) / len(late), 2) if late else 0.0,
+    }
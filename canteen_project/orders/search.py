@@ -0,0 +1,79 @@
+"""Indexed order lookup by token, username or email.
+
+Orders carry lower-cased copies of what staff search for — the token without
+its ``TKN-`` prefix, and the customer's username and email — in indexed
+columns on the order row itself, so a search needs no join. Matches are
+anywhere in the value, as before the columns existed. On PostgreSQL, queries
+of three or more characters are served by pg_trgm GIN indexes (see migration
+0012); shorter ones, and other databases, use a plain ``icontains`` over the
+narrow search columns.
+"""
+import logging
+from django.db import connection
+from django.db.models import OuterRef, Q, Subquery, Value
+from django.db.models.functions import Lower, Replace
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PREFIX = 'tkn-'
+TRIGRAM_MIN_LENGTH = 3   # pg_trgm can't narrow shorter patterns down
+
+
+def normalize_token(value):
+    """'TKN-ABC123', '#tkn-abc123' and 'abc123' all become 'abc123'"""
+    value = (value or '').strip().lower().lstrip('#')
+    return value[len(TOKEN_PREFIX):] if value.startswith(TOKEN_PREFIX) else value
+
+
+def user_values(user):
+    """The username and email search columns for a user's orders"""
+    return {'search_username': user.username.lower(), 'search_email': (user.email or '').lower()}
+
+
+def trigram_indexed():
+    """Whether match-anywhere lookups are indexed on this database"""
+    return connection.vendor == 'postgresql'
+
+
+def filter_orders(queryset, query):
+    """Narrow an Order queryset to those whose token, username or email match `query`"""
+    text = query.strip().lower()
+    token = normalize_token(text)
+    if not text:
+        return queryset
+    # Columns are already lower-case, so the indexed path needs no LOWER()/UPPER()
+    lookup = 'contains' if trigram_indexed() and len(text) >= TRIGRAM_MIN_LENGTH else 'icontains'
+    condition = Q(**{f'search_username__{lookup}': text}) | Q(**{f'search_email__{lookup}': text})
+    if token:
+        condition |= Q(**{f'search_token__{lookup}': token})
+    return queryset.filter(condition)
+
+
+def refresh_user(user):
+    """Copy a user's current username and email onto their orders.
+
+    Returns:
+        int: orders updated
+    """
+    from .models import Order
+    values = user_values(user)
+    return (Order.objects.filter(user_id=user.pk)
+            .exclude(search_username=values['search_username'], search_email=values['search_email'])
+            .update(**values))
+
+
+def backfill(orders=None):
+    """Recompute the search columns in the database, e.g. after bulk_create().
+
+    Returns:
+        int: orders updated
+    """
+    from django.contrib.auth.models import User
+    from .models import Order
+    orders = Order.objects.all() if orders is None else orders
+    user = User.objects.filter(pk=OuterRef('user_id'))
+    return orders.update(
+        search_token=Lower(Replace('token_number', Value('TKN-'), Value(''))),
+        search_username=Lower(Subquery(user.values('username')[:1])),
+        search_email=Lower(Subquery(user.values('email')[:1])),
+    )
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_init
 from django.dispatch import receiver
-from .models import Order
+from django.contrib.auth.models import User
+from .models import Order, OrderItem
+from accounts import live, user_stats
+from . import prep_board, rollups, scheduler, search, stations
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 import logging
@@ -15,9 +19,15 @@ def order_updated_signal(sender, instance, created, **kwargs):
     # Don't notify kitchen for payment_pending orders (not yet paid)
     if instance.status == 'payment_pending':
         return
-    
+    # Only once the change is committed: a rolled-back payment must not reach the kitchen
+    transaction.on_commit(lambda: _notify_kitchen(instance, created))
+
+
+def _notify_kitchen(instance, created):
     channel_layer = get_channel_layer()
-    
+    if channel_layer is None:
+        return
+
     # Prepare data for WebSocket
     data = {
         'id': instance.id,
@@ -40,3 +50,71 @@ def order_updated_signal(sender, instance, created, **kwargs):
             'data': data
         }
     )
+
+    # Each station screen only gets its own slice of the order
+    for station, items in stations.items_by_station(instance).items():
+        async_to_sync(channel_layer.group_send)(
+            stations.station_group_name(station.slug),
+            {
+                'type': 'order_update',
+                'message': 'New Order' if data['new_order'] else 'Order Updated',
+                'data': dict(data, items=items, station=station.slug),
+            }
+        )
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    """Keep the status the order was loaded with so post_save can see transitions"""
+    instance._previous_status = instance.__dict__.get('status')
+    instance._previous_paid = instance.__dict__.get('is_paid')
+
+
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, created, **kwargs):
+    """Apply incremental updates that depend on the old → new status transition"""
+    old_status = None if created else getattr(instance, '_previous_status', None)
+    if not created and old_status is None:
+        return  # status was deferred on load; nothing reliable to diff against
+
+    if old_status != instance.status:
+        prep_board.apply_order_change(instance, old_status)
+        status = instance.status  # the in-memory queues change only once the transition commits
+        transaction.on_commit(lambda: scheduler.on_order_change(instance.id, status, old_status))
+        if instance.status in scheduler.QUEUE_STATUSES and old_status not in scheduler.QUEUE_STATUSES:
+            stations.route_order(instance)
+
+    old_paid = getattr(instance, '_previous_paid', None)
+    if old_paid is None:
+        old_paid = instance.is_paid  # is_paid was deferred on load; assume unchanged
+    if (old_status, old_paid) != (instance.status, instance.is_paid):
+        rollups.on_order_change(instance, old_status, old_paid)
+        user_stats.on_order_change(instance, old_status, old_paid)
+        live.on_order_change(instance, old_status, old_paid)
+    instance._previous_status = instance.status
+    instance._previous_paid = instance.is_paid
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_added(sender, instance, created, **kwargs):
+    """Lines added to an order that is already in the kitchen go straight onto the prep board"""
+    if created:
+        prep_board.apply_item_change(instance, 1)
+        rollups.apply_item_change(instance, 1, instance.order)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_removed(sender, instance, **kwargs):
+    """Take deleted lines of an active order off the prep board (or a finished one out of the rollups)"""
+    order = Order.objects.filter(pk=instance.order_id).first()
+    if order:
+        prep_board.apply_item_change(instance, -1, order.status, order.scheduled_for)
+        rollups.apply_item_change(instance, -1, order)
+
+
+@receiver(post_save, sender=User)
+def user_search_fields_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the username / email copies on the user's orders in step with the account"""
+    if created or (update_fields is not None and not {'username', 'email'} & set(update_fields)):
+        return  # new users have no orders; last_login saves don't touch searched fields
+    search.refresh_user(instance)
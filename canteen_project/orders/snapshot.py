@@ -0,0 +1,221 @@
+"""Columnar analytics snapshots — orders, items, payments and wallet history as NumPy files.
+
+Each table is written as an uncompressed ``.npz`` with one typed array per
+column: ids and counts as integers, money as int64 paise, timestamps as UTC
+``datetime64[us]`` and low-cardinality strings (statuses, methods, item
+names) dictionary-encoded as int32 codes plus a ``<column>__values`` array.
+Rows are streamed from the database in chunks straight into on-disk arrays,
+so memory stays flat, and ``load_table`` memory-maps the columns back.
+
+Incremental snapshots only hold rows added since the previous snapshot in
+the same directory — plus, for orders and payments, rows updated since then,
+so readers should keep the latest copy of each id.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import namedtuple
+from itertools import islice
+import numpy as np
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+MANIFEST = 'manifest.json'
+
+# kind: int, fk (nullable, -1 for NULL), money (int64 paise), bool, datetime, category (dictionary-encoded)
+Column = namedtuple('Column', ['name', 'field', 'kind'])
+Table = namedtuple('Table', ['name', 'model', 'columns', 'updated_field'])
+
+KIND_DTYPES = {
+    'int': np.int64,
+    'fk': np.int64,
+    'money': np.int64,
+    'bool': np.bool_,
+    'datetime': 'datetime64[us]',
+    'category': np.int32,
+    'small': np.int32,
+}
+
+
+def tables():
+    """The exported tables and their columns"""
+    from payments.models import Payment, WalletTransaction
+    from .models import Order, OrderItem
+    return [
+        Table('orders', Order, [
+            Column('id', 'id', 'int'),
+            Column('user_id', 'user_id', 'int'),
+            Column('created_at', 'created_at', 'datetime'),
+            Column('scheduled_for', 'scheduled_for', 'datetime'),
+            Column('status', 'status', 'category'),
+            Column('payment_method', 'payment_method', 'category'),
+            Column('delivery_type', 'delivery_type', 'category'),
+            Column('is_paid', 'is_paid', 'bool'),
+            Column('total_paise', 'total_amount', 'money'),
+            Column('delivery_fee_paise', 'delivery_fee', 'money'),
+        ], 'updated_at'),
+        Table('order_items', OrderItem, [
+            Column('id', 'id', 'int'),
+            Column('order_id', 'order_id', 'int'),
+            Column('menu_item_id', 'menu_item_id', 'fk'),
+            Column('item_name', 'item_name', 'category'),
+            Column('price_paise', 'price', 'money'),
+            Column('quantity', 'quantity', 'small'),
+        ], None),
+        Table('payments', Payment, [
+            Column('id', 'id', 'int'),
+            Column('order_id', 'order_id', 'int'),
+            Column('created_at', 'created_at', 'datetime'),
+            Column('method', 'method', 'category'),
+            Column('status', 'status', 'category'),
+            Column('is_refunded', 'is_refunded', 'bool'),
+            Column('amount_paise', 'amount', 'money'),
+        ], 'updated_at'),
+        Table('wallet_transactions', WalletTransaction, [
+            Column('id', 'id', 'int'),
+            Column('user_id', 'user_id', 'int'),
+            Column('created_at', 'created_at', 'datetime'),
+            Column('transaction_type', 'transaction_type', 'category'),
+            Column('amount_paise', 'amount', 'money'),
+        ], None),
+    ]
+
+
+def _convert(kind, values, dictionary=None):
+    if kind == 'money':
+        return np.array([round(v * 100) for v in values], dtype=np.int64)
+    if kind == 'fk':
+        return np.array([-1 if v is None else v for v in values], dtype=np.int64)
+    if kind == 'datetime':
+        return np.array([v.replace(tzinfo=None) if v else None for v in values], dtype='datetime64[us]')
+    if kind == 'category':
+        return np.array([dictionary.setdefault(v, len(dictionary)) for v in values], dtype=np.int32)
+    return np.array(values, dtype=KIND_DTYPES[kind])
+
+
+def latest_manifest(output_dir):
+    """The manifest of the newest snapshot in output_dir, or None"""
+    if not os.path.isdir(output_dir):
+        return None
+    names = sorted(n for n in os.listdir(output_dir)
+                   if os.path.isfile(os.path.join(output_dir, n, MANIFEST)))
+    if not names:
+        return None
+    with open(os.path.join(output_dir, names[-1], MANIFEST)) as f:
+        manifest = json.load(f)
+    manifest['name'] = names[-1]
+    return manifest
+
+
+def write_table(table, queryset, path, chunk_size=CHUNK_SIZE):
+    """Stream one table into an uncompressed .npz of typed columns.
+
+    Returns:
+        int: rows written
+    """
+    total = queryset.count()
+    fields = [c.field for c in table.columns]
+    dictionaries = {c.name: {} for c in table.columns if c.kind == 'category'}
+    workdir = tempfile.mkdtemp(dir=os.path.dirname(path))
+    try:
+        arrays = {
+            c.name: np.lib.format.open_memmap(os.path.join(workdir, f'{c.name}.npy'), mode='w+',
+                                              dtype=KIND_DTYPES[c.kind], shape=(total,))
+            for c in table.columns
+        }
+        rows = queryset.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size)
+        written = 0
+        while written < total:
+            batch = list(islice(rows, min(chunk_size, total - written)))
+            if not batch:
+                break
+            for column, values in zip(table.columns, zip(*batch)):
+                arrays[column.name][written:written + len(batch)] = _convert(
+                    column.kind, values, dictionaries.get(column.name))
+            written += len(batch)
+        for array in arrays.values():
+            array.flush()
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for name, array in arrays.items():
+                if written < total:  # rows deleted while exporting
+                    np.save(os.path.join(workdir, f'{name}.npy'), np.array(array[:written]))
+                archive.write(os.path.join(workdir, f'{name}.npy'), f'{name}.npy')
+            for name, dictionary in dictionaries.items():
+                values = np.array(list(dictionary), dtype=str) if dictionary else np.array([], dtype='U1')
+                with archive.open(f'{name}__values.npy', 'w', force_zip64=True) as member:
+                    np.lib.format.write_array(member, values, allow_pickle=False)
+        del arrays
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return written
+
+
+def load_table(path):
+    """Memory-map every column of a snapshot .npz written by write_table.
+
+    Returns:
+        dict: {column name: read-only np.memmap}
+    """
+    columns = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            columns[info.filename[:-4]] = np.memmap(
+                path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                order='F' if fortran_order else 'C',
+            )
+    return columns
+
+
+def decode(columns, name):
+    """Turn a dictionary-encoded column back into strings"""
+    return columns[f'{name}__values'][columns[name]]
+
+
+def export(output_dir, incremental=False, chunk_size=CHUNK_SIZE):
+    """Write a snapshot of every table into a new timestamped directory.
+
+    Returns:
+        dict: the snapshot manifest (name, mode, base, as_of and per-table rows / max_id)
+    """
+    as_of = timezone.now()
+    base = latest_manifest(output_dir) if incremental else None
+    if incremental and base is None:
+        logger.info("No previous analytics snapshot, writing a full one")
+    name = f"snapshot-{as_of.strftime('%Y%m%dT%H%M%S%f')}"
+    target = os.path.join(output_dir, name)
+    os.makedirs(target)
+
+    manifest = {'name': name, 'mode': 'incremental' if base else 'full', 'base': base and base['name'],
+                'as_of': as_of.isoformat(), 'tables': {}}
+    for table in tables():
+        queryset = table.model.objects.all()
+        max_id = queryset.aggregate(m=Max('id'))['m'] or 0
+        queryset = queryset.filter(id__lte=max_id)
+        if base:
+            previous = base['tables'].get(table.name, {'max_id': 0})
+            since = Q(id__gt=previous['max_id'])
+            if table.updated_field:
+                since |= Q(**{f'{table.updated_field}__gt': parse_datetime(base['as_of'])})
+            queryset = queryset.filter(since)
+        rows = write_table(table, queryset, os.path.join(target, f'{table.name}.npz'), chunk_size)
+        manifest['tables'][table.name] = {'file': f'{table.name}.npz', 'rows': rows, 'max_id': max_id}
+        logger.info(f"Analytics snapshot {name}: {table.name} {rows} rows")
+
+    with open(os.path.join(target, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,94 @@
+"""Kitchen station routing — fan order items out to the prep stations that cook them.
+
+Each Station serves a set of menu categories. When an order reaches the kitchen
+it gets one ticket per station that has items to cook; station screens listen on
+their own WebSocket group and only receive their slice. The order moves to
+``ready`` once every station has marked its ticket done.
+"""
+import logging
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Order, OrderStationTicket, Station
+from .transitions import MAX_ATTEMPTS, TransitionConflict, transition
+
+logger = logging.getLogger(__name__)
+
+
+def station_group_name(slug):
+    """WebSocket group for a single station's screens"""
+    return f'kitchen_station_{slug}'
+
+
+def items_by_station(order):
+    """Split an order's lines across active stations.
+
+    Returns:
+        dict: {Station: [{'name': ..., 'qty': ...}, ...]} — empty when no stations are configured
+    """
+    stations = list(Station.objects.filter(is_active=True).prefetch_related('categories'))
+    if not stations:
+        return {}
+
+    by_category = {}
+    default = None
+    for station in stations:
+        if station.is_default and default is None:
+            default = station
+        for category in station.categories.all():
+            by_category.setdefault(category.id, station)
+
+    routed = defaultdict(list)
+    for name, qty, category_id in order.items.values_list('item_name', 'quantity', 'menu_item__category_id'):
+        station = by_category.get(category_id, default)
+        if station:
+            routed[station].append({'name': name, 'qty': qty})
+    return dict(routed)
+
+
+def station_item_filter(station):
+    """Q filter selecting the order lines a station cooks (for prefetching its slice)"""
+    lines = Q(menu_item__category__in=station.categories.all())
+    if station.is_default:
+        lines |= ~Q(menu_item__category__stations__is_active=True)
+    return lines
+
+
+def route_order(order):
+    """Create one open ticket per station that has items in this order"""
+    stations = list(items_by_station(order))
+    OrderStationTicket.objects.bulk_create(
+        [OrderStationTicket(order=order, station=station) for station in stations],
+        ignore_conflicts=True,
+    )
+    return stations
+
+
+def complete_station(order, station):
+    """Mark a station's ticket done and move the order to ready when it was the last one.
+
+    Returns:
+        tuple: (updated: bool, order_ready: bool)
+    """
+    with transaction.atomic():
+        updated = OrderStationTicket.objects.filter(
+            order=order, station=station, is_done=False
+        ).update(is_done=True, done_at=timezone.now())
+        if not updated:
+            return False, False
+
+        if OrderStationTicket.objects.filter(order=order, is_done=False).exists():
+            return True, False
+        for attempt in range(MAX_ATTEMPTS):
+            order = Order.objects.get(pk=order.pk)
+            if order.status not in ('confirmed', 'preparing'):
+                return True, False
+            try:
+                transition(order, 'ready', validate=False)  # a confirmed order may skip preparing
+                break
+            except TransitionConflict:  # another screen moved it; look again
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+    logger.info(f"Order {order.token_number} ready: all stations done (last: {station.slug})")
+    return True, True
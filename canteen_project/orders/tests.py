@@ -233,3 +233,875 @@ class OrderModelTestCase(TestCase):
             quantity=3
         )
         self.assertEqual(item.get_subtotal(), Decimal('150.00'))
+
+
+class PrepBoardTestCase(TestCase):
+    """Tests for the incrementally maintained kitchen prep board"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='prepuser', password='testpass123')
+        self.kitchen = User.objects.create_user(username='cook', password='testpass123')
+        self.kitchen.profile.role = 'kitchen'
+        self.kitchen.profile.save()
+        self.category = Category.objects.create(name='Breakfast')
+        self.dosa = MenuItem.objects.create(category=self.category, name='Dosa', price=Decimal('40.00'))
+        self.tea = MenuItem.objects.create(category=self.category, name='Tea', price=Decimal('10.00'))
+
+    def _order(self, lines, status='payment_pending', **kwargs):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('100.00'), status=status, **kwargs)
+        for item, qty in lines:
+            OrderItem.objects.create(order=order, menu_item=item, item_name=item.name, price=item.price, quantity=qty)
+        return order
+
+    def _quantities(self, **kwargs):
+        from orders.prep_board import get_board
+        return {i['name']: i['qty'] for i in get_board(**kwargs)['items']}
+
+    def test_paid_orders_are_aggregated(self):
+        """Orders entering the queue add their items to the board"""
+        first = self._order([(self.dosa, 10), (self.tea, 2)])
+        second = self._order([(self.dosa, 8)])
+        self.assertEqual(self._quantities(), {})  # payment pending, not cooking yet
+
+        for order in (first, second):
+            order.transition_to('confirmed')
+            order.save()
+        self.assertEqual(self._quantities(), {'Dosa': 18, 'Tea': 2})
+
+    def test_orders_leave_board_when_ready_or_cancelled(self):
+        """Ready and cancelled orders are subtracted from the board"""
+        first = self._order([(self.dosa, 3)], status='pending')
+        second = self._order([(self.dosa, 2), (self.tea, 1)], status='pending')
+
+        first.status = 'preparing'
+        first.save()
+        self.assertEqual(self._quantities(), {'Dosa': 5, 'Tea': 1})
+
+        first.status = 'ready'
+        first.save()
+        second.status = 'cancelled'
+        second.save()
+        self.assertEqual(self._quantities(), {})
+
+    def test_preorders_grouped_by_slot(self):
+        """Future preorders are listed under their slot, not the cook-now list"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from orders.prep_board import get_board
+
+        self._order([(self.tea, 4)], status='pending', scheduled_for=timezone.now() + timedelta(hours=3))
+        self._order([(self.tea, 1)], status='pending')
+
+        board = get_board(include_slots=True)
+        self.assertEqual(board['items'], [{'menu_item_id': self.tea.id, 'name': 'Tea', 'qty': 1}])
+        self.assertEqual(len(board['slots']), 1)
+        self.assertEqual(board['slots'][0]['items'][0]['qty'], 4)
+
+    def test_rebuild_matches_incremental(self):
+        """rebuild() recomputes the same totals from scratch"""
+        from orders.prep_board import rebuild
+
+        self._order([(self.dosa, 6)], status='pending')
+        before = self._quantities()
+        rebuild()
+        self.assertEqual(self._quantities(), before)
+
+    def test_concurrent_first_bump_adds_to_existing_row(self):
+        """A row created by a racing request is updated rather than duplicated"""
+        from unittest import mock
+        from django.db.models.query import QuerySet
+        from orders.models import PrepBoardEntry
+        from orders.prep_board import _bump
+
+        PrepBoardEntry.objects.create(menu_item=self.dosa, item_name='Dosa', quantity=2)
+        real_update = QuerySet.update
+        calls = []
+
+        def stale_update(qs, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else real_update(qs, **kwargs)  # first update misses the row
+
+        with mock.patch.object(QuerySet, 'update', stale_update):
+            _bump(self.dosa.id, 'Dosa', None, 3)
+        self.assertEqual(list(PrepBoardEntry.objects.values_list('quantity', flat=True)), [5])
+
+    def test_one_row_per_key_without_menu_item(self):
+        """Rows for deleted menu items (no FK) still can't be duplicated"""
+        from django.db import IntegrityError, transaction
+        from orders.models import PrepBoardEntry
+
+        PrepBoardEntry.objects.create(menu_item=None, item_name='Dosa', quantity=2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PrepBoardEntry.objects.create(menu_item=None, item_name='Dosa', quantity=1)
+
+    def test_prep_board_api(self):
+        """Prep board API is restricted to kitchen/admin staff"""
+        self._order([(self.dosa, 2)], status='confirmed')
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('kitchen_prep_board')).status_code, 403)
+
+        self.client.force_login(self.kitchen)
+        response = self.client.get(reverse('kitchen_prep_board'), {'slots': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_qty'], 2)
+        self.assertIn('slots', response.json())
+
+
+class KitchenSchedulerTestCase(TestCase):
+    """Tests for the kitchen queue scheduler policies and simulation"""
+
+    def setUp(self):
+        from orders import scheduler
+        scheduler._queues.clear()
+        self.user = User.objects.create_user(username='queueuser', password='testpass123')
+        self.category = Category.objects.create(name='Mains')
+        self.slow = MenuItem.objects.create(category=self.category, name='Biryani', price=Decimal('120.00'),
+                                            preparation_time=25)
+        self.fast = MenuItem.objects.create(category=self.category, name='Juice', price=Decimal('30.00'),
+                                            preparation_time=3)
+
+    def _order(self, item, status='pending', **kwargs):
+        order = Order.objects.create(user=self.user, total_amount=item.price, status=status, **kwargs)
+        OrderItem.objects.create(order=order, menu_item=item, item_name=item.name, price=item.price, quantity=1)
+        return order
+
+    def test_policies_order_queue(self):
+        """FIFO keeps arrival order, SPT puts quick orders first, EDD follows scheduled time"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from orders.scheduler import get_queue
+
+        slow = self._order(self.slow)
+        fast = self._order(self.fast)
+        preorder = self._order(self.fast, scheduled_for=timezone.now() + timedelta(hours=2))
+
+        self.assertEqual(get_queue('fifo').sequence(), [slow.id, fast.id, preorder.id])
+        self.assertEqual(get_queue('spt').sequence()[0], fast.id)
+        self.assertEqual(get_queue('edd').sequence()[-1], preorder.id)
+
+    def test_queue_follows_transitions(self):
+        """Orders leave and join the loaded heap as their status changes"""
+        from orders.scheduler import get_queue
+
+        first = self._order(self.slow)
+        queue = get_queue('fifo')
+        self.assertEqual(queue.sequence(), [first.id])
+
+        second = self._order(self.fast, status='payment_pending')
+        second.transition_to('confirmed')
+        with self.captureOnCommitCallbacks() as callbacks:
+            second.save()
+        self.assertEqual(queue.sequence(), [first.id])  # not before the transition commits
+        for callback in callbacks:
+            callback()
+        self.assertEqual(queue.sequence(), [first.id, second.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'ready'
+            first.save()
+        self.assertEqual(queue.peek(), second.id)
+
+    def test_simulation_spt_beats_fifo_in_rush(self):
+        """Replaying a rush shows shortest-prep-first lowers mean wait"""
+        from django.utils import timezone
+        from orders.scheduler import POLICIES, make_entry, simulate
+
+        start = timezone.now()
+        entries = [make_entry(1, start, None, 30, 'pickup')] + [
+            make_entry(i, start, None, 2, 'pickup') for i in range(2, 8)
+        ]
+        fifo = simulate(entries, POLICIES['fifo'])
+        spt = simulate(entries, POLICIES['spt'])
+        self.assertEqual(fifo['orders'], 7)
+        self.assertLess(spt['mean_wait'], fifo['mean_wait'])
+
+
+class StationRoutingTestCase(TestCase):
+    """Tests for splitting orders across kitchen prep stations"""
+
+    def setUp(self):
+        from orders.models import Station
+        self.user = User.objects.create_user(username='stationuser', password='testpass123')
+        self.kitchen = User.objects.create_user(username='barista', password='testpass123')
+        self.kitchen.profile.role = 'kitchen'
+        self.kitchen.profile.save()
+        drinks = Category.objects.create(name='Beverages')
+        meals = Category.objects.create(name='Meals')
+        self.coffee = MenuItem.objects.create(category=drinks, name='Filter Coffee', price=Decimal('20.00'))
+        self.meal = MenuItem.objects.create(category=meals, name='Veg Thali', price=Decimal('80.00'))
+        self.bar = Station.objects.create(name='Beverage Counter', slug='beverages')
+        self.bar.categories.add(drinks)
+        self.hot = Station.objects.create(name='Hot Kitchen', slug='hot', is_default=True)
+
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal('100.00'))
+        for item in (self.coffee, self.meal):
+            OrderItem.objects.create(order=self.order, menu_item=item, item_name=item.name, price=item.price)
+        self.order.transition_to('confirmed')
+        self.order.save()
+
+    def test_order_fanned_out_to_stations(self):
+        """Entering the kitchen creates one ticket per station with items"""
+        from orders.stations import items_by_station
+
+        self.assertEqual(
+            set(self.order.station_tickets.values_list('station__slug', flat=True)), {'beverages', 'hot'}
+        )
+        routed = items_by_station(self.order)
+        self.assertEqual(routed[self.bar], [{'name': 'Filter Coffee', 'qty': 1}])
+        self.assertEqual(routed[self.hot], [{'name': 'Veg Thali', 'qty': 1}])
+
+    def test_order_ready_when_all_stations_done(self):
+        """The order only becomes ready after the last station finishes"""
+        from orders.stations import complete_station
+
+        self.order.status = 'preparing'
+        self.order.save()
+
+        self.assertEqual(complete_station(self.order, self.bar), (True, False))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'preparing')
+
+        self.assertEqual(complete_station(self.order, self.hot), (True, True))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'ready')
+
+    def test_station_screen_shows_only_its_slice(self):
+        """A station's KDS lists only its own items and completes only its ticket"""
+        self.client.force_login(self.kitchen)
+        response = self.client.get(reverse('kitchen_dashboard'), {'station': 'beverages', 'partial': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Filter Coffee', response.json()['html'])
+        self.assertNotIn('Veg Thali', response.json()['html'])
+
+        self.client.post(reverse('kitchen_dashboard'), {
+            'order_id': self.order.id, 'status': 'ready', 'station': 'beverages',
+        })
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'confirmed')
+        self.assertTrue(self.order.station_tickets.get(station=self.bar).is_done)
+
+
+class DeliveryBatchingTestCase(TestCase):
+    """Tests for grouping delivery orders into runner trips"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='deliveryuser', password='testpass123')
+        self.runner = User.objects.create_user(username='runner', password='testpass123')
+        self.runner.profile.role = 'kitchen'
+        self.runner.profile.save()
+
+    def _ready(self, location, delivery_type='classroom'):
+        return Order.objects.create(
+            user=self.user, total_amount=Decimal('50.00'), status='ready',
+            delivery_type=delivery_type, delivery_location=location,
+        )
+
+    def test_delivery_block(self):
+        """Rooms are grouped by block prefix, floor, or staffroom"""
+        from orders.delivery import delivery_block
+        self.assertEqual(delivery_block('classroom', 'b-204'), 'B')
+        self.assertEqual(delivery_block('classroom', '312'), 'Floor 3')
+        self.assertEqual(delivery_block('classroom', 'Room 105'), 'Floor 1')
+        self.assertEqual(delivery_block('staffroom', 'SR-2'), 'Staffroom')
+
+    def test_plan_groups_by_block_and_capacity(self):
+        """Orders are batched per block with at most MAX_RUN_ORDERS per run"""
+        from orders.delivery import MAX_RUN_ORDERS, plan_runs
+        for n in range(MAX_RUN_ORDERS + 2):
+            self._ready(f'A-{100 + n}')
+        self._ready('B-201')
+        Order.objects.create(user=self.user, total_amount=Decimal('50.00'), status='ready')  # pickup
+
+        runs = plan_runs()
+        sizes = sorted((run.block, run.orders.count()) for run in runs)
+        self.assertEqual(sizes, [('A', 2), ('A', MAX_RUN_ORDERS), ('B', 1)])
+        self.assertEqual(plan_runs(), [])  # nothing left to batch
+
+    def test_dispatch_and_complete_run_api(self):
+        """A run is assigned, dispatched and delivered with set-based updates"""
+        orders = [self._ready('C-10'), self._ready('C-11')]
+        self.client.force_login(self.runner)
+        url = reverse('kitchen_delivery_runs')
+
+        run_id = self.client.post(url, {'action': 'plan'}).json()['runs'][0]['id']
+        response = self.client.post(url, {'action': 'assign', 'run_id': run_id})
+        self.assertEqual(response.json()['run']['runner'], 'runner')
+
+        response = self.client.post(url, {'action': 'dispatch', 'run_id': run_id})
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(
+            set(Order.objects.filter(id__in=[o.id for o in orders]).values_list('status', flat=True)),
+            {'out_for_delivery'},
+        )
+
+        response = self.client.post(url, {'action': 'complete', 'run_id': run_id})
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertTrue(all(o.is_paid for o in Order.objects.filter(delivery_run_id=run_id)))
+        self.assertEqual(self.client.get(url).json()['runs'], [])
+
+    def test_run_moves_apply_per_order_deltas(self):
+        """Dispatching and completing a run keep rollups and user stats exact without a rebuild"""
+        from accounts import user_stats
+        from accounts.models import UserStats
+        from orders import delivery, rollups
+        from orders.models import DailyOrderStats
+        self._ready('D-1')
+        self._ready('D-2')
+        run = delivery.plan_runs()[0]
+        self.assertEqual(delivery.dispatch_run(run), 2)
+        self.assertEqual(delivery.complete_run(run), 2)
+
+        stats = DailyOrderStats.objects.get()
+        self.assertEqual((stats.status, stats.is_paid, stats.orders, stats.revenue),
+                         ('delivered', True, 2, Decimal('100.00')))
+        self.assertEqual(UserStats.objects.get(user=self.user).total_spent, Decimal('100.00'))
+        self.assertEqual(user_stats.reconcile([self.user.id]), 0)
+        rollups.rebuild()
+        self.assertEqual(DailyOrderStats.objects.get().orders, 2)
+
+
+class LoadTestHarnessTestCase(TestCase):
+    """Tests for the lunch-rush load test building blocks"""
+
+    def test_percentile_nearest_rank(self):
+        """Percentiles pick the nearest-rank sample"""
+        from orders.loadtest import percentile
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_student_flow_records_every_step(self):
+        """A simulated student orders and pays, and each endpoint is timed and query-counted"""
+        import random
+        from orders import loadtest
+        users, kitchen, item_ids = loadtest.seed(students=1, items=5)
+        self.assertEqual(kitchen.profile.role, 'kitchen')
+        from payments.models import WalletTransaction
+        self.assertTrue(WalletTransaction.objects.filter(user=users[0], amount=loadtest.STARTING_BALANCE).exists())
+
+        recorder = loadtest.Recorder()
+        loadtest.run_student(recorder, users[0], item_ids, random.Random(1))
+        report = recorder.report(elapsed=1.0)
+
+        for name in ('menu_view', 'search_api', 'add_to_cart', 'checkout', 'place_order', 'process_wallet_payment'):
+            self.assertIn(name, report)
+            self.assertEqual(report[name]['errors'], 0, name)
+            self.assertGreater(report[name]['avg_queries'], 0)
+        self.assertTrue(Order.objects.filter(user=users[0], is_paid=True, status='confirmed').exists())
+
+
+    def test_refuses_without_debug_or_opt_in(self):
+        """The command won't seed a database that may be production's"""
+        from django.core.management import CommandError, call_command
+        with self.assertRaises(CommandError):
+            call_command('load_test', students=1)
+        self.assertFalse(User.objects.filter(username__startswith='loadtest_').exists())
+
+
+class LoadDataGeneratorTestCase(TestCase):
+    """Tests for the benchmark data generator"""
+
+    def test_generate_counts_and_history(self):
+        """Rows are created with profiles, rush-hour timestamps and consistent payments"""
+        from accounts.models import UserProfile
+        from django.utils import timezone
+        from orders import datagen
+        counts = datagen.generate(users=20, items=15, orders=200, reviews=30, favorites=20, days=14, chunk_size=50)
+
+        self.assertEqual(counts['orders'], 200)
+        self.assertEqual(Order.objects.filter(token_number__startswith='GEN-').count(), 200)
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith='gen_').count(), 20)
+        self.assertEqual(OrderItem.objects.filter(order__token_number__startswith='GEN-').count(), counts['order_items'])
+        self.assertTrue(all(
+            timezone.localtime(created).hour in datagen.HOUR_WEIGHTS
+            for created in Order.objects.values_list('created_at', flat=True)
+        ))
+        from payments.models import Payment
+        self.assertEqual(Payment.objects.count(), Order.objects.filter(is_paid=True).count())
+
+    def test_same_seed_same_data(self):
+        """Two runs with the same seed produce identical order histories"""
+        from django.utils import timezone
+        from orders import datagen
+        end = timezone.now()
+        datagen.generate(users=5, items=5, orders=50, reviews=5, favorites=5, days=7, prefix='one', end=end)
+        datagen.generate(users=5, items=5, orders=50, reviews=5, favorites=5, days=7, prefix='two', end=end)
+
+        def history(prefix):
+            return list(
+                Order.objects.filter(token_number__startswith=prefix.upper()).order_by('token_number')
+                .values_list('created_at', 'total_amount', 'status', 'payment_method')
+            )
+        self.assertEqual(history('one'), history('two'))
+
+
+class EndpointBenchmarkTestCase(TestCase):
+    """Query budgets for the hot endpoints on a small generated history"""
+
+    def test_endpoints_within_query_budgets(self):
+        """No endpoint errors or exceeds its SQL query budget (time budgets relaxed for CI)"""
+        from orders import benchmarks, datagen, rollups
+        datagen.generate(users=30, items=40, orders=300, reviews=60, favorites=30, days=14, chunk_size=100)
+        # A live kitchen queue so the KDS renders real order cards
+        for order in Order.objects.filter(status='collected')[:15]:
+            Order.objects.filter(pk=order.pk).update(status='confirmed')
+        rollups.rebuild()
+
+        results = benchmarks.run(repeats=1, time_scale=100)
+        self.assertEqual(len(results), len(benchmarks.ENDPOINTS))
+        for row in results:
+            self.assertEqual(row['failures'], [], row['name'])
+        # only the bench user's account gets orders
+        self.assertFalse(Order.objects.filter(token_number__startswith='TKN-').exclude(
+            user__username__startswith=benchmarks.BENCH_PREFIX).exists())
+
+    def test_refuses_without_generated_data(self):
+        """Without generated data the command needs an explicit opt-in"""
+        from django.core.management import CommandError, call_command
+        with self.assertRaises(CommandError):
+            call_command('benchmark_endpoints')
+
+
+class SalesRollupTestCase(TestCase):
+    """Tests for the daily sales rollups behind the analytics endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rollupuser', password='testpass123')
+        self.kitchen = User.objects.create_user(username='rollupkitchen', password='testpass123')
+        self.kitchen.profile.role = 'kitchen'
+        self.kitchen.profile.save()
+        self.category = Category.objects.create(name='Meals')
+        self.item = MenuItem.objects.create(category=self.category, name='Thali', price=Decimal('60.00'))
+
+    def _order(self, status='pending', quantity=2, **kwargs):
+        order = Order.objects.create(
+            user=self.user, total_amount=self.item.price * quantity, status=status, **kwargs
+        )
+        OrderItem.objects.create(order=order, menu_item=self.item, item_name=self.item.name,
+                                 price=self.item.price, quantity=quantity)
+        return order
+
+    def _snapshot(self):
+        from orders.models import DailyItemSales, DailyOrderStats
+        stats = sorted(DailyOrderStats.objects.filter(orders__gt=0).values_list(
+            'date', 'payment_method', 'status', 'is_paid', 'orders', 'revenue', 'items_sold'))
+        sales = sorted(DailyItemSales.objects.filter(quantity__gt=0).values_list(
+            'date', 'item_name', 'category_id', 'status', 'is_paid', 'quantity', 'revenue'))
+        return stats, sales
+
+    def test_incremental_updates_match_rebuild(self):
+        """Status and payment changes keep the rollups equal to a full rebuild"""
+        from orders import rollups
+        order = self._order()
+        self.assertEqual(self._snapshot(), ([], []))  # in-flight orders aren't rolled up
+
+        order.is_paid = True
+        order.status = 'collected'
+        order.save()
+        other = self._order(quantity=1)
+        other.status = 'cancelled'
+        other.save()
+        incremental = self._snapshot()
+        self.assertEqual(len(incremental[0]), 2)
+        self.assertEqual(incremental[1][0][-2:], (2, Decimal('120.00')))
+
+        order.is_paid = False  # refund after collection moves the row
+        order.save()
+        incremental = self._snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self._snapshot())
+
+    def test_racing_create_adds_to_one_item_row(self):
+        """An item-sales row created by a racing request is updated, not duplicated (no menu item either)"""
+        from unittest import mock
+        from django.db.models.query import QuerySet
+        from django.utils import timezone
+        from orders import rollups
+        from orders.models import DailyItemSales
+        keys = {'date': timezone.localdate(), 'menu_item_id': None, 'item_name': 'Thali', 'category_id': None,
+                'status': 'collected', 'is_paid': True}
+        DailyItemSales.objects.create(**keys, quantity=2, revenue=Decimal('120.00'))
+        real_update = QuerySet.update
+        calls = []
+
+        def stale_update(qs, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else real_update(qs, **kwargs)  # first update misses the row
+
+        with mock.patch.object(QuerySet, 'update', stale_update):
+            rollups._bump(DailyItemSales, keys, quantity=1, revenue=Decimal('60.00'))
+        self.assertEqual(list(DailyItemSales.objects.values_list('quantity', 'revenue')), [(3, Decimal('180.00'))])
+
+    def test_refresh_after_bulk_update(self):
+        """Bulk update() skips signals, so refresh_orders rebuilds the touched days"""
+        from orders import rollups
+        orders = [self._order(is_paid=True) for _ in range(3)]
+        queryset = Order.objects.filter(pk__in=[o.pk for o in orders])
+        queryset.update(status='collected')
+        rollups.refresh_orders(queryset)
+        stats, sales = self._snapshot()
+        self.assertEqual([row[4:] for row in stats], [(3, Decimal('360.00'), 6)])
+        self.assertEqual(sales[0][-2:], (6, Decimal('360.00')))
+
+    def test_sales_summary_combines_rollups_and_live_orders(self):
+        """The kitchen sales summary counts rolled-up and in-flight orders"""
+        done = self._order(is_paid=True)
+        done.status = 'collected'
+        done.save()
+        self._order(status='preparing', quantity=1)
+
+        self.client.force_login(self.kitchen)
+        data = self.client.get(reverse('kitchen_sales_summary'), {'range': 'today'}).json()
+        self.assertEqual(data['summary']['total_orders'], 2)
+        self.assertEqual(data['summary']['completed_orders'], 1)
+        self.assertEqual(data['summary']['total_revenue'], 120.0)
+        self.assertEqual(data['summary']['pending_revenue'], 60.0)
+        self.assertEqual(data['top_sellers'], [{'name': 'Thali', 'qty': 2, 'revenue': 120.0}])
+        self.assertEqual(data['categories'], [{'name': 'Meals', 'qty': 2, 'revenue': 120.0}])
+
+
+class AnalyticsSnapshotTestCase(TestCase):
+    """Tests for the columnar analytics snapshot export"""
+
+    def setUp(self):
+        import tempfile
+        self.output = tempfile.mkdtemp()
+        self.user = User.objects.create_user(username='snapuser', password='testpass123')
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal('45.50'), status='pending',
+                                          payment_method='upi')
+        OrderItem.objects.create(order=self.order, item_name='Dosa', price=Decimal('22.75'), quantity=2)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.output, ignore_errors=True)
+
+    def _load(self, manifest, table):
+        import os
+        from orders import snapshot
+        return snapshot.load_table(os.path.join(self.output, manifest['name'], f'{table}.npz'))
+
+    def test_full_snapshot_columns(self):
+        """Columns are typed, money is in paise and strings are dictionary-encoded"""
+        from orders import snapshot
+        manifest = snapshot.export(self.output, chunk_size=1)
+        self.assertEqual(manifest['mode'], 'full')
+        self.assertEqual(manifest['tables']['orders']['rows'], 1)
+
+        orders = self._load(manifest, 'orders')
+        self.assertEqual(list(orders['id']), [self.order.id])
+        self.assertEqual(list(orders['total_paise']), [4550])
+        self.assertEqual(list(snapshot.decode(orders, 'payment_method')), ['upi'])
+        self.assertEqual(orders['created_at'].dtype, 'datetime64[us]')
+        items = self._load(manifest, 'order_items')
+        self.assertEqual(list(snapshot.decode(items, 'item_name')), ['Dosa'])
+        self.assertEqual(list(items['menu_item_id']), [-1])
+
+    def test_incremental_snapshot(self):
+        """Incremental snapshots hold new rows plus orders updated since the last one"""
+        from orders import snapshot
+        snapshot.export(self.output)
+        newer = Order.objects.create(user=self.user, total_amount=Decimal('10.00'), status='pending')
+        manifest = snapshot.export(self.output, incremental=True)
+        self.assertEqual(manifest['mode'], 'incremental')
+        self.assertEqual(list(self._load(manifest, 'orders')['id']), [newer.id])
+        self.assertEqual(manifest['tables']['order_items']['rows'], 0)
+
+        self.order.status = 'confirmed'
+        self.order.save()
+        manifest = snapshot.export(self.output, incremental=True)
+        orders = self._load(manifest, 'orders')
+        self.assertEqual(list(orders['id']), [self.order.id])
+        self.assertEqual(list(snapshot.decode(orders, 'status')), ['confirmed'])
+
+
+class DemandForecastTestCase(TestCase):
+    """Tests for per-item, per-hour-of-week demand forecasting"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='forecastuser', password='testpass123')
+        self.kitchen = User.objects.create_user(username='forecastkitchen', password='testpass123')
+        self.kitchen.profile.role = 'kitchen'
+        self.kitchen.profile.save()
+        self.category = Category.objects.create(name='Snacks')
+        self.samosa = MenuItem.objects.create(category=self.category, name='Samosa', price=Decimal('15.00'))
+
+    def _order(self, when, quantity, status='collected'):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('15.00') * quantity, status=status)
+        OrderItem.objects.create(order=order, menu_item=self.samosa, item_name='Samosa',
+                                 price=Decimal('15.00'), quantity=quantity)
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+
+    def test_fit_smooths_weekly_demand(self):
+        """Recent weeks weigh more than the seasonal average"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from orders import forecast
+        midnight = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        ten_am = midnight - timedelta(days=7) + timedelta(hours=10)
+        self._order(ten_am, 4)                         # last week, 10:00
+        self._order(ten_am - timedelta(days=7), 2)     # two weeks ago, 10:00
+        self._order(ten_am, 3, status='cancelled')     # not demand
+
+        forecast.refresh_history(days=None)
+        keys, smoothed, average = forecast.fit(weeks=2, alpha=0.5)
+        self.assertEqual(keys, [(self.samosa.id, 'Samosa')])
+        how = forecast.hour_of_week(ten_am)
+        self.assertAlmostEqual(smoothed[0, how], 3.0)
+        self.assertAlmostEqual(average[0, how], 3.0)
+
+        keys, smoothed, _ = forecast.fit(weeks=2, alpha=0.8)
+        self.assertAlmostEqual(smoothed[0, how], 0.8 * 4 + 0.2 * 2)
+        self.assertEqual(smoothed.sum(), smoothed[0, how])
+
+    def test_endpoint_reads_precomputed_forecast(self):
+        """The KDS endpoint serves the stored forecast for the coming hours"""
+        from datetime import timedelta
+        from django.core.cache import cache
+        from django.utils import timezone
+        from orders import forecast
+        self._order(timezone.now() - timedelta(days=7), 5)
+        forecast.refresh(days=None, weeks=1)
+
+        self.client.force_login(self.kitchen)
+        url = reverse('kitchen_demand_forecast')
+        data = self.client.get(url, {'hours': 2}).json()
+        self.assertEqual(len(data['hours']), 2)
+        self.assertEqual(data['items'], [{'menu_item_id': self.samosa.id, 'name': 'Samosa',
+                                          'expected': 5.0, 'qty': 5}])
+
+        cache.clear()  # cold cache falls back to the stored rows
+        self.assertEqual(self.client.get(url, {'hours': 2}).json()['items'][0]['qty'], 5)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class OrderSearchTestCase(TestCase):
+    """Tests for the indexed token / username / email search columns"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='Priya_S', email='Priya@Campus.edu', password='password')
+        self.other = User.objects.create_user(username='rahul', email='rahul@campus.edu', password='password')
+        self.order = Order.objects.create(user=self.user, token_number='TKN-ABC123', total_amount=Decimal('50.00'))
+        Order.objects.create(user=self.other, token_number='TKN-XYZ789', total_amount=Decimal('20.00'))
+
+    def _tokens(self, query):
+        from orders import search
+        return sorted(search.filter_orders(Order.objects.all(), query).values_list('token_number', flat=True))
+
+    def test_columns_are_normalized_on_save(self):
+        """The token loses its prefix and everything is lower-cased"""
+        self.order.refresh_from_db()
+        self.assertEqual(
+            (self.order.search_token, self.order.search_username, self.order.search_email),
+            ('abc123', 'priya_s', 'priya@campus.edu'),
+        )
+
+    def test_queries_match_anywhere(self):
+        """Token (with or without TKN- / #), username and email match anywhere, however short"""
+        for query in ('TKN-ABC', '#tkn-abc1', 'abc', 'PRIYA', 'priya@camp', 'bc12', 'ya_', 'iy'):
+            self.assertEqual(self._tokens(query), ['TKN-ABC123'], query)
+        self.assertEqual(self._tokens('campus'), ['TKN-ABC123', 'TKN-XYZ789'])
+        self.assertEqual(self._tokens('tkn-'), [])
+
+    def test_user_changes_reach_orders(self):
+        """Renaming a user or changing their email updates their orders' search columns"""
+        self.user.username = 'priya_sharma'
+        self.user.email = 'ps@campus.edu'
+        self.user.save()
+        self.assertEqual(self._tokens('ps@'), ['TKN-ABC123'])
+        self.assertEqual(self._tokens('priya_sh'), ['TKN-ABC123'])
+
+        Order.objects.update(search_username='', search_email='')
+        from orders import search
+        self.assertEqual(search.backfill(), 2)
+        self.assertEqual(self._tokens('rah'), ['TKN-XYZ789'])
+
+    def test_admin_and_kitchen_search(self):
+        """The admin orders API and the kitchen dashboard use the search columns"""
+        from django.core.cache import cache
+        cache.clear()
+        self.order.status = 'pending'
+        self.order.save()
+        admin = User.objects.create_user(username='searchadmin', password='password')
+        admin.profile.role = 'admin'
+        admin.profile.save()
+        self.client.force_login(admin)
+        data = self.client.get(reverse('custom_admin_orders_api'), {'search': 'abc1'}).json()
+        self.assertEqual([o['token_number'] for o in data['orders']], ['TKN-ABC123'])
+        response = self.client.get(reverse('kitchen_dashboard'), {'search': 'priya'})
+        self.assertEqual([o.token_number for o in response.context['orders']], ['TKN-ABC123'])
+
+
+class PickupCounterTestCase(TestCase):
+    """Tests for the QR scan pickup API"""
+
+    def setUp(self):
+        self.kitchen = User.objects.create_user(username='counter', password='password')
+        self.kitchen.profile.role = 'kitchen'
+        self.kitchen.profile.save()
+        self.student = User.objects.create_user(username='pickupper', password='password')
+        self.ready = Order.objects.create(user=self.student, token_number='TKN-RDY001', status='ready',
+                                          total_amount=Decimal('40.00'))
+        OrderItem.objects.create(order=self.ready, item_name='Vada Pav', price=Decimal('20.00'), quantity=2)
+        self.cooking = Order.objects.create(user=self.student, token_number='TKN-PRP002', status='preparing',
+                                            total_amount=Decimal('30.00'))
+        self.client.force_login(self.kitchen)
+
+    def _scan(self, order):
+        return f"ORDER:{order.token_number}|USER:{order.user.username}|TOTAL:{order.total_amount}"
+
+    def test_parse_scan(self):
+        from orders.pickup import parse_scan
+        self.assertEqual(parse_scan(self._scan(self.ready)), ('TKN-RDY001', 'pickupper'))
+        self.assertEqual(parse_scan(' #tkn-rdy001 '), ('TKN-RDY001', None))
+        with self.assertRaises(ValueError):
+            parse_scan('USER:pickupper')
+
+    def test_single_scan(self):
+        """A ready order is collected (and paid) in one request; others are refused"""
+        url = reverse('kitchen_pickup')
+        response = self.client.post(url, {'code': self._scan(self.ready)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'], ['2x Vada Pav'])
+        self.ready.refresh_from_db()
+        self.assertEqual((self.ready.status, self.ready.is_paid), ('collected', True))
+
+        self.assertEqual(self.client.post(url, {'code': self._scan(self.ready)}).json()['result'], 'already_collected')
+        response = self.client.post(url, {'code': self._scan(self.cooking)})
+        self.assertEqual((response.status_code, response.json()['status']), (409, 'preparing'))
+        response = self.client.post(url, {'code': 'ORDER:TKN-PRP002|USER:someone_else'})
+        self.assertEqual(response.json()['result'], 'wrong_user')
+        self.assertEqual(self.client.post(url, {'code': 'TKN-NOPE00'}).status_code, 404)
+
+    def test_batch_scan(self):
+        """A batch reports one result per code, in order"""
+        import json
+        second = Order.objects.create(user=self.student, token_number='TKN-RDY003', status='ready',
+                                      total_amount=Decimal('15.00'))
+        codes = [self._scan(self.ready), 'TKN-RDY003', self._scan(self.cooking), 'USER:pickupper']
+        response = self.client.post(reverse('kitchen_pickup'), json.dumps({'codes': codes}),
+                                    content_type='application/json')
+        data = response.json()
+        self.assertEqual(data['collected'], 2)
+        self.assertEqual([r['result'] for r in data['results']], ['collected', 'collected', 'not_ready', 'invalid'])
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'collected')
+
+        response = self.client.post(reverse('kitchen_pickup'), json.dumps({'codes': []}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_students_cannot_collect(self):
+        self.client.force_login(self.student)
+        response = self.client.post(reverse('kitchen_pickup'), {'code': self._scan(self.ready)})
+        self.assertEqual(response.status_code, 403)
+
+
+class OrderTransitionTestCase(TestCase):
+    """Tests for compare-and-swap status transitions"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='casuser', password='password')
+        self.order = Order.objects.create(user=self.user, status='pending', total_amount=Decimal('25.00'))
+
+    def test_transition_writes_and_bumps_version(self):
+        from accounts.models import UserStats
+        from orders.transitions import transition
+        transition(self.order, 'collected', is_paid=True, validate=False)
+        self.assertEqual(self.order.version, 2)
+        fresh = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((fresh.status, fresh.is_paid, fresh.version), ('collected', True, 2))
+        # the order signals still ran
+        self.assertEqual(UserStats.objects.get(user=self.user).total_spent, Decimal('25.00'))
+
+    def test_stale_copy_conflicts(self):
+        """A screen holding an old version gets a conflict instead of overwriting"""
+        from orders.transitions import TransitionConflict, transition
+        stale = Order.objects.get(pk=self.order.pk)
+        transition(self.order, 'confirmed')
+        with self.assertRaises(TransitionConflict) as ctx:
+            transition(stale, 'cancelled')
+        self.assertEqual((ctx.exception.current.status, ctx.exception.current.version), ('confirmed', 2))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'confirmed')
+
+        self.order.special_instructions = 'No onions'
+        self.order.save()  # plain saves move the version on too
+        self.assertEqual(self.order.version, 3)
+        with self.assertRaises(TransitionConflict):
+            transition(Order.objects.get(pk=self.order.pk), 'preparing', expected_version=2)
+
+    def test_validation(self):
+        """Moves follow the state machine unless opted out; finished orders never move"""
+        from orders.transitions import InvalidTransition, transition
+        with self.assertRaises(InvalidTransition):
+            transition(self.order, 'collected')
+        with self.assertRaises(InvalidTransition):
+            transition(self.order, 'bogus')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, 1)
+
+        transition(self.order, 'ready', validate=False)
+        transition(self.order, 'collected')
+        with self.assertRaises(InvalidTransition):
+            transition(self.order, 'preparing', validate=False)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'collected')
+
+    def test_post_save_sees_bumped_version(self):
+        """Receivers get the new version as an int, not the F() expression that bumped it"""
+        from django.db.models.signals import post_save
+        seen = []
+
+        def receiver(sender, instance, **kwargs):
+            seen.append(instance.version)
+        post_save.connect(receiver, sender=Order)
+        try:
+            self.order.special_instructions = 'No onions'
+            self.order.save()
+        finally:
+            post_save.disconnect(receiver, sender=Order)
+        self.assertEqual(seen, [2])
+
+    def test_bulk_updates_bump_version(self):
+        """A screen still holding the version from before a bulk update gets a conflict"""
+        from orders import delivery
+        from orders.models import DeliveryRun
+        from orders.transitions import TransitionConflict, transition
+        self.order.status = 'ready'
+        self.order.delivery_type = 'delivery'
+        self.order.save()
+        stale = Order.objects.get(pk=self.order.pk)
+        run = DeliveryRun.objects.create(block='A')
+        Order.objects.filter(pk=self.order.pk).update(delivery_run=run)
+        self.assertEqual(delivery.dispatch_run(run), 1)
+        with self.assertRaises(TransitionConflict):
+            transition(stale, 'ready', is_paid=True)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'out_for_delivery')
+
+    def test_mark_paid_retries_on_conflict(self):
+        """A payment confirmation racing a kitchen edit is applied on top of it"""
+        from orders.transitions import mark_paid, transition
+        self.order.status = 'payment_pending'
+        self.order.save()
+        stale = Order.objects.get(pk=self.order.pk)
+        transition(self.order, 'cancelled')
+        paid = mark_paid(stale)
+        self.assertEqual((paid.status, paid.is_paid), ('cancelled', True))
+
+    def test_kitchen_screen_conflict(self):
+        """The kitchen dashboard returns 409 when the posted version is out of date"""
+        kitchen = User.objects.create_user(username='caskitchen', password='password')
+        kitchen.profile.role = 'kitchen'
+        kitchen.profile.save()
+        self.client.force_login(kitchen)
+        url = reverse('kitchen_dashboard')
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        response = self.client.post(url, {'order_id': self.order.id, 'status': 'confirmed', 'version': 1}, **ajax)
+        self.assertEqual(response.json()['version'], 2)
+        response = self.client.post(url, {'order_id': self.order.id, 'status': 'cancelled', 'version': 1}, **ajax)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['current_status'], 'confirmed')
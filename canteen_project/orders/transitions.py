@@ -0,0 +1,142 @@
+"""Order status changes with optimistic concurrency control.
+
+Every order carries a ``version`` that goes up by one on each write. A
+transition is a single compare-and-swap::
+
+    UPDATE orders_order SET status=?, is_paid=?, version=version+1, updated_at=?
+    WHERE id=? AND version=?
+
+that writes only those columns. If another screen (or the payment webhook)
+changed the order since it was read, no row matches and the caller gets a
+``TransitionConflict`` holding the current order, instead of silently
+overwriting it. No row locks are held. Moves are checked against
+``Order.VALID_TRANSITIONS`` unless the caller opts out (e.g. the kitchen
+board's drag lanes), and a finished order never moves again either way.
+A successful transition sends the
+usual ``post_save`` signal, so the prep board, rollups, stats and live
+dashboards follow as they do for ``save()``.
+
+Batch moves (delivery runs, mass cancellations, payment reconciliation) use
+one ``update()`` instead, then ``apply_bulk_change`` folds the same per-order
+deltas into that derived state.
+"""
+import logging
+from django.db import router, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+STATUSES = dict(Order.STATUS_CHOICES)
+UPDATE_FIELDS = frozenset({'status', 'is_paid', 'version', 'updated_at'})
+
+
+class InvalidTransition(ValueError):
+    """The requested status is unknown or not reachable from the current one"""
+
+
+class TransitionConflict(Exception):
+    """The order changed since it was read; `current` is its latest state (None if deleted)"""
+
+    def __init__(self, order, current):
+        self.order = order
+        self.current = current
+        super().__init__(f"Order {order.token_number} was changed by someone else")
+
+
+def transition(order, status=None, is_paid=None, expected_version=None, validate=True):
+    """Compare-and-swap an order's status and/or paid flag.
+
+    Args:
+        order: the order as the caller read it; updated in place on success
+        status, is_paid: new values (None keeps the current one)
+        expected_version: the version the user saw, e.g. posted back by a
+            kitchen screen (defaults to the version `order` was loaded at)
+        validate: only allow moves listed in Order.VALID_TRANSITIONS; with
+            False any move is allowed except out of a final status
+
+    Returns:
+        Order: the same instance, with its new status, is_paid and version
+
+    Raises:
+        InvalidTransition: unknown status, a move out of a final status, or
+            (with validate) a move the state machine doesn't list
+        TransitionConflict: the order's version no longer matches
+    """
+    status = order.status if status is None else status
+    is_paid = order.is_paid if is_paid is None else is_paid
+    if status not in STATUSES:
+        raise InvalidTransition(f"Unknown status: {status}")
+    if status != order.status and (validate or not Order.VALID_TRANSITIONS.get(order.status)) \
+            and not order.can_transition_to(status):
+        raise InvalidTransition(f"Cannot move order {order.token_number} from {order.status} to {status}")
+
+    version = order.version if expected_version is None else int(expected_version)
+    now = timezone.now()
+    updated = Order.objects.filter(pk=order.pk, version=version).update(
+        status=status, is_paid=is_paid, version=version + 1, updated_at=now,
+    )
+    if not updated:
+        current = Order.objects.filter(pk=order.pk).first()
+        logger.info(f"Order {order.token_number}: version conflict "
+                    f"(expected {version}, now {current.version if current else 'deleted'})")
+        raise TransitionConflict(order, current)
+
+    order.status, order.is_paid, order.version, order.updated_at = status, is_paid, version + 1, now
+    post_save.send(sender=Order, instance=order, created=False, update_fields=UPDATE_FIELDS,
+                   raw=False, using=router.db_for_write(Order, instance=order))
+    return order
+
+
+def apply_bulk_change(orders, old, reason=''):
+    """Fold orders moved by a bulk update() into everything their post_save signals maintain.
+
+    Applies per-order deltas — never a rebuild — to the prep board, sales
+    rollups and user stats, and after commit to the kitchen queues and live
+    dashboards (the caller sends its own kitchen broadcast).
+
+    Args:
+        orders: the updated orders, holding their new status and is_paid
+        old: {order id: (status, is_paid) before the update}
+        reason: shown on the dashboards when the batch is sent as one resync
+    """
+    from accounts import live, user_stats
+    from . import prep_board, rollups, scheduler, stations
+    orders = [order for order in orders if old[order.id] != (order.status, order.is_paid)]
+    if not orders:
+        return
+    prep_board.apply_bulk_change(orders, {order_id: status for order_id, (status, _) in old.items()})
+    rollups.apply_bulk_change(orders, old)
+    user_stats.apply_bulk_change(orders, old)
+    live.on_bulk_change(orders, old, reason)
+
+    moved = [(order.id, order.status, old[order.id][0]) for order in orders if order.status != old[order.id][0]]
+    for order in orders:
+        if order.status in scheduler.QUEUE_STATUSES and old[order.id][0] not in scheduler.QUEUE_STATUSES:
+            stations.route_order(order)
+
+    def requeue():
+        for order_id, status, old_status in moved:
+            scheduler.on_order_change(order_id, status, old_status)
+    transaction.on_commit(requeue)
+
+
+def mark_paid(order, status='confirmed', attempts=MAX_ATTEMPTS):
+    """Record a payment: set is_paid and move to `status` when the state machine allows.
+
+    A payment must not be lost to a concurrent edit, so conflicts are retried
+    against the fresh order.
+
+    Returns:
+        Order: the paid order (a fresh instance if a retry was needed)
+    """
+    for attempt in range(attempts):
+        target = status if order.can_transition_to(status) else order.status
+        try:
+            return transition(order, target, is_paid=True)
+        except TransitionConflict as exc:
+            if exc.current is None or attempt == attempts - 1:
+                raise
+            order = exc.current
@@ -1,6 +1,6 @@
 """Email notification utilities for order updates"""
 import logging
-from django.core.mail import send_mail
+from django.core.mail import send_mail, send_mass_mail
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -80,3 +80,32 @@ Thank you for ordering with CampusBites!
         logger.error(f'Failed to send order ready email for {order.token_number}: {e}')
         return False
 
+
+
+def send_cancellation_emails(orders, reason, refunded_ids=()):
+    """Tell the customers of several cancelled orders at once, over one mail connection"""
+    messages = []
+    for order in orders:
+        if not order.user.email:
+            continue
+        refund = (f"₹{order.total_amount} has been refunded to your CampusBites wallet.\n"
+                  if order.id in refunded_ids else "")
+        messages.append((
+            f'Order Cancelled - {order.token_number}',
+            f"""
+Hi {order.user.username}!
+
+Sorry, we had to cancel your order {order.token_number}: {reason}.
+{refund}
+Thank you for ordering with CampusBites!
+""",
+            settings.DEFAULT_FROM_EMAIL,
+            [order.user.email],
+        ))
+    if not messages:
+        return 0
+    try:
+        return send_mass_mail(messages, fail_silently=False)
+    except Exception as e:
+        logger.error(f'Failed to send {len(messages)} order cancellation emails: {e}')
+        return 0
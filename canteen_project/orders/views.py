@@ -6,8 +6,9 @@ from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import transaction
 from menu.models import MenuItem
 from .models import Order, OrderItem
-from payments.models import WalletTransaction
-from accounts.models import UserProfile, SystemSettings
+from .transitions import TransitionConflict, transition
+from payments import wallet
+from accounts.models import SystemSettings
 
 # Cart configuration
 MAX_ITEM_QUANTITY = 20  # Maximum quantity per item
@@ -316,7 +317,7 @@ def order_history(request):
     """Show user's orders with pagination"""
 
     
-    orders_list = Order.objects.filter(user=request.user)
+    orders_list = Order.objects.filter(user=request.user).prefetch_related('items')
     paginator = Paginator(orders_list, 10)  # 10 orders per page
     
     page = request.GET.get('page')
@@ -345,25 +346,20 @@ def cancel_order(request, order_id):
     if order.status not in ['pending', 'confirmed']:
         messages.error(request, 'Cannot cancel this order - already being prepared')
         return redirect('order_history')
+
+    # Claim the cancellation first: if the kitchen moved the order meanwhile, nothing is refunded
+    try:
+        transition(order, 'cancelled')
+    except TransitionConflict:
+        messages.error(request, 'Cannot cancel this order - the kitchen has just updated it')
+        return redirect('order_history')
     
     # Process refund if order was paid via wallet
     if order.is_paid and order.payment_method == 'wallet':
-        # Lock user profile for atomic update
-        profile = UserProfile.objects.select_for_update().get(user=request.user)
-        profile.wallet_balance += order.total_amount
-        profile.save()
-        
-        # Record refund transaction
-        WalletTransaction.objects.create(
-            user=request.user,
-            amount=order.total_amount,
-            transaction_type='credit',
-            description=f'Refund for cancelled order {order.token_number}',
-        )
+        wallet.credit(request.user, order.total_amount,
+                      f'Refund for cancelled order {order.token_number}')
         messages.info(request, f'₹{order.total_amount} refunded to your wallet')
     
-    order.status = 'cancelled'
-    order.save()
     messages.success(request, 'Order cancelled successfully')
     
     return redirect('order_history')
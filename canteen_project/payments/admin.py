@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, WalletTransaction
+from .models import Payment, StripeEvent, WalletMonthlySummary, WalletTransaction
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -12,3 +12,23 @@ class WalletTransactionAdmin(admin.ModelAdmin):
     list_display = ('user', 'amount', 'transaction_type', 'description', 'created_at')
     list_filter = ('transaction_type', 'created_at')
     search_fields = ('user__username', 'description')
+
+@admin.register(WalletMonthlySummary)
+class WalletMonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'month', 'opening_balance', 'credits', 'debits', 'closing_balance', 'transaction_count')
+    list_filter = ('month',)
+    search_fields = ('user__username',)
+    readonly_fields = ('updated_at',)
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'type', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'type')
+    search_fields = ('event_id',)
+    readonly_fields = ('event_id', 'type', 'payload', 'received_at', 'processed_at', 'last_error')
+    actions = ['retry_events']
+
+    @admin.action(description='Retry selected events')
+    def retry_events(self, request, queryset):
+        count = queryset.filter(status='failed').update(status='pending', attempts=0, last_error='', next_attempt_at=None)
+        self.message_user(request, f'{count} failed event(s) queued again.')
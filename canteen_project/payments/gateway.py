@@ -0,0 +1,243 @@
+"""Payment gateway adapter for online checkout.
+
+Views open and verify checkout sessions through ``get_gateway()`` instead of
+calling Stripe directly:
+
+* ``checkout`` reuses the open session of an unpaid order (kept in the cache
+  until shortly before Stripe expires it), so clicking pay again — or
+  reloading the payment page — doesn't create another session. Reuse only
+  spans processes with a shared cache (Redis/Memcached/database): with the
+  default per-process LocMemCache each gunicorn worker keeps its own, and
+  ``forget`` only clears the calling process's copy. That's harmless, since
+  paid orders never reach ``checkout``, but sessions are then reused less.
+* ``StripeGateway`` talks to Stripe over one keep-alive HTTP session per
+  thread, with connect/read timeouts and a single network retry (set once
+  for the stripe library when this module is imported).
+* A per-process ``CircuitBreaker`` counts connection errors, timeouts, rate
+  limits and 5xx responses; after ``FAILURE_THRESHOLD`` in a row it fails
+  fast for ``RESET_SECONDS``, then lets one trial request through.
+* ``FakeGateway`` (``PAYMENT_GATEWAY=fake``) pays every session instantly
+  without leaving the site, for tests, demos and load tests. It is refused
+  (Stripe is used instead) unless ``FAKE_GATEWAY_ALLOWED`` is set.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 3        # seconds
+READ_TIMEOUT = 10
+MAX_NETWORK_RETRIES = 1
+
+SESSION_EXPIRY_MINUTES = 35    # Stripe's minimum is 30
+SESSION_REUSE_SECONDS = 30 * 60
+
+FAILURE_THRESHOLD = 5
+RESET_SECONDS = 30
+
+# requests keeps one pooled keep-alive session per thread
+stripe.default_http_client = stripe.RequestsClient(timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+stripe.max_network_retries = MAX_NETWORK_RETRIES
+
+CheckoutSession = namedtuple('CheckoutSession', ['id', 'url', 'payment_status', 'payment_intent', 'metadata'],
+                             defaults=(None,))
+
+
+class GatewayError(Exception):
+    """The gateway rejected the request or could not be reached"""
+
+
+class GatewayUnavailable(GatewayError):
+    """The circuit breaker is open: the gateway is failing, so don't wait on it"""
+
+
+class CircuitBreaker:
+    """Fail fast after repeated gateway failures, retrying once every `reset_seconds`"""
+
+    def __init__(self, name, threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'open' if time.monotonic() - self.opened_at < self.reset_seconds else 'half-open'
+
+    def before_call(self):
+        """Raise GatewayUnavailable while open; in half-open, admit a single trial call"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                raise GatewayUnavailable(f'{self.name} gateway is unavailable, try again shortly')
+            self.opened_at = time.monotonic()  # other callers keep failing fast during the trial
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f'{self.name} gateway recovered, circuit closed')
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning(f'{self.name} gateway failed {self.failures} times, circuit open')
+                self.opened_at = time.monotonic()
+
+
+class Gateway:
+    """Checkout sessions behind a circuit breaker; subclasses implement _create and _retrieve"""
+    name = None
+    transient_errors = ()     # the gateway is degraded: counts towards opening the circuit
+    request_errors = ()       # the gateway answered but refused: the gateway itself is fine
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(self.name)
+
+    def _call(self, method, *args, **kwargs):
+        self.breaker.before_call()
+        try:
+            result = method(*args, **kwargs)
+        except self.transient_errors as exc:
+            self.breaker.record_failure()
+            raise GatewayError(str(exc)) from exc
+        except self.request_errors as exc:
+            self.breaker.record_success()
+            raise GatewayError(str(exc)) from exc
+        self.breaker.record_success()
+        return result
+
+    def create_session(self, line_items, success_url, cancel_url, customer_email=None, metadata=None):
+        """Open a checkout session; `success_url` may contain {CHECKOUT_SESSION_ID}"""
+        return self._call(self._create, line_items, success_url, cancel_url, customer_email, metadata or {})
+
+    def retrieve_session(self, session_id):
+        """Fetch a checkout session to check whether it has been paid"""
+        return self._call(self._retrieve, session_id)
+
+
+class StripeGateway(Gateway):
+    """Stripe Checkout"""
+    name = 'stripe'
+    transient_errors = (stripe.error.APIConnectionError, stripe.error.RateLimitError, stripe.error.APIError)
+    request_errors = (stripe.error.StripeError,)
+
+    @staticmethod
+    def _session(obj):
+        return CheckoutSession(obj.id, obj.url, obj.payment_status, obj.payment_intent, dict(obj.metadata or {}))
+
+    def _create(self, line_items, success_url, cancel_url, customer_email, metadata):
+        return self._session(stripe.checkout.Session.create(
+            line_items=line_items,
+            mode='payment',
+            success_url=success_url,
+            cancel_url=cancel_url,
+            customer_email=customer_email,
+            metadata=metadata,
+            expires_at=int((timezone.now() + timedelta(minutes=SESSION_EXPIRY_MINUTES)).timestamp()),
+        ))
+
+    def _retrieve(self, session_id):
+        return self._session(stripe.checkout.Session.retrieve(session_id))
+
+
+class FakeGateway(Gateway):
+    """Local stand-in for Stripe: sessions are paid the moment they're opened and
+    send the user straight to the success URL. Set `down` to simulate an outage."""
+    name = 'fake'
+    transient_errors = (ConnectionError,)
+    request_errors = (LookupError,)
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    def _key(self, session_id):
+        return f'fakegateway:{session_id}'
+
+    def _create(self, line_items, success_url, cancel_url, customer_email, metadata):
+        if self.down:
+            raise ConnectionError('Fake gateway is down')
+        session_id = f'cs_fake_{uuid.uuid4().hex}'
+        session = CheckoutSession(session_id, success_url.replace('{CHECKOUT_SESSION_ID}', session_id),
+                                  'paid', f'pi_fake_{uuid.uuid4().hex[:24]}', dict(metadata))
+        cache.set(self._key(session_id), tuple(session), SESSION_EXPIRY_MINUTES * 60)
+        return session
+
+    def _retrieve(self, session_id):
+        if self.down:
+            raise ConnectionError('Fake gateway is down')
+        found = cache.get(self._key(session_id))
+        if found is None:
+            raise LookupError(f'No such checkout session: {session_id}')
+        return CheckoutSession(*found)
+
+
+GATEWAYS = {cls.name: cls for cls in (StripeGateway, FakeGateway)}
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_gateway(name=None):
+    """The shared gateway for `name`, defaulting to settings.PAYMENT_GATEWAY, then Stripe"""
+    name = name or getattr(settings, 'PAYMENT_GATEWAY', 'stripe')
+    name = name if name in GATEWAYS else 'stripe'
+    if name == 'fake' and not getattr(settings, 'FAKE_GATEWAY_ALLOWED', False):
+        logger.error('PAYMENT_GATEWAY=fake needs FAKE_GATEWAY_ALLOWED, using Stripe')
+        name = 'stripe'
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = GATEWAYS[name]()
+        return _instances[name]
+
+
+def _session_key(order_id):
+    return f'checkout:session:{order_id}'
+
+
+def checkout(order, line_items, success_url, cancel_url, customer_email=None, metadata=None, gateway=None):
+    """The order's open checkout session, creating one unless an identical one is still open.
+
+    Returns:
+        CheckoutSession
+
+    Raises:
+        GatewayError: the gateway refused or couldn't be reached (GatewayUnavailable
+        when the circuit breaker is open)
+    """
+    gateway = gateway or get_gateway()
+    fingerprint = hashlib.sha256(json.dumps(
+        [gateway.name, order.token_number, str(order.total_amount), line_items, success_url],
+        sort_keys=True, default=str,
+    ).encode()).hexdigest()
+    cached = cache.get(_session_key(order.id))
+    if cached and cached['fingerprint'] == fingerprint:
+        return CheckoutSession(cached['id'], cached['url'], 'unpaid', None)
+
+    session = gateway.create_session(line_items, success_url, cancel_url, customer_email, metadata)
+    cache.set(_session_key(order.id), {'fingerprint': fingerprint, 'id': str(session.id), 'url': session.url},
+              SESSION_REUSE_SECONDS)
+    return session
+
+
+def forget(order_id):
+    """Drop an order's cached checkout session, e.g. once it has been paid"""
+    cache.delete(_session_key(order_id))
@@ -0,0 +1,20 @@
+"""
+Management command to rebuild the monthly wallet statements
+(WalletMonthlySummary) from the wallet ledger. Run it once after the
+migration that adds them, and after bulk imports or manual fixes to wallet
+transactions, none of which go through payments.wallet.
+"""
+from django.core.management.base import BaseCommand
+from payments import statements
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-user monthly wallet summaries from wallet transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        written = statements.backfill(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Wallet summaries rebuilt: {written} monthly rows"))
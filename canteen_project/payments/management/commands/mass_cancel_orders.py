@@ -0,0 +1,55 @@
+"""
+Management command to cancel every open order containing a menu item and/or
+placed in a time window, refunding wallet payments in bulk (see
+payments.refunds) — e.g. when an item runs out mid-rush.
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from payments import refunds
+
+
+class Command(BaseCommand):
+    help = "Cancel open orders for a menu item and/or time window and refund their wallets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--item', type=int, dest='menu_item_id', help='Menu item id the orders contain')
+        parser.add_argument('--minutes', type=int, help='Only orders placed in the last N minutes')
+        parser.add_argument('--since', help='Only orders placed from this time (YYYY-MM-DD HH:MM, local)')
+        parser.add_argument('--until', help='Only orders placed before this time (YYYY-MM-DD HH:MM, local)')
+        parser.add_argument('--reason', default='item unavailable', help='Shown in the refund and customer email')
+        parser.add_argument('--dry-run', action='store_true', help='Only show what would be cancelled')
+
+    def _when(self, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f'Invalid time: {value}')
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    def handle(self, *args, **options):
+        since = self._when(options['since'])
+        if options['minutes']:
+            since = timezone.now() - timedelta(minutes=options['minutes'])
+        try:
+            orders = refunds.select_orders(options['menu_item_id'], since, self._when(options['until']))
+        except ValueError as e:
+            raise CommandError(f'{e} (--item, --minutes, --since or --until)')
+
+        if options['dry_run']:
+            result = refunds.preview(orders)
+            self.stdout.write(f"Would cancel {result['orders']} orders and refund {result['refunds']} "
+                              f"wallet payments (₹{result['refund_total']})")
+        else:
+            result = refunds.cancel_and_refund(orders, options['reason'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Cancelled {result['cancelled']} orders, refunded {result['refunds']} wallet payments "
+                f"(₹{result['refund_total']})" + (f", {result['conflicts']} changed meanwhile and were skipped"
+                                                   if result['conflicts'] else "")
+            ))
+        if result['gateway_refunds']:
+            self.stdout.write(self.style.WARNING(
+                f"Paid online, refund through the payment gateway: {', '.join(result['gateway_refunds'])}"
+            ))
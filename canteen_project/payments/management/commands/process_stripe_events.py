@@ -0,0 +1,34 @@
+"""
+Management command that applies the Stripe webhook events queued by
+stripe_webhook (see payments.stripe_events). Run it with --loop as a
+long-lived worker, or without to drain the queue once (e.g. from cron).
+"""
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand
+from payments import stripe_events
+
+
+class Command(BaseCommand):
+    help = "Apply pending Stripe webhook events in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=stripe_events.BATCH_SIZE,
+                            help='Events claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to wait when the queue is empty (with --loop)')
+
+    def handle(self, *args, **options):
+        total = Counter()
+        while True:
+            results = stripe_events.process_batch(options['batch_size'])
+            total.update(results)
+            if results and options['verbosity'] >= 2:
+                self.stdout.write(', '.join(f'{k}: {v}' for k, v in sorted(results.items())))
+            if sum(results.values()) < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        summary = ', '.join(f'{k}: {v}' for k, v in sorted(total.items())) or 'no pending events'
+        self.stdout.write(self.style.SUCCESS(f"Stripe events done ({summary})"))
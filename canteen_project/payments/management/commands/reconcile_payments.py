@@ -0,0 +1,50 @@
+"""
+Management command to check recent orders against their payments and report
+(or, with --fix, repair) the ones that disagree — see payments.reconcile.
+Meant to run nightly, e.g. from cron after closing.
+"""
+import json
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from payments import reconcile
+
+
+class Command(BaseCommand):
+    help = "Find orders whose paid flag disagrees with their payments, and optionally fix them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1, help='Check orders from the last N days (default 1)')
+        parser.add_argument('--date', help='Check one local day instead (YYYY-MM-DD)')
+        parser.add_argument('--fix', action='store_true',
+                            help='Settle paid cash payments and mark orders with a completed payment paid')
+        parser.add_argument('--chunk-size', type=int, default=reconcile.CHUNK_SIZE, help='Orders read per query')
+        parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+            since = timezone.make_aware(datetime.combine(day, time.min))
+            until = since + timedelta(days=1)
+        else:
+            until = timezone.now()
+            since = until - timedelta(days=options['days'])
+
+        result = reconcile.reconcile(since, until, fix=options['fix'], chunk_size=options['chunk_size'])
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        for kind, count in result['counts'].items():
+            if not count:
+                continue
+            fixed = result['fixed'].get(kind)
+            note = f" ({fixed} fixed)" if options['fix'] and kind in reconcile.FIXABLE else ''
+            self.stdout.write(f"{kind:<22}{count:>7}{note}  {', '.join(result['samples'][kind])}")
+        problems = sum(result['counts'].values())
+        style = self.style.WARNING if problems and not options['fix'] else self.style.SUCCESS
+        self.stdout.write(style(f"Checked {result['orders']} orders: {problems} problems"
+                                + ("" if options['fix'] or not problems else " (run with --fix to repair)")))
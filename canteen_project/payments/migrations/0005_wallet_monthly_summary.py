@@ -0,0 +1,50 @@
+# Generated by Django 6.0.2 on 2026-10-19 05:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_alter_payment_stripe_session_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('opening_balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('credits', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('debits', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Wallet monthly summaries',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['user', '-created_at'], name='wallet_txn_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['user', 'transaction_type', '-created_at'], name='wallet_txn_user_type_created'),
+        ),
+        migrations.AddField(
+            model_name='walletmonthlysummary',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_summaries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='walletmonthlysummary',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='wallet_summary_user_month'),
+        ),
+    ]
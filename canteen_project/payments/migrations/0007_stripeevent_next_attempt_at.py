@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_stripe_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripeevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='Retry not before (after a failure)', null=True),
+        ),
+    ]
@@ -71,7 +71,69 @@ class WalletTransaction(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # wallet page: a user's history, newest first, optionally filtered by type
+            models.Index(fields=['user', '-created_at'], name='wallet_txn_user_created'),
+            models.Index(fields=['user', 'transaction_type', '-created_at'], name='wallet_txn_user_type_created'),
+        ]
 
     def __str__(self):
         sign = '+' if self.transaction_type == 'credit' else '-'
         return f"{sign}₹{self.amount} ({self.description})"
+
+
+class WalletMonthlySummary(models.Model):
+    """One user's wallet statement for one calendar month (local time).
+
+    Kept up to date by payments.statements as ledger entries are written;
+    closing_balance is always opening_balance + credits - debits.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wallet_summaries')
+    month = models.DateField(help_text="First day of the month")
+    opening_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    credits = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    debits = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    closing_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='wallet_summary_user_month'),
+        ]
+        verbose_name_plural = 'Wallet monthly summaries'
+
+    def __str__(self):
+        return f"{self.user.username} {self.month:%b %Y}: ₹{self.opening_balance} → ₹{self.closing_balance}"
+
+
+class StripeEvent(models.Model):
+    """A verified Stripe webhook event, stored on receipt and applied by the
+    process_stripe_events worker (see payments.stripe_events)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True, help_text="Stripe event id (evt_...)")
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(blank=True, null=True, help_text="Retry not before (after a failure)")
+
+    class Meta:
+        ordering = ['-received_at']
+        indexes = [
+            # the worker's queue: oldest pending events first
+            models.Index(fields=['status', 'received_at'], name='stripe_event_queue'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} {self.type} [{self.status}]"
@@ -0,0 +1,155 @@
+"""Payment reconciliation: find (and fix) orders whose paid flag disagrees with their payments.
+
+Orders in a time window are read in id-ordered chunks as plain values, each
+chunk with one query for its payments, so a day of orders is checked in a
+handful of queries without loading model instances. Per order:
+
+* ``cash_unsettled`` — the order is paid but its cash payment is still
+  ``pending`` (it was paid at the counter). Fixed by completing the payment.
+* ``payment_unrecorded`` — a completed, unrefunded payment exists but the
+  order isn't marked paid (e.g. a failed webhook). Fixed by marking it paid:
+  one bulk update for orders already in the kitchen (with their per-order
+  deltas applied by ``transitions.apply_bulk_change``), and ``mark_paid`` for
+  those still awaiting payment so they are routed to the kitchen as usual.
+* ``paid_without_payment`` — paid online or by wallet with no completed
+  payment on record (a refunded payment of a cancelled order is fine).
+  Reported for review.
+* ``amount_mismatch`` — completed payments don't add up to the order total.
+  Reported for review.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from orders.models import Order
+from orders.transitions import TransitionConflict, apply_bulk_change, mark_paid
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+SAMPLE_SIZE = 20        # tokens listed per problem kind
+
+FIXABLE = ('cash_unsettled', 'payment_unrecorded')
+KINDS = FIXABLE + ('paid_without_payment', 'amount_mismatch')
+
+ORDER_FIELDS = ('id', 'token_number', 'status', 'is_paid', 'payment_method', 'total_amount')
+
+
+def _chunks(since, until, chunk_size):
+    orders = Order.objects.filter(created_at__gte=since, created_at__lt=until).order_by('id')
+    last_id = 0
+    while True:
+        chunk = list(orders.filter(id__gt=last_id).values(*ORDER_FIELDS)[:chunk_size])
+        if not chunk:
+            return
+        payments = defaultdict(list)
+        for payment in (Payment.objects.filter(order_id__in=[o['id'] for o in chunk])
+                        .values('id', 'order_id', 'method', 'status', 'amount', 'is_refunded')):
+            payments[payment['order_id']].append(payment)
+        yield chunk, payments
+        last_id = chunk[-1]['id']
+
+
+def classify(order, payments):
+    """The problems with one order (a values() row) and its payments.
+
+    Returns:
+        list: (kind, payment ids to settle) pairs, empty when they agree
+    """
+    completed = [p for p in payments if p['status'] == 'completed' and not p['is_refunded']]
+    refunded = order['status'] == 'cancelled' and any(p['is_refunded'] for p in payments)
+    problems = []
+    if order['is_paid'] and not completed and not refunded:
+        cash = [p['id'] for p in payments if p['method'] == 'cash' and p['status'] == 'pending']
+        if cash:
+            problems.append(('cash_unsettled', cash))
+        elif order['payment_method'] != 'cash':
+            problems.append(('paid_without_payment', []))
+    elif completed and not order['is_paid'] and order['status'] != 'cancelled':
+        problems.append(('payment_unrecorded', []))
+    if completed and sum((p['amount'] for p in completed), Decimal('0')) != order['total_amount']:
+        problems.append(('amount_mismatch', []))
+    return problems
+
+
+def _mark_in_kitchen_paid(order_ids):
+    """Mark orders already past payment paid with one UPDATE, then apply their per-order deltas"""
+    with transaction.atomic():
+        orders = list(Order.objects.select_for_update().filter(id__in=order_ids, is_paid=False))
+        if not orders:
+            return 0
+        now = timezone.now()
+        Order.objects.filter(id__in=[order.id for order in orders]).update(
+            is_paid=True, version=F('version') + 1, updated_at=now,
+        )
+        old = {}
+        for order in orders:
+            old[order.id] = (order.status, order.is_paid)
+            order.is_paid, order.version, order.updated_at = True, order.version + 1, now
+        apply_bulk_change(orders, old, 'payments reconciled')
+    return len(orders)
+
+
+def _mark_orders_paid(orders):
+    """Mark orders paid.
+
+    Returns:
+        int: orders marked paid
+    """
+    waiting = [o['id'] for o in orders if o['status'] == 'payment_pending']
+    in_kitchen = [o['id'] for o in orders if o['status'] != 'payment_pending']
+    marked = _mark_in_kitchen_paid(in_kitchen) if in_kitchen else 0
+    for order in Order.objects.filter(id__in=waiting, is_paid=False):
+        try:
+            mark_paid(order)  # moves it to confirmed and on to the kitchen through the usual signals
+            marked += 1
+        except TransitionConflict:
+            logger.warning(f"Reconcile: order {order.token_number} changed meanwhile, left for the next run")
+    return marked
+
+
+def reconcile(since, until=None, fix=False, chunk_size=CHUNK_SIZE):
+    """Check the orders created in [since, until) against their payments.
+
+    Args:
+        fix: settle cash payments and mark paid orders (the FIXABLE kinds)
+
+    Returns:
+        dict: {'orders': checked, 'counts': {kind: n}, 'samples': {kind: [token, ...]},
+        'fixed': {kind: n}}
+    """
+    until = until or timezone.now()
+    checked = 0
+    counts = dict.fromkeys(KINDS, 0)
+    samples = {kind: [] for kind in KINDS}
+    fixed = dict.fromkeys(FIXABLE, 0)
+
+    for chunk, payments in _chunks(since, until, chunk_size):
+        checked += len(chunk)
+        cash_ids, unrecorded = [], []
+        for order in chunk:
+            for kind, payment_ids in classify(order, payments.get(order['id'], [])):
+                counts[kind] += 1
+                if len(samples[kind]) < SAMPLE_SIZE:
+                    samples[kind].append(order['token_number'])
+                if kind == 'cash_unsettled':
+                    cash_ids.extend(payment_ids)
+                elif kind == 'payment_unrecorded':
+                    unrecorded.append(order)
+        if not fix:
+            continue
+        if cash_ids:
+            fixed['cash_unsettled'] += Payment.objects.filter(id__in=cash_ids, status='pending').update(
+                status='completed', updated_at=timezone.now(),
+            )
+        if unrecorded:
+            fixed['payment_unrecorded'] += _mark_orders_paid(unrecorded)
+
+    problems = sum(counts.values())
+    if problems:
+        logger.warning(f"Payment reconcile: {problems} problems in {checked} orders"
+                       + (f", fixed {sum(fixed.values())}" if fix else ""))
+    return {'orders': checked, 'counts': counts, 'samples': samples, 'fixed': fixed}
@@ -0,0 +1,158 @@
+"""Mass cancellation with wallet refunds, e.g. when an item runs out mid-rush.
+
+``select_orders`` picks the open orders containing a menu item and/or placed
+in a time window. ``cancel_and_refund`` then, in one transaction:
+
+* cancels each order with a compare-and-swap on its version (orders the
+  kitchen moved on meanwhile are left alone and counted as conflicts);
+* credits every affected wallet with a single ``UPDATE ... CASE`` over the
+  per-user refund totals, ``bulk_create``s the WalletTransactions, folds them
+  into the monthly statements and marks the wallet Payments refunded;
+* takes the cancelled orders' lines off the prep board and out of the sales
+  rollups and user stats with ``transitions.apply_bulk_change`` — per-order
+  deltas, as the post_save signals would have applied one by one.
+
+After commit the orders leave the kitchen scheduler's queues and the live
+dashboards are updated; then one kitchen-screen update (when a channel layer
+is configured) and one batch of customer emails are sent. Orders paid online
+are cancelled but not refunded here — they are listed for a refund through
+the gateway, as with single cancellations.
+"""
+import logging
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+from accounts.models import UserProfile
+from orders.models import Order, OrderItem
+from orders.transitions import apply_bulk_change
+from . import statements, wallet
+from .models import Payment, WalletTransaction
+
+logger = logging.getLogger(__name__)
+
+# Orders the kitchen hasn't handed over yet
+CANCELLABLE_STATUSES = ('payment_pending', 'pending', 'confirmed', 'preparing')
+CHUNK_SIZE = 500
+
+
+def select_orders(menu_item_id=None, since=None, until=None):
+    """Open orders containing `menu_item_id` and/or placed in [since, until).
+
+    Raises:
+        ValueError: no menu item or time window given
+    """
+    if menu_item_id is None and since is None and until is None:
+        raise ValueError('Choose a menu item or a time window')
+    orders = Order.objects.filter(status__in=CANCELLABLE_STATUSES)
+    if menu_item_id is not None:
+        orders = orders.filter(id__in=OrderItem.objects.filter(menu_item_id=menu_item_id).values('order_id'))
+    if since is not None:
+        orders = orders.filter(created_at__gte=since)
+    if until is not None:
+        orders = orders.filter(created_at__lt=until)
+    return orders
+
+
+def preview(orders):
+    """What cancel_and_refund would do, without changing anything.
+
+    Returns:
+        dict: orders, wallet refunds and their total, and tokens needing a gateway refund
+    """
+    rows = list(orders.values('token_number', 'total_amount', 'is_paid', 'payment_method'))
+    refunds = [r for r in rows if r['is_paid'] and r['payment_method'] == 'wallet']
+    return {
+        'orders': len(rows),
+        'refunds': len(refunds),
+        'refund_total': sum((r['total_amount'] for r in refunds), Decimal('0')),
+        'gateway_refunds': [r['token_number'] for r in rows
+                            if r['is_paid'] and r['payment_method'] != 'wallet'],
+    }
+
+
+def _cancel(orders):
+    """Cancel each order with a version compare-and-swap; returns those cancelled"""
+    now = timezone.now()
+    cancelled = []
+    for order in orders:
+        if Order.objects.filter(pk=order.pk, version=order.version, status__in=CANCELLABLE_STATUSES).update(
+                status='cancelled', version=order.version + 1, updated_at=now):
+            order.status, order.version = 'cancelled', order.version + 1
+            cancelled.append(order)
+    return cancelled
+
+
+def _credit_wallets(refund_orders, reason):
+    """Refund wallet-paid orders with one balance UPDATE and one ledger insert per chunk"""
+    totals = {}
+    for order in refund_orders:
+        totals[order.user_id] = totals.get(order.user_id, Decimal('0')) + order.total_amount
+    user_ids = list(totals)
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        chunk = user_ids[start:start + CHUNK_SIZE]
+        UserProfile.objects.filter(user_id__in=chunk).update(wallet_balance=F('wallet_balance') + Case(
+            *[When(user_id=user_id, then=Value(totals[user_id])) for user_id in chunk],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+
+    txns = WalletTransaction.objects.bulk_create([
+        WalletTransaction(
+            user_id=order.user_id,
+            amount=order.total_amount,
+            transaction_type='credit',
+            description=f'Refund for cancelled order {order.token_number} ({reason})'[:200],
+            reference_id=wallet.new_reference(),
+        ) for order in refund_orders
+    ], batch_size=CHUNK_SIZE)
+    balances = dict(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'wallet_balance'))
+    statements.record_many(txns, balances)
+    Payment.objects.filter(order_id__in=[o.id for o in refund_orders], method='wallet', status='completed').update(
+        status='refunded', is_refunded=True, refunded_at=timezone.now(), updated_at=timezone.now(),
+    )
+    return sum(totals.values(), Decimal('0'))
+
+
+def _notify(cancelled, reason, refunded_ids):
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    from orders.utils import send_cancellation_emails
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)('kitchen_group', {
+            'type': 'order_update',
+            'message': 'Orders Cancelled',
+            'data': {'cancelled': [order.token_number for order in cancelled], 'reason': reason},
+        })
+    send_cancellation_emails(cancelled, reason, refunded_ids)
+
+
+def cancel_and_refund(orders, reason):
+    """Cancel a set of orders and refund the wallet-paid ones in bulk.
+
+    Returns:
+        dict: orders cancelled, conflicts (changed meanwhile and left alone),
+        wallet refunds and their total, and tokens needing a gateway refund
+    """
+    candidates = list(orders.select_related('user'))
+    old_statuses = {order.id: order.status for order in candidates}
+    with transaction.atomic():
+        cancelled = _cancel(candidates)
+        refund_orders = [o for o in cancelled if o.is_paid and o.payment_method == 'wallet']
+        refund_total = _credit_wallets(refund_orders, reason) if refund_orders else Decimal('0')
+        if cancelled:
+            # update() skips the order signals; apply the same per-order deltas
+            apply_bulk_change(cancelled, {o.id: (old_statuses[o.id], o.is_paid) for o in cancelled},
+                              'mass cancellation')
+            refunded_ids = {o.id for o in refund_orders}
+            transaction.on_commit(lambda: _notify(cancelled, reason, refunded_ids))
+
+    logger.info(f"Mass cancellation ({reason}): {len(cancelled)} orders cancelled, "
+                f"{len(refund_orders)} refunded ₹{refund_total}, {len(candidates) - len(cancelled)} conflicts")
+    return {
+        'cancelled': len(cancelled),
+        'conflicts': len(candidates) - len(cancelled),
+        'refunds': len(refund_orders),
+        'refund_total': refund_total,
+        'gateway_refunds': [o.token_number for o in cancelled if o.is_paid and o.payment_method != 'wallet'],
+    }
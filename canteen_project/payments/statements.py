@@ -0,0 +1,162 @@
+"""Monthly wallet statements (WalletMonthlySummary), maintained from the ledger.
+
+``record`` runs in the same transaction as each WalletTransaction written by
+``payments.wallet`` (``record_many`` for a batch, e.g. a bulk refund): it
+adds the amount to the month's credits or debits and closing balance with F()
+deltas, creating the month's row on its first entry with the balance the
+wallet had before it as the opening balance. The wallet
+page reads these rows instead of aggregating the ledger. ``backfill``
+rebuilds them from the ledger after bulk imports or manual fixes.
+"""
+import logging
+from datetime import datetime, time
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+from accounts.models import UserProfile
+from .models import WalletMonthlySummary, WalletTransaction
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_MONTHS = 6   # months listed on the wallet page
+
+
+def month_of(moment=None):
+    """First day of the (local) month containing `moment` (default: now)"""
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def _month_start(month):
+    return timezone.make_aware(datetime.combine(month, time.min))
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _add(user_id, month, credits, debits, count, balance):
+    """Add ledger totals to a month's summary; `balance` is the wallet balance right after them"""
+    changes = {
+        'credits': F('credits') + credits,
+        'debits': F('debits') + debits,
+        'closing_balance': F('closing_balance') + credits - debits,
+        'transaction_count': F('transaction_count') + count,
+        'updated_at': timezone.now(),
+    }
+    summaries = WalletMonthlySummary.objects.filter(user_id=user_id, month=month)
+    if summaries.update(**changes):
+        return
+    opening = balance - credits + debits
+    try:
+        with transaction.atomic():
+            WalletMonthlySummary.objects.create(user_id=user_id, month=month,
+                                                opening_balance=opening, closing_balance=opening)
+    except IntegrityError:  # created concurrently
+        pass
+    summaries.update(**changes)
+
+
+def record(txn, balance):
+    """Fold one ledger entry into its month's summary.
+
+    Args:
+        txn: the WalletTransaction just written
+        balance: the wallet balance right after it
+    """
+    credit = txn.transaction_type == 'credit'
+    _add(txn.user_id, month_of(txn.created_at), txn.amount if credit else Decimal('0'),
+         Decimal('0') if credit else txn.amount, 1, balance)
+
+
+def record_many(txns, balances):
+    """Fold a batch of ledger entries into their summaries, one update per user and month.
+
+    Args:
+        txns: WalletTransactions written together, e.g. by a bulk refund
+        balances: {user_id: wallet balance right after them}
+    """
+    totals = {}
+    for txn in txns:
+        key = (txn.user_id, month_of(txn.created_at))
+        credits, debits, count = totals.get(key, (Decimal('0'), Decimal('0'), 0))
+        if txn.transaction_type == 'credit':
+            credits += txn.amount
+        else:
+            debits += txn.amount
+        totals[key] = (credits, debits, count + 1)
+    for (user_id, month), (credits, debits, count) in totals.items():
+        _add(user_id, month, credits, debits, count, balances[user_id])
+
+
+def current(user):
+    """This month's summary for a user, unsaved and empty if there's no activity yet"""
+    summary = WalletMonthlySummary.objects.filter(user_id=user.pk, month=month_of()).first()
+    if summary is None:
+        balance = user.profile.wallet_balance
+        summary = WalletMonthlySummary(user=user, month=month_of(),
+                                       opening_balance=balance, closing_balance=balance)
+    return summary
+
+
+def recent(user, months=STATEMENT_MONTHS):
+    """A user's latest monthly statements, newest first"""
+    return list(WalletMonthlySummary.objects.filter(user_id=user.pk).order_by('-month')[:months])
+
+
+@transaction.atomic
+def backfill(user_ids=None):
+    """Rebuild the monthly summaries from the ledger (default: every user).
+
+    Balances are worked out backwards from each wallet's current balance, so
+    they are right even where balances were set before the ledger existed.
+
+    Returns:
+        int: summary rows written
+    """
+    ledger = WalletTransaction.objects.all()
+    if user_ids is not None:
+        ledger = ledger.filter(user_id__in=user_ids)
+
+    # One query per local month between precomputed bounds; TruncMonth would
+    # need MySQL's timezone tables
+    span = ledger.aggregate(first=Min('created_at'), last=Max('created_at'))
+    months = []
+    month = month_of(span['first']) if span['first'] else None
+    while month and month <= month_of(span['last']):
+        following = _next_month(month)
+        months.extend(
+            dict(row, month=month) for row in
+            ledger.filter(created_at__gte=_month_start(month), created_at__lt=_month_start(following))
+            .values('user_id')
+            .annotate(credits=Sum('amount', filter=Q(transaction_type='credit')),
+                      debits=Sum('amount', filter=Q(transaction_type='debit')),
+                      count=Count('id'))
+            .order_by()
+        )
+        month = following
+    months.sort(key=lambda row: (row['user_id'], row['month']), reverse=True)
+
+    balances = UserProfile.objects.all()
+    if user_ids is not None:
+        balances = balances.filter(user_id__in=user_ids)
+    closing = dict(balances.values_list('user_id', 'wallet_balance'))
+
+    rows = []
+    for row in months:
+        user_id = row['user_id']
+        credits, debits = row['credits'] or Decimal('0'), row['debits'] or Decimal('0')
+        opening = closing.get(user_id, Decimal('0')) - credits + debits
+        rows.append(WalletMonthlySummary(
+            user_id=user_id, month=row['month'], opening_balance=opening, credits=credits,
+            debits=debits, closing_balance=opening + credits - debits, transaction_count=row['count'],
+        ))
+        closing[user_id] = opening
+
+    stale = WalletMonthlySummary.objects.all()
+    if user_ids is not None:
+        stale = stale.filter(user_id__in=user_ids)
+    stale.delete()
+    WalletMonthlySummary.objects.bulk_create(rows, batch_size=1000)
+    logger.info(f"Wallet summaries rebuilt: {len(rows)} rows")
+    return len(rows)
@@ -0,0 +1,163 @@
+"""Stripe webhook inbox.
+
+The webhook only verifies an event and records it: one
+``INSERT ... ON CONFLICT DO NOTHING`` into ``StripeEvent``, whose unique
+``event_id`` turns Stripe's retries and duplicate deliveries into no-ops.
+It answers 200 straight away, however busy the database is. The
+``process_stripe_events`` worker then applies pending events in batches.
+Each event is claimed by a conditional UPDATE in the same transaction as its
+effects, so it is applied exactly once even with several workers running; a
+failure rolls both back and the event is retried after an exponential
+backoff (``next_attempt_at``), up to ``MAX_ATTEMPTS``.
+
+Until that worker is deployed, ``STRIPE_EVENTS_INLINE`` (on by default) has
+the webhook apply its event straight away with ``process_now``, along with a
+few retries that have come due.
+"""
+import json
+import logging
+from collections import Counter
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from orders.models import Order
+from orders.transitions import mark_paid
+from . import gateway
+from .models import Payment, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30     # 30s, 1m, 2m, 4m between attempts
+INLINE_RETRIES = 5          # due retries the webhook picks up when applying inline
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt of an event that has failed `attempts` times"""
+    return timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def receive(payload):
+    """Record a verified webhook event for the worker.
+
+    Args:
+        payload: the raw request body (already signature-checked)
+
+    Returns:
+        str: the Stripe event id
+
+    Raises:
+        ValueError: the payload is not a Stripe event
+    """
+    event = json.loads(payload)
+    if not isinstance(event, dict) or not event.get('id') or not event.get('type'):
+        raise ValueError('Not a Stripe event')
+    StripeEvent.objects.bulk_create([
+        StripeEvent(event_id=event['id'], type=event['type'], payload=event,
+                    status='pending' if event['type'] in HANDLERS else 'ignored'),
+    ], ignore_conflicts=True)
+    return event['id']
+
+
+def _checkout_completed(event):
+    session = event['data']['object']
+    order_id = (session.get('metadata') or {}).get('order_id')
+    if not order_id:
+        return 'ignored'
+    order = Order.objects.filter(id=int(order_id)).first()
+    if order is None:
+        logger.warning(f'Stripe event {event["id"]}: order {order_id} not found')
+        return 'ignored'
+
+    payment, created = Payment.objects.get_or_create(
+        stripe_session_id=session['id'],
+        defaults={
+            'order': order,
+            'amount': order.total_amount,
+            'method': 'stripe',
+            'status': 'completed',
+            'transaction_id': session.get('payment_intent') or session['id'],
+            'gateway_response': {
+                'gateway': 'stripe_webhook',
+                'session_id': session['id'],
+                'payment_intent': session.get('payment_intent'),
+                'event_id': event['id'],
+            },
+        },
+    )
+    if created or not order.is_paid:
+        mark_paid(order)  # retried if a kitchen/admin edit races the worker
+        logger.info(f'Stripe event {event["id"]}: order {order_id} confirmed')
+    gateway.forget(order.id)
+    return 'processed'
+
+
+# event type -> handler(event dict) returning 'processed' or 'ignored'
+HANDLERS = {
+    'checkout.session.completed': _checkout_completed,
+}
+
+
+def apply(stripe_event):
+    """Claim and apply one pending event.
+
+    Returns:
+        str: 'processed', 'ignored', 'failed' (will be retried unless out of
+        attempts) or 'skipped' (another worker got to it first)
+    """
+    try:
+        with transaction.atomic():
+            claimed = StripeEvent.objects.filter(pk=stripe_event.pk, status='pending').update(
+                status='processed', processed_at=timezone.now(), attempts=F('attempts') + 1,
+            )
+            if not claimed:
+                return 'skipped'
+            result = HANDLERS[stripe_event.type](stripe_event.payload)
+            if result != 'processed':
+                StripeEvent.objects.filter(pk=stripe_event.pk).update(status=result)
+            return result
+    except Exception as exc:
+        attempts = stripe_event.attempts + 1
+        gave_up = attempts >= MAX_ATTEMPTS
+        StripeEvent.objects.filter(pk=stripe_event.pk, status='pending').update(
+            attempts=attempts, last_error=str(exc)[:2000], status='failed' if gave_up else 'pending',
+            next_attempt_at=None if gave_up else timezone.now() + retry_delay(attempts),
+        )
+        log = logger.error if gave_up else logger.warning
+        log(f'Stripe event {stripe_event.event_id} failed (attempt {attempts}/{MAX_ATTEMPTS}): {exc}')
+        return 'failed'
+
+
+def due():
+    """Pending events whose retry backoff (if any) has passed, oldest first"""
+    return (StripeEvent.objects.filter(status='pending')
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()))
+            .order_by('received_at', 'id'))
+
+
+def process_batch(limit=BATCH_SIZE):
+    """Apply up to `limit` due events, oldest first.
+
+    Returns:
+        Counter: events by result
+    """
+    results = Counter()
+    for stripe_event in due()[:limit]:
+        results[apply(stripe_event)] += 1
+    return results
+
+
+def process_now(event_id, retries=INLINE_RETRIES):
+    """Apply a just-received event in the webhook request, plus up to `retries` due ones.
+
+    Returns:
+        Counter: events by result
+    """
+    results = Counter()
+    stripe_event = StripeEvent.objects.filter(event_id=event_id, status='pending').first()
+    if stripe_event is not None:
+        results[apply(stripe_event)] += 1
+    results.update(process_batch(retries))
+    return results
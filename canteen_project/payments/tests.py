@@ -1,9 +1,12 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
 from orders.models import Order
 from payments.models import Payment, WalletTransaction
+from accounts.models import UserProfile
 from decimal import Decimal
+from django.db.models import F
 from unittest.mock import patch, MagicMock
 
 
@@ -86,6 +89,24 @@ class PaymentTestCase(TestCase):
         self.user.profile.refresh_from_db()
         self.assertEqual(self.user.profile.wallet_balance, Decimal('50.00'))
 
+    def test_short_wallet_payment_never_reaches_kitchen(self):
+        """A failed wallet payment leaves the order out of the kitchen queue and broadcasts"""
+        from orders import scheduler
+        scheduler._queues.clear()
+        queue = scheduler.get_queue('fifo')
+        Order.objects.filter(pk=self.order.pk).update(status='payment_pending')
+        self.user.profile.wallet_balance = Decimal('50.00')
+        self.user.profile.save()
+
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(reverse('process_wallet_payment', args=[self.order.id]))
+        self.assertEqual(callbacks, [])
+        self.assertEqual(queue.sequence(), [])
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.is_paid), ('payment_pending', False))
+        scheduler._queues.clear()
+
 
 class StripePaymentTestCase(TestCase):
     """Tests for Stripe payment integration"""
@@ -130,6 +151,7 @@ class StripePaymentTestCase(TestCase):
         mock_session.payment_status = 'paid'
         mock_session.payment_intent = 'pi_test_123'
         mock_session.id = 'cs_test_abc'
+        mock_session.metadata = {'order_id': str(self.order.id)}
         mock_retrieve.return_value = mock_session
         
         self.client.force_login(self.user)
@@ -260,3 +282,342 @@ class PaymentModelTestCase(TestCase):
         )
         self.assertEqual(transaction.transaction_type, 'credit')
         self.assertEqual(transaction.description, 'Test top-up')
+
+
+class WalletServiceTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledgeruser', password='testpass123')
+        self.user.profile.wallet_balance = Decimal('100.00')
+        self.user.profile.save()
+
+    def balance(self):
+        return UserProfile.objects.get(user=self.user).wallet_balance
+
+    def test_debit_writes_ledger_entry(self):
+        from payments import wallet
+        txn = wallet.debit(self.user, Decimal('40.00'), 'Lunch', reference_id='REF1')
+        self.assertEqual(self.balance(), Decimal('60.00'))
+        self.assertEqual(self.user.profile.wallet_balance, Decimal('60.00'))
+        self.assertEqual((txn.transaction_type, txn.amount, txn.reference_id), ('debit', Decimal('40.00'), 'REF1'))
+
+    def test_debit_insufficient_changes_nothing(self):
+        from payments import wallet
+        with self.assertRaises(wallet.InsufficientBalance):
+            wallet.debit(self.user, Decimal('100.01'), 'Too much')
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        self.assertFalse(WalletTransaction.objects.filter(user=self.user).exists())
+
+    def test_credit_respects_cap(self):
+        from payments import wallet
+        wallet.credit(self.user, 50, 'Top-up', cap=150)
+        self.assertEqual(self.balance(), Decimal('150.00'))
+        with self.assertRaises(wallet.BalanceLimitExceeded):
+            wallet.credit(self.user, 1, 'Top-up', cap=150)
+        self.assertEqual(WalletTransaction.objects.filter(user=self.user).count(), 1)
+
+    def test_user_save_keeps_balance(self):
+        """A stale cached profile must not write its balance back on user.save()"""
+        from payments import wallet
+        stale = User.objects.get(pk=self.user.pk)
+        stale.profile  # cache the profile at 100.00
+        wallet.debit(self.user, 30, 'Snack')
+        stale.save()
+        self.assertEqual(self.balance(), Decimal('70.00'))
+
+    def test_negative_balance_rejected(self):
+        from django.db import IntegrityError, transaction
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UserProfile.objects.filter(user=self.user).update(wallet_balance=-1)
+
+
+class WalletStatementTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='statementuser', password='testpass123')
+        self.user.profile.wallet_balance = Decimal('100.00')
+        self.user.profile.save()
+
+    def test_summary_follows_ledger(self):
+        from payments import statements, wallet
+        wallet.credit(self.user, 50, 'Top-up')
+        wallet.debit(self.user, 30, 'Lunch')
+        summary = statements.current(self.user)
+        self.assertEqual((summary.opening_balance, summary.credits, summary.debits, summary.closing_balance),
+                         (Decimal('100.00'), Decimal('50.00'), Decimal('30.00'), Decimal('120.00')))
+        self.assertEqual(summary.transaction_count, 2)
+
+    def test_backfill_matches_incremental(self):
+        from payments import statements, wallet
+        from payments.models import WalletMonthlySummary
+        wallet.credit(self.user, 50, 'Top-up')
+        wallet.debit(self.user, 30, 'Lunch')
+        fields = ('month', 'opening_balance', 'credits', 'debits', 'closing_balance', 'transaction_count')
+        incremental = list(WalletMonthlySummary.objects.values_list(*fields))
+        self.assertEqual(statements.backfill(), 1)
+        self.assertEqual(list(WalletMonthlySummary.objects.values_list(*fields)), incremental)
+
+    def test_wallet_page_reads_summary(self):
+        from payments import wallet
+        wallet.debit(self.user, 25, 'Lunch')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('wallet'))
+        self.assertEqual(response.context['month_debits'], Decimal('25.00'))
+        self.assertEqual(len(response.context['statements']), 1)
+
+
+@override_settings(STRIPE_EVENTS_INLINE=False)
+class StripeWebhookInboxTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='webhookuser', password='testpass123')
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal('120.00'),
+                                          status='payment_pending', payment_method='online')
+
+    def post_event(self, event_id='evt_1'):
+        import json
+        payload = {'id': event_id, 'type': 'checkout.session.completed', 'data': {'object': {
+            'id': 'cs_inbox_1', 'payment_intent': 'pi_inbox_1', 'metadata': {'order_id': str(self.order.id)},
+        }}}
+        return self.client.post(reverse('stripe_webhook'), json.dumps(payload), content_type='application/json')
+
+    def test_webhook_queues_once(self):
+        from payments.models import StripeEvent
+        self.assertEqual(self.post_event().status_code, 200)
+        self.assertEqual(self.post_event().status_code, 200)  # Stripe retry
+        self.assertEqual(StripeEvent.objects.filter(status='pending').count(), 1)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_paid)
+
+    def test_worker_applies_event_once(self):
+        from payments import stripe_events
+        self.post_event()
+        self.assertEqual(stripe_events.process_batch()['processed'], 1)
+        self.assertEqual(stripe_events.process_batch(), {})
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+        self.assertEqual(Payment.objects.filter(stripe_session_id='cs_inbox_1').count(), 1)
+
+    def test_failed_event_is_retried(self):
+        from payments import stripe_events
+        from payments.models import StripeEvent
+        self.post_event()
+        with patch.dict(stripe_events.HANDLERS, {'checkout.session.completed': MagicMock(side_effect=RuntimeError('boom'))}):
+            self.assertEqual(stripe_events.process_batch()['failed'], 1)
+        event = StripeEvent.objects.get()
+        self.assertEqual((event.status, event.attempts, event.last_error), ('pending', 1, 'boom'))
+        self.assertEqual(stripe_events.process_batch(), {})  # backing off
+        StripeEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(stripe_events.process_batch()['processed'], 1)
+
+    def test_inline_webhook_applies_event(self):
+        from payments.models import StripeEvent
+        with override_settings(STRIPE_EVENTS_INLINE=True):
+            self.assertEqual(self.post_event().status_code, 200)
+        self.assertEqual(StripeEvent.objects.get().status, 'processed')
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+
+    def test_invalid_payload_rejected(self):
+        response = self.client.post(reverse('stripe_webhook'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PAYMENT_GATEWAY='fake', FAKE_GATEWAY_ALLOWED=True)
+class PaymentGatewayTestCase(TestCase):
+    def setUp(self):
+        from payments import gateway
+        self.gateway = gateway.get_gateway('fake')
+        self.gateway.down = False
+        self.gateway.breaker.record_success()
+        self.user = User.objects.create_user(username='gatewayuser', password='testpass123')
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal('80.00'),
+                                          status='payment_pending', payment_method='online')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.gateway.down = False
+        self.gateway.breaker.record_success()
+
+    def test_open_session_is_reused(self):
+        first = self.client.post(reverse('process_online_payment', args=[self.order.id]))
+        second = self.client.post(reverse('process_online_payment', args=[self.order.id]))
+        self.assertEqual(first.status_code, 303)
+        self.assertEqual(first.url, second.url)
+
+    def test_fake_gateway_pays_order(self):
+        response = self.client.post(reverse('process_online_payment', args=[self.order.id]))
+        response = self.client.get(response.url)
+        self.assertRedirects(response, reverse('order_history'), fetch_redirect_response=False)
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+        self.assertEqual(Payment.objects.get(order=self.order).gateway_response['gateway'], 'fake')
+
+    def test_paid_session_cannot_pay_another_order(self):
+        other = Order.objects.create(user=self.user, total_amount=Decimal('80.00'),
+                                     status='payment_pending', payment_method='online')
+        success_url = self.client.post(reverse('process_online_payment', args=[self.order.id])).url
+        self.client.get(success_url)
+        session_id = success_url.split('session_id=')[1]
+        self.client.get(reverse('stripe_success', args=[other.id]), {'session_id': session_id})
+        other.refresh_from_db()
+        self.assertFalse(other.is_paid)
+        self.assertEqual(Payment.objects.filter(order=other).count(), 0)
+
+    def test_fake_gateway_refused_unless_allowed(self):
+        from payments import gateway
+        with override_settings(FAKE_GATEWAY_ALLOWED=False):
+            self.assertEqual(gateway.get_gateway('fake').name, 'stripe')
+
+    def test_circuit_opens_after_repeated_failures(self):
+        from payments import gateway
+        self.gateway.down = True
+        for _ in range(gateway.FAILURE_THRESHOLD):
+            with self.assertRaises(gateway.GatewayError):
+                self.gateway.retrieve_session('cs_missing')
+        self.gateway.down = False
+        with self.assertRaises(gateway.GatewayUnavailable):
+            self.gateway.retrieve_session('cs_missing')
+        response = self.client.post(reverse('process_online_payment', args=[self.order.id]),
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 502)
+
+    def test_refused_request_keeps_circuit_closed(self):
+        from payments import gateway
+        for _ in range(gateway.FAILURE_THRESHOLD):
+            with self.assertRaises(gateway.GatewayError):
+                self.gateway.retrieve_session('cs_missing')
+        self.assertEqual(self.gateway.breaker.state, 'closed')
+
+
+class ReconcilePaymentsTestCase(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        self.user = User.objects.create_user(username='reconuser', password='testpass123')
+        self.since = timezone.now() - timedelta(hours=1)
+
+    def order(self, **fields):
+        return Order.objects.create(user=self.user, total_amount=Decimal('50.00'), **fields)
+
+    def test_report_only_changes_nothing(self):
+        from payments import reconcile
+        order = self.order(status='collected', is_paid=True, payment_method='cash')
+        Payment.objects.create(order=order, amount=order.total_amount, method='cash', status='pending')
+        self.order(status='confirmed', is_paid=True, payment_method='wallet')
+        result = reconcile.reconcile(self.since)
+        self.assertEqual(result['counts']['cash_unsettled'], 1)
+        self.assertEqual(result['counts']['paid_without_payment'], 1)
+        self.assertEqual(Payment.objects.get(order=order).status, 'pending')
+
+    def test_fix_settles_cash_and_marks_orders_paid(self):
+        from payments import reconcile
+        cash = self.order(status='collected', is_paid=True, payment_method='cash')
+        Payment.objects.create(order=cash, amount=cash.total_amount, method='cash', status='pending')
+        waiting = self.order(status='payment_pending', payment_method='online')
+        preparing = self.order(status='preparing', payment_method='online')
+        for order in (waiting, preparing):
+            Payment.objects.create(order=order, amount=order.total_amount, method='stripe', status='completed')
+
+        result = reconcile.reconcile(self.since, fix=True, chunk_size=2)
+        self.assertEqual(result['fixed'], {'cash_unsettled': 1, 'payment_unrecorded': 2})
+        self.assertEqual(Payment.objects.get(order=cash).status, 'completed')
+        waiting.refresh_from_db()
+        preparing.refresh_from_db()
+        self.assertEqual((waiting.status, waiting.is_paid), ('confirmed', True))
+        self.assertEqual((preparing.status, preparing.is_paid), ('preparing', True))
+        self.assertEqual(sum(reconcile.reconcile(self.since)['counts'].values()), 0)
+        from accounts import user_stats
+        self.assertEqual(user_stats.reconcile([self.user.id]), 0)  # deltas applied, nothing drifted
+
+    def test_amount_mismatch_reported(self):
+        from payments import reconcile
+        order = self.order(status='confirmed', is_paid=True, payment_method='online')
+        Payment.objects.create(order=order, amount=Decimal('40.00'), method='stripe', status='completed')
+        self.assertEqual(reconcile.reconcile(self.since)['samples']['amount_mismatch'], [order.token_number])
+
+
+class MassCancelTestCase(TestCase):
+    def setUp(self):
+        from menu.models import Category, MenuItem
+        from orders.models import OrderItem
+        category = Category.objects.create(name='Rush')
+        self.item = MenuItem.objects.create(category=category, name='Biryani', price=Decimal('60.00'))
+        other = MenuItem.objects.create(category=category, name='Tea', price=Decimal('10.00'))
+        self.user = User.objects.create_user(username='rushuser', password='testpass123', email='rush@test.com')
+        self.user.profile.wallet_balance = Decimal('10.00')
+        self.user.profile.save()
+
+        self.orders = []
+        for menu_item, status, method in ((self.item, 'confirmed', 'wallet'), (self.item, 'preparing', 'wallet'),
+                                          (self.item, 'pending', 'cash'), (self.item, 'ready', 'wallet'),
+                                          (other, 'confirmed', 'wallet')):
+            order = Order.objects.create(user=self.user, total_amount=menu_item.price, status=status,
+                                         payment_method=method, is_paid=method == 'wallet')
+            OrderItem.objects.create(order=order, menu_item=menu_item, item_name=menu_item.name,
+                                     price=menu_item.price, quantity=1)
+            if method == 'wallet':
+                Payment.objects.create(order=order, amount=order.total_amount, method='wallet', status='completed')
+            self.orders.append(order)
+
+    def test_cancel_and_refund_by_item(self):
+        from django.core import mail
+        from accounts import user_stats
+        from orders.models import PrepBoardEntry
+        from payments import refunds, statements
+        with self.captureOnCommitCallbacks(execute=True):
+            result = refunds.cancel_and_refund(refunds.select_orders(self.item.id), 'Biryani sold out')
+        self.assertEqual((result['cancelled'], result['refunds'], result['refund_total']),
+                         (3, 2, Decimal('120.00')))
+        self.assertEqual(UserProfile.objects.get(user=self.user).wallet_balance, Decimal('130.00'))
+        self.assertEqual(WalletTransaction.objects.filter(user=self.user, transaction_type='credit').count(), 2)
+        self.assertEqual(Payment.objects.filter(is_refunded=True, status='refunded').count(), 2)
+        self.assertEqual(statements.current(self.user).credits, Decimal('120.00'))
+        statuses = [Order.objects.get(pk=o.pk).status for o in self.orders]
+        self.assertEqual(statuses, ['cancelled', 'cancelled', 'cancelled', 'ready', 'confirmed'])
+        self.assertEqual(len(mail.outbox), 3)
+        board = dict(PrepBoardEntry.objects.filter(quantity__gt=0).values_list('item_name', 'quantity'))
+        self.assertEqual(board, {'Tea': 1})
+        self.assertEqual(user_stats.reconcile([self.user.id]), 0)  # per-order deltas left nothing to fix
+
+    def test_cancelled_orders_leave_kitchen_queue(self):
+        from orders import scheduler
+        from payments import refunds
+        scheduler._queues.clear()
+        queue = scheduler.get_queue('fifo')
+        self.assertEqual(len(queue.sequence()), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            refunds.cancel_and_refund(refunds.select_orders(self.item.id), 'Biryani sold out')
+        self.assertEqual(queue.sequence(), [self.orders[4].id])
+        scheduler._queues.clear()
+
+    def test_changed_order_is_skipped(self):
+        from payments import refunds
+        candidates = list(refunds.select_orders(self.item.id).order_by('id'))
+        Order.objects.filter(pk=candidates[0].pk).update(version=F('version') + 1)  # edited meanwhile
+        cancelled = refunds._cancel(candidates)
+        self.assertEqual([o.pk for o in cancelled], [o.pk for o in candidates[1:]])
+        self.assertEqual(Order.objects.get(pk=candidates[0].pk).status, 'confirmed')
+
+    def test_admin_api_dry_run(self):
+        import json
+        admin = User.objects.create_user(username='rushadmin', password='testpass123')
+        admin.profile.role = 'admin'
+        admin.profile.save()
+        self.client.force_login(admin)
+        response = self.client.post(reverse('custom_admin_mass_cancel_api'),
+                                    json.dumps({'menu_item_id': self.item.id, 'dry_run': True}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['orders'], 3)
+        self.assertEqual(Order.objects.filter(status='cancelled').count(), 0)
+        response = self.client.post(reverse('custom_admin_mass_cancel_api'), json.dumps({}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_api_refuses_kitchen_staff(self):
+        import json
+        cook = User.objects.create_user(username='rushcook', password='testpass123')
+        cook.profile.role = 'kitchen'
+        cook.profile.save()
+        self.client.force_login(cook)
+        response = self.client.post(reverse('custom_admin_mass_cancel_api'),
+                                    json.dumps({'menu_item_id': self.item.id}), content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.filter(status='cancelled').count(), 0)
@@ -4,15 +4,13 @@ from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import transaction
 from django.http import JsonResponse, HttpResponse
-from django.utils import timezone
-from django.db.models import Sum, Q
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.conf import settings
 from orders.models import Order
-from accounts.models import UserProfile
+from orders.transitions import TransitionConflict, mark_paid, transition
 from .models import Payment, WalletTransaction
-import uuid
+from . import gateway, statements, stripe_events, wallet
 import stripe
 import logging
 
@@ -68,6 +66,12 @@ def process_cash_payment(request, order_id):
         messages.info(request, 'Order already paid')
         return redirect('order_history')
 
+    try:
+        transition(order, 'pending' if order.can_transition_to('pending') else None)
+    except TransitionConflict:
+        messages.error(request, 'This order was just updated - please check it before paying')
+        return redirect('order_history')
+
     Payment.objects.create(
         order=order,
         amount=order.total_amount,
@@ -76,55 +80,42 @@ def process_cash_payment(request, order_id):
         ip_address=_get_client_ip(request),
     )
 
-    order.transition_to('pending')
-    order.save()
-
     messages.success(request, 'Order confirmed! Pay at counter.')
     return redirect('order_history')
 
 
 @login_required
-@transaction.atomic
 def process_wallet_payment(request, order_id):
-    """Process wallet payment with atomic transaction to prevent race conditions"""
+    """Pay for an order from the wallet: debit the balance and claim the order in one short transaction"""
     order = get_object_or_404(Order, id=order_id, user=request.user)
 
-    # Lock the profile row to prevent concurrent modifications
-    profile = UserProfile.objects.select_for_update().get(user=request.user)
+    if order.is_paid:
+        messages.info(request, 'Order already paid')
+        return redirect('order_history')
 
-    if profile.wallet_balance < order.total_amount:
+    txn_ref = wallet.new_reference()
+    try:
+        with transaction.atomic():
+            # Debit first, so a short balance fails before the order moves; a concurrent
+            # payment then makes the claim conflict and rolls the debit back
+            wallet.debit(request.user, order.total_amount,
+                         f'Payment for order #{order.token_number}', reference_id=txn_ref)
+            transition(order, 'confirmed' if order.can_transition_to('confirmed') else None, is_paid=True)
+            Payment.objects.create(
+                order=order,
+                amount=order.total_amount,
+                method='wallet',
+                status='completed',
+                transaction_id=txn_ref,
+                ip_address=_get_client_ip(request),
+                gateway_response={'source': 'canteen_wallet', 'ref': txn_ref},
+            )
+    except wallet.InsufficientBalance:
         messages.error(request, 'Insufficient wallet balance')
         return redirect('payment_page', order_id=order_id)
-
-    # Deduct from wallet (now atomic)
-    profile.wallet_balance -= order.total_amount
-    profile.save()
-
-    txn_ref = str(uuid.uuid4()).replace('-', '').upper()[:12]
-
-    # Record transaction
-    WalletTransaction.objects.create(
-        user=request.user,
-        amount=order.total_amount,
-        transaction_type='debit',
-        description=f'Payment for order #{order.token_number}',
-        reference_id=txn_ref,
-    )
-
-    # Create payment record
-    Payment.objects.create(
-        order=order,
-        amount=order.total_amount,
-        method='wallet',
-        status='completed',
-        transaction_id=txn_ref,
-        ip_address=_get_client_ip(request),
-        gateway_response={'source': 'canteen_wallet', 'ref': txn_ref},
-    )
-
-    order.is_paid = True
-    order.transition_to('confirmed')
-    order.save()
+    except TransitionConflict:
+        messages.error(request, 'This order was just updated - please check it before paying again')
+        return redirect('order_history')
 
     messages.success(request, '✓ Payment successful!')
     return redirect('order_history')
@@ -135,14 +126,8 @@ def wallet_view(request):
     """Show wallet balance, monthly summary, and paginated transactions"""
     all_txns = WalletTransaction.objects.filter(user=request.user)
 
-    # Monthly summary
-    now = timezone.now()
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    month_txns = all_txns.filter(created_at__gte=month_start)
-    month_credits = month_txns.filter(transaction_type='credit').aggregate(
-        total=Sum('amount'))['total'] or 0
-    month_debits = month_txns.filter(transaction_type='debit').aggregate(
-        total=Sum('amount'))['total'] or 0
+    # Monthly summary, kept up to date as wallet transactions are written
+    month = statements.current(request.user)
 
     # Filter
     filter_type = request.GET.get('filter', 'all')
@@ -168,8 +153,9 @@ def wallet_view(request):
     context = {
         'balance': balance,
         'transactions': transactions,
-        'month_credits': month_credits,
-        'month_debits': month_debits,
+        'month_credits': month.credits,
+        'month_debits': month.debits,
+        'statements': statements.recent(request.user),
         'filter_type': filter_type,
         'max_wallet': MAX_WALLET_BALANCE,
         'cap_pct': cap_pct,
@@ -178,7 +164,6 @@ def wallet_view(request):
 
 
 @login_required
-@transaction.atomic
 def add_money_to_wallet(request):
     """Add money to wallet (simulated) with validation"""
     if request.method == 'POST':
@@ -197,26 +182,13 @@ def add_money_to_wallet(request):
             messages.error(request, f'Maximum single topup is ₹{MAX_SINGLE_TOPUP}')
             return redirect('wallet')
 
-        # Lock profile to prevent race conditions
-        profile = UserProfile.objects.select_for_update().get(user=request.user)
-
-        # Check wallet balance limit
-        if profile.wallet_balance + amount > MAX_WALLET_BALANCE:
+        try:
+            wallet.credit(request.user, amount, 'Wallet top-up',
+                          reference_id=wallet.new_reference(), cap=MAX_WALLET_BALANCE)
+        except wallet.BalanceLimitExceeded:
             messages.error(request, f'Wallet balance cannot exceed ₹{MAX_WALLET_BALANCE}')
             return redirect('wallet')
 
-        profile.wallet_balance += amount
-        profile.save()
-
-        ref = str(uuid.uuid4()).replace('-', '').upper()[:12]
-        WalletTransaction.objects.create(
-            user=request.user,
-            amount=amount,
-            transaction_type='credit',
-            description='Wallet top-up',
-            reference_id=ref,
-        )
-
         messages.success(request, f'₹{amount} added to wallet!')
 
     return redirect('wallet')
@@ -261,16 +233,13 @@ def process_online_payment(request, order_id):
             'quantity': 1,
         })
 
+    # Build absolute URLs for success/cancel
+    success_url = request.build_absolute_uri(f'/payment/{order.id}/stripe/success/') + '?session_id={CHECKOUT_SESSION_ID}'
+    cancel_url = request.build_absolute_uri(f'/payment/{order.id}/')
+
     try:
-        # Build absolute URLs for success/cancel
-        success_url = request.build_absolute_uri(f'/payment/{order.id}/stripe/success/') + '?session_id={CHECKOUT_SESSION_ID}'
-        cancel_url = request.build_absolute_uri(f'/payment/{order.id}/')
-
-        checkout_session = stripe.checkout.Session.create(
-            line_items=line_items,
-            mode='payment',
-            success_url=success_url,
-            cancel_url=cancel_url,
+        checkout_session = gateway.checkout(
+            order, line_items, success_url, cancel_url,
             customer_email=request.user.email or None,
             metadata={
                 'order_id': str(order.id),
@@ -278,23 +247,21 @@ def process_online_payment(request, order_id):
                 'token_number': str(order.token_number),
             },
         )
-
-        if is_ajax:
-            return JsonResponse({'url': checkout_session.url})
-        response = redirect(checkout_session.url)
-        response.status_code = 303
-        return response
-
-    except stripe.error.StripeError as e:
-        logger.error(f'Stripe error creating session for order {order.id}: {e}')
+    except gateway.GatewayError as e:
+        logger.error(f'Payment gateway error creating session for order {order.id}: {e}')
         if is_ajax:
             return JsonResponse({'error': 'Unable to connect to payment gateway. Please try again.'}, status=502)
         messages.error(request, 'Unable to connect to payment gateway. Please try again.')
         return redirect('payment_page', order_id=order_id)
 
+    if is_ajax:
+        return JsonResponse({'url': checkout_session.url})
+    response = redirect(checkout_session.url)
+    response.status_code = 303
+    return response
+
 
 @login_required
-@transaction.atomic
 def stripe_success(request, order_id):
     """Handle return from Stripe after successful payment."""
     order = get_object_or_404(Order, id=order_id, user=request.user)
@@ -308,49 +275,59 @@ def stripe_success(request, order_id):
         messages.error(request, 'Invalid payment session')
         return redirect('payment_page', order_id=order_id)
 
+    # Verify with the gateway outside any transaction, so no connection is held while waiting on it
+    payment_gateway = gateway.get_gateway()
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
-
-        if session.payment_status == 'paid':
-            # Create payment record (idempotent atomic check)
-            payment, created = Payment.objects.get_or_create(
-                stripe_session_id=session.id,
-                defaults={
-                    'order': order,
-                    'amount': order.total_amount,
-                    'method': 'stripe',
-                    'status': 'completed',
-                    'transaction_id': session.payment_intent or session.id,
-                    'ip_address': _get_client_ip(request),
-                    'gateway_response': {
-                        'gateway': 'stripe',
-                        'session_id': session.id,
-                        'payment_intent': session.payment_intent,
-                        'payment_status': session.payment_status,
-                    }
-                }
-            )
+        session = payment_gateway.retrieve_session(session_id)
+    except gateway.GatewayError as e:
+        logger.error(f'Payment gateway error verifying session {session_id}: {e}')
+        messages.error(request, 'Payment verification failed. Please contact support.')
+        return redirect('payment_page', order_id=order_id)
 
-            order.is_paid = True
-            order.transition_to('confirmed')
-            order.save()
+    if str((session.metadata or {}).get('order_id')) != str(order.id):
+        logger.warning(f'Checkout session {session.id} does not belong to order {order.id}')
+        messages.error(request, 'Invalid payment session')
+        return redirect('payment_page', order_id=order_id)
+
+    if session.payment_status != 'paid':
+        messages.warning(request, 'Payment not yet confirmed. Please try again.')
+        return redirect('payment_page', order_id=order_id)
 
-            messages.success(request, f'✓ Payment successful! Transaction ID: {session.payment_intent or session.id}')
-            return redirect('order_history')
-        else:
-            messages.warning(request, 'Payment not yet confirmed. Please try again.')
+    with transaction.atomic():
+        # Create payment record (idempotent atomic check)
+        payment, _ = Payment.objects.get_or_create(
+            stripe_session_id=session.id,
+            defaults={
+                'order': order,
+                'amount': order.total_amount,
+                'method': 'stripe',
+                'status': 'completed',
+                'transaction_id': session.payment_intent or session.id,
+                'ip_address': _get_client_ip(request),
+                'gateway_response': {
+                    'gateway': payment_gateway.name,
+                    'session_id': session.id,
+                    'payment_intent': session.payment_intent,
+                    'payment_status': session.payment_status,
+                }
+            }
+        )
+        if payment.order_id != order.id:  # a session already spent on another order
+            logger.warning(f'Checkout session {session.id} was paid for order {payment.order_id}, not {order.id}')
+            messages.error(request, 'Invalid payment session')
             return redirect('payment_page', order_id=order_id)
+        mark_paid(order)
+    gateway.forget(order.id)
 
-    except stripe.error.StripeError as e:
-        logger.error(f'Stripe error verifying session {session_id}: {e}')
-        messages.error(request, 'Payment verification failed. Please contact support.')
-        return redirect('payment_page', order_id=order_id)
+    messages.success(request, f'✓ Payment successful! Transaction ID: {session.payment_intent or session.id}')
+    return redirect('order_history')
 
 
 @csrf_exempt
 @require_POST
 def stripe_webhook(request):
-    """Handle Stripe webhook events for reliable payment confirmation."""
+    """Verify a Stripe webhook event and queue it for the process_stripe_events worker
+    (applying it straight away while STRIPE_EVENTS_INLINE is on)."""
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE', '')
     webhook_secret = settings.STRIPE_WEBHOOK_SECRET
@@ -358,59 +335,22 @@ def stripe_webhook(request):
     # If no webhook secret configured, skip signature verification (dev mode)
     if webhook_secret:
         try:
-            event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
+            stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
         except ValueError:
             logger.warning('Stripe webhook: invalid payload')
             return HttpResponse(status=400)
         except stripe.error.SignatureVerificationError:
             logger.warning('Stripe webhook: invalid signature')
             return HttpResponse(status=400)
-    else:
-        import json
-        try:
-            event = stripe.Event.construct_from(json.loads(payload), stripe.api_key)
-        except (ValueError, json.JSONDecodeError):
-            return HttpResponse(status=400)
 
-    # Handle checkout.session.completed
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        order_id = session.get('metadata', {}).get('order_id')
-
-        if order_id:
-            try:
-                with transaction.atomic():
-                    order = Order.objects.select_for_update().get(id=int(order_id))
-
-                    # Idempotent — skip if already paid
-                    payment, created = Payment.objects.get_or_create(
-                        stripe_session_id=session['id'],
-                        defaults={
-                            'order': order,
-                            'amount': order.total_amount,
-                            'method': 'stripe',
-                            'status': 'completed',
-                            'transaction_id': session.get('payment_intent', session['id']),
-                            'gateway_response': {
-                                'gateway': 'stripe_webhook',
-                                'session_id': session['id'],
-                                'payment_intent': session.get('payment_intent'),
-                                'event_id': event['id'],
-                            }
-                        }
-                    )
-                    
-                    if created or not order.is_paid:
-                        order.is_paid = True
-                        order.transition_to('confirmed')
-                        order.save()
-                        logger.info(f'Stripe webhook: order {order_id} confirmed via webhook')
-            except Order.DoesNotExist:
-                logger.warning(f'Stripe webhook: order {order_id} not found')
-            except Exception as e:
-                logger.error(f'Stripe webhook error for order {order_id}: {e}')
-                return HttpResponse(status=500)
+    try:
+        event_id = stripe_events.receive(payload)
+    except ValueError:
+        logger.warning('Stripe webhook: invalid payload')
+        return HttpResponse(status=400)
 
+    if getattr(settings, 'STRIPE_EVENTS_INLINE', True):
+        stripe_events.process_now(event_id)  # failures stay queued for a retry
     return HttpResponse(status=200)
 
 
@@ -0,0 +1,94 @@
+"""Wallet balance changes as single conditional UPDATEs.
+
+A debit is one statement::
+
+    UPDATE accounts_userprofile SET wallet_balance = wallet_balance - X
+    WHERE user_id = ? AND wallet_balance >= X
+
+and a capped credit adds ``AND wallet_balance <= cap - X``. The database
+applies the arithmetic to the current row, so concurrent payments and top-ups
+can neither overdraw the wallet nor lose each other's writes, and no row lock
+is taken up front. The ledger entry and the month's statement (see
+``payments.statements``) are written in the same short transaction, so the
+balance, the wallet history and the statements always agree. A check
+constraint on ``UserProfile`` rejects a negative balance from any other path.
+"""
+import logging
+import uuid
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from accounts.models import UserProfile
+from . import statements
+from .models import WalletTransaction
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientBalance(Exception):
+    """The wallet holds less than the amount to debit"""
+
+
+class BalanceLimitExceeded(Exception):
+    """The credit would take the wallet over its cap"""
+
+
+def new_reference():
+    """A short unique reference for a wallet transaction"""
+    return uuid.uuid4().hex.upper()[:12]
+
+
+def _apply(user, amount, transaction_type, description, reference_id, rows):
+    if not rows.update(wallet_balance=F('wallet_balance') + (amount if transaction_type == 'credit' else -amount)):
+        return None
+    txn = WalletTransaction.objects.create(
+        user=user,
+        amount=amount,
+        transaction_type=transaction_type,
+        description=description,
+        reference_id=reference_id,
+    )
+    # keep the request's cached profile current, so later saves don't write back a stale balance
+    user.profile.refresh_from_db(fields=['wallet_balance'])
+    statements.record(txn, user.profile.wallet_balance)
+    return txn
+
+
+@transaction.atomic
+def debit(user, amount, description, reference_id=''):
+    """Take `amount` from the user's wallet.
+
+    Returns:
+        WalletTransaction: the ledger entry
+
+    Raises:
+        InsufficientBalance: the balance is below `amount` (nothing is changed)
+    """
+    amount = Decimal(amount)
+    rows = UserProfile.objects.filter(user_id=user.pk, wallet_balance__gte=amount)
+    txn = _apply(user, amount, 'debit', description, reference_id, rows)
+    if txn is None:
+        raise InsufficientBalance(f"Wallet balance of {user.username} is below ₹{amount}")
+    logger.info(f"Wallet debit ₹{amount} for {user.username}: {description}")
+    return txn
+
+
+@transaction.atomic
+def credit(user, amount, description, reference_id='', cap=None):
+    """Add `amount` to the user's wallet, keeping it at or below `cap` if given.
+
+    Returns:
+        WalletTransaction: the ledger entry
+
+    Raises:
+        BalanceLimitExceeded: the new balance would exceed `cap` (nothing is changed)
+    """
+    amount = Decimal(amount)
+    rows = UserProfile.objects.filter(user_id=user.pk)
+    if cap is not None:
+        rows = rows.filter(wallet_balance__lte=Decimal(cap) - amount)
+    txn = _apply(user, amount, 'credit', description, reference_id, rows)
+    if txn is None:
+        raise BalanceLimitExceeded(f"Wallet balance of {user.username} cannot exceed ₹{cap}")
+    logger.info(f"Wallet credit ₹{amount} for {user.username}: {description}")
+    return txn
@@ -1,4 +1,4 @@
-/* admin_dashboard.js – Dashboard AJAX polling & chart rendering */
+/* admin_dashboard.js – Dashboard snapshot + live deltas & chart rendering */
 (function () {
     "use strict";
 
@@ -6,6 +6,11 @@
     var timeRange = window.__dashConfig.timeRange;
     var statsUrl = window.__dashConfig.statsUrl;
     var chartUrl = window.__dashConfig.chartUrl;
+    var eventsUrl = window.__dashConfig.eventsUrl;
+
+    var CHART_REFRESH_MS = 60000;   // charts re-fetch at most this often, and only after a change
+    var stats = null;               // last snapshot, kept current by live events
+    var chartsDirty = false;
 
     var revenueChartInstance = null;
     var categoryChartInstance = null;
@@ -61,22 +66,57 @@
         return html;
     }
 
-    /* ── Refresh stats via API ── */
-    function refreshStats() {
+    /* ── Render stats from the snapshot / live state ── */
+    function renderStats() {
+        updateStat("statTotalRevenue", "\u20b9" + Math.round(stats.total_revenue));
+        updateStat("statTotalOrders", "" + stats.total_orders);
+        updateStat("statActiveOrders", "" + stats.active_orders);
+        updateStat("statTotalUsers", "" + stats.total_users);
+        updateStat("statTodaysRevenue", "\u20b9" + Math.round(stats.todays_revenue) + " today");
+        updateStat("statTodaysOrders", stats.todays_orders + " today");
+        updateStat("statNewUsers", "+" + stats.new_users + " this week");
+        var tbody = document.getElementById("recentOrdersBody");
+        if (tbody) { tbody.innerHTML = buildRecentOrdersHTML(stats.recent_orders); }
+    }
+
+    /* ── Load a stats snapshot via API ── */
+    function loadSnapshot(done) {
         fetch(statsUrl + "?range=" + timeRange)
             .then(function (r) { return r.json(); })
             .then(function (data) {
-                updateStat("statTotalRevenue", "\u20b9" + Math.round(data.total_revenue));
-                updateStat("statTotalOrders", "" + data.total_orders);
-                updateStat("statActiveOrders", "" + data.active_orders);
-                updateStat("statTotalUsers", "" + data.total_users);
-                updateStat("statTodaysRevenue", "\u20b9" + Math.round(data.todays_revenue) + " today");
-                updateStat("statTodaysOrders", data.todays_orders + " today");
-                updateStat("statNewUsers", "+" + data.new_users + " this week");
-                var tbody = document.getElementById("recentOrdersBody");
-                if (tbody) { tbody.innerHTML = buildRecentOrdersHTML(data.recent_orders); }
+                stats = data;
+                renderStats();
+                if (done) done(data.seq);
             })
-            .catch(function (err) { console.warn("Stats refresh error:", err); });
+            .catch(function (err) { console.warn("Stats snapshot error:", err); });
+    }
+
+    /* ── Apply one live order event ── */
+    function applyEvent(e) {
+        if (e.type !== "order" || !stats) return;
+        if (e.ranges.indexOf(timeRange) !== -1) {
+            stats.total_revenue += e.revenue;
+            stats.total_orders += e.orders;
+        }
+        if (e.ranges.indexOf("today") !== -1) {
+            stats.todays_revenue += e.revenue;
+            stats.todays_orders += e.orders;
+        }
+        stats.active_orders += e.active;
+
+        var recent = stats.recent_orders;
+        if (e.row) {
+            recent.unshift(e.row);
+            recent.length = Math.min(recent.length, 5);
+        }
+        for (var i = 0; i < recent.length; i++) {
+            if (recent[i].id === e.id) {
+                recent[i].status = e.status;
+                recent[i].status_display = e.status_display;
+            }
+        }
+        renderStats();
+        chartsDirty = true;
     }
 
     /* ── Refresh charts via API ── */
@@ -323,7 +363,18 @@
             .catch(function (err) { console.warn("Chart data error:", err); });
     }
 
-    /* ── Initial load + polling ── */
+    /* ── One snapshot, then live deltas (charts catch up once a minute if anything changed) ── */
     refreshCharts();
-    setInterval(function () { refreshStats(); refreshCharts(); }, 15000);
+    loadSnapshot(function (seq) {
+        AdminLive.connect(eventsUrl, seq, applyEvent, function (setSeq) {
+            loadSnapshot(setSeq);
+            chartsDirty = true;
+        });
+    });
+    setInterval(function () {
+        if (chartsDirty) {
+            chartsDirty = false;
+            refreshCharts();
+        }
+    }, CHART_REFRESH_MS);
 })();
@@ -0,0 +1,74 @@
+/* admin_live.js – Live dashboard deltas over WebSocket, with a polling fallback */
+(function () {
+    "use strict";
+
+    var EVENTS_POLL_MS = 3000;      // fallback: ask for the events after lastSeq
+    var SNAPSHOT_POLL_MS = 15000;   // live events off: re-poll the whole snapshot
+
+    /*
+     * AdminLive.connect(eventsUrl, since, onEvent, onResync)
+     *   since    – the "seq" of the snapshot the page rendered (null when the
+     *              server keeps no live events; the snapshot is then re-polled)
+     *   onEvent  – called with every event after that snapshot, in order
+     *   onResync – called with setSeq when events were missed; reload the
+     *              snapshot, then call setSeq(snapshot.seq)
+     */
+    function connect(eventsUrl, since, onEvent, onResync) {
+        var lastSeq = since;
+        var wsFailures = 0;
+
+        function setSeq(seq) { lastSeq = seq; }
+
+        function pollSnapshots() {
+            setInterval(function () { onResync(function () {}); }, SNAPSHOT_POLL_MS);
+        }
+
+        function handle(data) {
+            if (data.seq <= lastSeq) return;               // already in the snapshot
+            if (data.type === "resync" || data.seq > lastSeq + 1) {
+                lastSeq = data.seq;
+                onResync(setSeq);
+                return;
+            }
+            lastSeq = data.seq;
+            onEvent(data);
+        }
+
+        function pollEvents() {
+            fetch(eventsUrl + "?since=" + lastSeq)
+                .then(function (r) { return r.json(); })
+                .then(function (data) {
+                    if (data.seq === null) { pollSnapshots(); return; }
+                    data.events.forEach(handle);
+                    setTimeout(pollEvents, EVENTS_POLL_MS);
+                })
+                .catch(function (err) {
+                    console.warn("Admin live events error:", err);
+                    setTimeout(pollEvents, EVENTS_POLL_MS);
+                });
+        }
+
+        function openSocket() {
+            var protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
+            var socket = new WebSocket(protocol + "//" + window.location.host + "/ws/admin/?since=" + lastSeq);
+            var opened = false;
+            socket.onopen = function () { opened = true; wsFailures = 0; };
+            socket.onmessage = function (e) { handle(JSON.parse(e.data)); };
+            socket.onclose = function () {
+                if (!opened && ++wsFailures >= 2) {
+                    console.log("Admin live WebSocket unavailable, polling for events");
+                    pollEvents();
+                    return;
+                }
+                setTimeout(openSocket, 5000);
+            };
+        }
+
+        if (since === null || since === undefined) { pollSnapshots(); }
+        else if (window.WebSocket) { openSocket(); }
+        else { pollEvents(); }
+        return setSeq;
+    }
+
+    window.AdminLive = { connect: connect };
+})();
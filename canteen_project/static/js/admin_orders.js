@@ -1,4 +1,4 @@
-/* admin_orders.js – Orders page AJAX polling */
+/* admin_orders.js – Orders page snapshot + live updates */
 (function () {
     "use strict";
 
@@ -7,6 +7,12 @@
     var currentSearch = window.__ordersConfig.search;
     var currentPage = window.__ordersConfig.page;
     var csrfToken = window.__ordersConfig.csrf;
+    var eventsUrl = window.__ordersConfig.eventsUrl;
+
+    var PAGE_SIZE = 15;
+    var TAB_OF = { pending: "pending", confirmed: "pending", preparing: "preparing", ready: "ready", delivered: "completed", collected: "completed" };
+    var TAB_COUNT_IDS = { pending: "tabCountPending", preparing: "tabCountPreparing", ready: "tabCountReady", completed: "tabCountCompleted" };
+    var counts = null;
 
     function updateTabCount(id, count) {
         var el = document.getElementById(id);
@@ -62,19 +68,21 @@
             + "</tr>";
     }
 
-    function refreshOrders() {
+    function renderCounts() {
+        updateTabCount("tabCountAll", counts.all);
+        for (var tab in TAB_COUNT_IDS) updateTabCount(TAB_COUNT_IDS[tab], counts[tab]);
+        var allCountEl = document.getElementById("orderCountAll");
+        if (allCountEl) allCountEl.textContent = counts.all;
+    }
+
+    function refreshOrders(done) {
         var url = ordersApiUrl + "?status=" + currentStatus + "&search=" + encodeURIComponent(currentSearch) + "&page=" + currentPage;
         fetch(url)
             .then(function (r) { return r.json(); })
             .then(function (data) {
-                updateTabCount("tabCountAll", data.counts.all);
-                updateTabCount("tabCountPending", data.counts.pending);
-                updateTabCount("tabCountPreparing", data.counts.preparing);
-                updateTabCount("tabCountReady", data.counts.ready);
-                updateTabCount("tabCountCompleted", data.counts.completed);
-
-                var allCountEl = document.getElementById("orderCountAll");
-                if (allCountEl) allCountEl.textContent = data.counts.all;
+                counts = data.counts;
+                renderCounts();
+                if (done) done(data.seq);
 
                 var tbody = document.getElementById("ordersTableBody");
                 if (!tbody) return;
@@ -108,6 +116,29 @@
             .catch(function (err) { console.warn("Orders refresh error:", err); });
     }
 
+    /* ── Apply one live order event: tab counts, the row's badge, new rows on page 1 ── */
+    function applyEvent(e) {
+        if (e.type !== "order" || !counts) return;
+        for (var tab in e.tabs) counts[tab] += e.tabs[tab];
+        renderCounts();
+
+        var tbody = document.getElementById("ordersTableBody");
+        if (!tbody) return;
+        var box = tbody.querySelector("input[name=\"order_ids\"][value=\"" + e.id + "\"]");
+        if (box) {
+            var badges = box.closest("tr").querySelectorAll(".status-badge");
+            var badge = badges[badges.length - 1];  // the scheduled-for chip shares the class
+            badge.className = "status-badge " + e.status;
+            badge.textContent = e.status_display;
+        } else if (e.row && currentPage === "1" && !currentSearch
+                   && (currentStatus === "all" || TAB_OF[e.status] === currentStatus)) {
+            if (!tbody.querySelector("input[name=\"order_ids\"]")) tbody.innerHTML = "";  // "No orders" placeholder
+            tbody.insertAdjacentHTML("afterbegin", buildOrderRow(e.row));
+            var rows = tbody.querySelectorAll("tr");
+            for (var i = PAGE_SIZE; i < rows.length; i++) rows[i].remove();
+        }
+    }
+
     window.openOrderModal = function (orderId) {
         var modal = document.getElementById("orderModal");
         var modalBody = document.getElementById("modalBody");
@@ -220,5 +251,8 @@
         });
     }
 
-    setInterval(refreshOrders, 15000);
+    /* ── One snapshot, then live deltas ── */
+    refreshOrders(function (seq) {
+        AdminLive.connect(eventsUrl, seq, applyEvent, refreshOrders);
+    });
 })();